@@ -0,0 +1,52 @@
+"""
+Benchmark the compression profiles on a synthetic study.
+For every profile the study is packaged, "sent" over a simulated link and extracted on the driver and on a worker.
+The sum approximates the submit-to-first-run time of a job; the link transfer is computed, not measured.
+Run from the root of the repo:
+    python benchmarks/bench_compression.py [number_of_files] [link_bandwidth_mbps]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from bench_zip import DEFAULT_NUMBER_OF_FILES, create_synthetic_study
+from utils.compression import CompressionProfile, DEFAULT_LINK_BANDWIDTH_MBPS
+from utils.smart_zip import smart_unzip_file, smart_zip_folder
+
+
+def run_benchmark(number_of_files: int, link_bandwidth_mbps: float) -> None:
+    link_bytes_per_second = link_bandwidth_mbps * 1_000_000 / 8
+    with tempfile.TemporaryDirectory() as tmp:
+        study_path = os.path.join(tmp, "study")
+        total_bytes = create_synthetic_study(study_path, number_of_files)
+        print(f"Synthetic study: {number_of_files} files, {total_bytes / 1024**2:.1f} MB, "
+              f"simulated link {link_bandwidth_mbps} Mbps")
+        print(f"{'profile':<10}{'zip [s]':>9}{'size [MB]':>11}{'ratio':>8}{'link [s]':>10}{'unzip [s]':>11}{'total [s]':>11}")
+        for profile in CompressionProfile:
+            zip_path = os.path.join(tmp, f"{profile.value}.zip")
+            extract_folder_path = os.path.join(tmp, f"{profile.value}_extracted")
+            os.makedirs(extract_folder_path)
+
+            start = time.perf_counter()
+            smart_zip_folder(study_path, zip_path, preferred_method="zipfile_parallel",
+                             compression_profile=profile, link_bandwidth_mbps=link_bandwidth_mbps)
+            zip_time = time.perf_counter() - start
+            zip_size = os.path.getsize(zip_path)
+            link_time = zip_size / link_bytes_per_second
+            start = time.perf_counter()
+            smart_unzip_file(zip_path, extract_folder_path, preferred_method="zipfile_parallel")
+            unzip_time = time.perf_counter() - start
+
+            # extracted once on the driver and once on the first worker
+            total_time = zip_time + link_time + 2 * unzip_time
+            print(f"{profile.value:<10}{zip_time:>9.2f}{zip_size / 1024**2:>11.1f}{total_bytes / zip_size:>8.1f}"
+                  f"{link_time:>10.2f}{unzip_time:>11.2f}{total_time:>11.2f}")
+
+
+if __name__ == "__main__":
+    number_of_files = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUMBER_OF_FILES
+    link_bandwidth_mbps = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LINK_BANDWIDTH_MBPS
+    run_benchmark(number_of_files, link_bandwidth_mbps)
@@ -0,0 +1,281 @@
+"""
+End-to-end benchmark of the driver and a fleet of workers, using the fake Antares solver (fake_antares_solver.py).
+For every combination of fleet size and study size a driver is started as a subprocess on a fresh data folder,
+N Worker instances run in threads of this process, and the studies are submitted with the bulk submission of
+the user. Reported per scenario: makespan against the ideal makespan, /get_task latency percentiles as seen by
+the workers, time the driver spent persisting its queue, the CPU time of the driver process and, with --prestage,
+the share of first tasks of a study on a worker that found it staged ahead.
+Linux only: the solver is started through the shell, as the worker does for the real one.
+Run from the root of the repo:
+    python benchmarks/bench_fleet.py --workers 1 4 16 --years 100 400 [--prestage] [--output report.json]
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+import yaml
+
+SRC_FOLDER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_FOLDER_PATH)
+
+from utils.bulk_submit import resolve_studies, submit_bulk
+from utils.http_client import Outbox
+
+FAKE_SOLVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_antares_solver.py")
+IDLE_WAIT_SECONDS = 0.2  # pause of a worker that got no task
+POLL_SECONDS = 0.25  # interval between two checks whether all jobs finished
+DRIVER_START_TIMEOUT = 30
+
+
+def write_yaml(file_path: str, data: dict) -> None:
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(data, f)
+
+
+def make_study(study_path: str, years: int, areas: int, days: int) -> None:
+    """A minimal economy study with individual year output, enough for the driver, the worker and the fake solver."""
+    area_ids = [f"area{i:03d}" for i in range(areas)]
+    os.makedirs(os.path.join(study_path, "output"))
+    os.makedirs(os.path.join(study_path, "settings"))
+    for area_id in area_ids:
+        os.makedirs(os.path.join(study_path, "input", "areas", area_id))
+    with open(os.path.join(study_path, "study.antares"), "w") as f:
+        f.write(f"[antares]\nversion = 880\ncaption = {os.path.basename(study_path)}\n")
+    with open(os.path.join(study_path, "settings", "generaldata.ini"), "w") as f:
+        f.write(f"[general]\nmode = Economy\nnbyears = {years}\nyear-by-year = true\n"
+                f"simulation.start = 1\nsimulation.end = {days}\n")
+    with open(os.path.join(study_path, "input", "areas", "list.txt"), "w") as f:
+        f.write("\n".join(area_ids) + "\n")
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_driver(workdir: str, port: int) -> subprocess.Popen:
+    env = {**os.environ, "PYTHONPATH": os.path.abspath(SRC_FOLDER_PATH)}
+    with open(os.path.join(workdir, "driver_stderr.txt"), "w") as stderr:
+        process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main_driver:app", "--host", "127.0.0.1",
+                                    "--port", str(port), "--log-level", "warning"],
+                                   cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=stderr)
+    deadline = time.monotonic() + DRIVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/health", timeout=1).raise_for_status()
+            return process
+        except requests.RequestException:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"Driver did not start, see {os.path.join(workdir, 'driver_stderr.txt')}")
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_worker(worker, stop: threading.Event) -> None:
+    while not stop.is_set():
+        try:
+            if not worker.work_once():
+                stop.wait(IDLE_WAIT_SECONDS)
+        except Exception:
+            logging.exception(f"Worker {worker.name} failed a task.")
+            stop.wait(IDLE_WAIT_SECONDS)
+
+
+def run_scenario(workdir: str, workers: int, years: int, jobs: int, areas: int, days: int, cores: int,
+                 seconds_per_year: float, prestage: bool = False) -> dict:
+    port = get_free_port()
+    write_yaml(os.path.join(workdir, "config", "config_driver.yaml"), {
+        "new_jobs_zip_folder_path": os.path.join(workdir, "driver", "zip"),
+        "new_jobs_study_folder_path": os.path.join(workdir, "driver", "study"),
+        "blob_store_folder_path": os.path.join(workdir, "driver", "blobs"),
+        "7_zip_file_path": None,
+        "zip_method": None,
+        "persisted_queue_folder_path": os.path.join(workdir, "driver", "state"),
+        "synthesize_mc_all": True,
+        "export_parquet": False,
+        "copy_when_link_fails": True,
+        "fleet_window_seconds": 600,
+    })
+    write_yaml(os.path.join(workdir, "config", "config_worker.yaml"), {
+        "driver_ip": "127.0.0.1",
+        "driver_port": port,
+        "local_zip_folder_path": os.path.join(workdir, "worker", "zip"),
+        "local_study_folder_path": os.path.join(workdir, "worker", "study"),
+        "7_zip_file_path": None,
+        "zip_method": None,
+        "max_cores_to_use": cores,
+        "antares_file_path": FAKE_SOLVER_PATH,
+        "wait_time_between_requests": 0,
+        "outbox_folder_path": os.path.join(workdir, "worker", "outbox"),
+        "request_timeout_seconds": 30,
+        "max_request_retries": 5,
+        "output_shipping": None,
+        "checksum_output": True,
+        "prestage_studies": prestage,
+        "prestage_poll_seconds": IDLE_WAIT_SECONDS,
+        "prestage_bandwidth_mbps": None,
+        "prestage_max_cpu_percent": 101,  # the fleet shares the cores of this machine, stage regardless
+    })
+    for folder in ("zip", "study", "blobs", "state"):
+        os.makedirs(os.path.join(workdir, "driver", folder), exist_ok=True)
+
+    driver = start_driver(workdir, port)
+    driver_uri = f"http://127.0.0.1:{port}"
+    stop = threading.Event()
+    threads, fleet = [], []
+    try:
+        baseline = requests.get(driver_uri + "/metrics").json()
+        for i in range(jobs):
+            make_study(os.path.join(workdir, "user", f"study{i:02d}"), years, areas, days)
+
+        # the worker reads its config relative to the working directory
+        os.chdir(workdir)
+        from main_worker import Worker
+        logging.getLogger().setLevel(logging.WARNING)
+
+        start = time.monotonic()
+        submissions = resolve_studies([os.path.join(workdir, "user", "*")], None, 50)
+        summary = submit_bulk(submissions, driver_uri, "bench", os.path.join(workdir, "user_zip"))
+        submit_seconds = time.monotonic() - start
+        if summary["failed"]:
+            raise RuntimeError(f"Submission failed: {[s['error'] for s in summary['studies'] if s['error']]}")
+
+        latencies = []
+        for i in range(workers):
+            worker = Worker("config_worker.yaml", name=f"bench-worker-{i:03d}")
+            worker.max_cores_to_use = cores  # simulated cores, the fake solver does not need real ones
+            worker.local_zip_folder_path = os.path.join(workdir, "worker", worker.name, "zip")
+            worker.local_study_folder_path = os.path.join(workdir, "worker", worker.name, "study")
+            os.makedirs(worker.local_zip_folder_path)
+            os.makedirs(worker.local_study_folder_path)
+            worker.outbox = Outbox(os.path.join(workdir, "worker", worker.name, "outbox"))
+
+            def timed_request_new_task(request_new_task=worker.request_new_task) -> dict:
+                request_start = time.perf_counter()
+                try:
+                    return request_new_task()
+                finally:
+                    latencies.append(time.perf_counter() - request_start)
+            worker.request_new_task = timed_request_new_task
+            thread = threading.Thread(target=run_worker, args=(worker, stop), daemon=True)
+            thread.start()
+            threads.append(thread)
+            worker.start_prestaging()
+            fleet.append(worker)
+
+        while True:
+            metrics = requests.get(driver_uri + "/metrics").json()
+            if metrics["finished_jobs"] >= jobs:
+                break
+            time.sleep(POLL_SECONDS)
+        makespan = time.monotonic() - start
+    finally:
+        stop.set()
+        for worker in fleet:
+            worker.prestage_stop.set()
+        for thread in threads:
+            thread.join()
+        driver.terminate()
+        driver.wait()
+
+    latencies.sort()
+    ideal = jobs * years * seconds_per_year / (workers * cores)
+    cpu_seconds = metrics["cpu_seconds"] - baseline["cpu_seconds"]
+    persist = metrics["persist"]
+    return {
+        "workers": workers,
+        "cores_per_worker": cores,
+        "jobs": jobs,
+        "years_per_job": years,
+        "areas": areas,
+        "submit_seconds": round(submit_seconds, 3),
+        "makespan_seconds": round(makespan, 3),
+        "ideal_makespan_seconds": round(ideal, 3),
+        "efficiency": round(ideal / makespan, 3),
+        "get_task_requests": len(latencies),
+        "get_task_ms": {"p50": round(percentile(latencies, 0.50) * 1000, 2),
+                        "p95": round(percentile(latencies, 0.95) * 1000, 2),
+                        "p99": round(percentile(latencies, 0.99) * 1000, 2),
+                        "mean": round(statistics.mean(latencies) * 1000, 2) if latencies else None},
+        "persist_count": persist["count"],
+        "persist_seconds": round(persist["total_seconds"], 3),
+        "persist_max_ms": round(persist["max_seconds"] * 1000, 2),
+        "queue_file_bytes": persist["queue_file_bytes"],
+        "driver_cpu_seconds": round(cpu_seconds, 3),
+        "driver_cpu_percent": round(100 * cpu_seconds / makespan, 1),
+        "staging": metrics["staging"],
+    }
+
+
+def print_report(results: list[dict]) -> None:
+    columns = ["workers", "years", "makespan", "ideal", "eff.", "get_task p50/p95/p99 ms", "persist n/s/max ms",
+               "driver cpu s (%)", "staged first tasks"]
+    rows = [[str(r["workers"]), str(r["years_per_job"] * r["jobs"]), f"{r['makespan_seconds']:.1f}s",
+             f"{r['ideal_makespan_seconds']:.1f}s", f"{r['efficiency']:.0%}",
+             f"{r['get_task_ms']['p50']}/{r['get_task_ms']['p95']}/{r['get_task_ms']['p99']}",
+             f"{r['persist_count']}/{r['persist_seconds']}/{r['persist_max_ms']}",
+             f"{r['driver_cpu_seconds']} ({r['driver_cpu_percent']}%)",
+             f"{r['staging']['staged_first_tasks']}/{r['staging']['first_tasks']}"] for r in results]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the driver with a simulated worker fleet.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16], help="Fleet sizes to run.")
+    parser.add_argument("--years", type=int, nargs="+", default=[100, 400], help="MC years per study to run.")
+    parser.add_argument("--jobs", type=int, default=1, help="Studies submitted per scenario.")
+    parser.add_argument("--areas", type=int, default=5, help="Areas per study, drives the output size.")
+    parser.add_argument("--days", type=int, default=7, help="Simulated days per MC year, drives the output size.")
+    parser.add_argument("--cores", type=int, default=4, help="Cores per worker, also the years per task.")
+    parser.add_argument("--seconds-per-year", type=float, default=0.05, help="Solver time per MC year.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability that the solver drops a year.")
+    parser.add_argument("--prestage", action="store_true", help="Let the workers stage hinted studies ahead.")
+    parser.add_argument("--output", type=str, help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+    if os.name == "nt":
+        sys.exit("This benchmark runs the fake solver through a POSIX shell and needs Linux.")
+
+    os.chmod(FAKE_SOLVER_PATH, 0o755)
+    os.environ["FAKE_ANTARES_SECONDS_PER_YEAR"] = str(args.seconds_per_year)
+    os.environ["FAKE_ANTARES_FAILURE_RATE"] = str(args.failure_rate)
+    output_path = os.path.abspath(args.output) if args.output else None
+    initial_cwd = os.getcwd()
+    results = []
+    for years in args.years:
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as workdir:
+                try:
+                    results.append(run_scenario(workdir, workers, years, args.jobs, args.areas, args.days, args.cores,
+                                                args.seconds_per_year, args.prestage))
+                finally:
+                    os.chdir(initial_cwd)
+            print(f"{workers} worker(s), {years} years: {results[-1]['makespan_seconds']}s", flush=True)
+    print_report(results)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark link creation: one shell process per link (mklink /D on Windows, ln -s elsewhere),
+as the driver used to do, against one batched create_links call.
+Run from the root of the repo:
+    python benchmarks/bench_links.py [number_of_links]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.symlink import create_links
+
+DEFAULT_NUMBER_OF_LINKS = 1000
+
+
+def link_with_shell(where: str, targets: list[str]) -> None:
+    for target in targets:
+        link_name = os.path.basename(target)
+        if os.name == "nt":
+            subprocess.run(f'mklink /D "{link_name}" "{target}"', shell=True, cwd=where, capture_output=True)
+        else:
+            subprocess.run(["ln", "-s", target, link_name], cwd=where, capture_output=True)
+
+
+def run_benchmark(number_of_links: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        targets = []
+        for year in range(number_of_links):
+            target = os.path.join(tmp, "worker", str(year + 1).zfill(5))
+            os.makedirs(target)
+            targets.append(target)
+
+        for name, function in (("shell per link", link_with_shell),
+                               ("create_links", lambda where, paths: create_links(where, paths, allow_copy=False))):
+            where = os.path.join(tmp, name.replace(" ", "_"))
+            os.makedirs(where)
+            start = time.perf_counter()
+            function(where, targets)
+            elapsed = time.perf_counter() - start
+            created = sum(os.path.islink(os.path.join(where, os.path.basename(target))) for target in targets)
+            print(f"{name:<16}{elapsed:>8.2f}s  {created / elapsed:>10.0f} links/s  ({created} links)")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUMBER_OF_LINKS)
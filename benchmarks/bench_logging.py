@@ -0,0 +1,107 @@
+"""
+Benchmark the latency of a driver-like request that logs, with synchronous logging to a file and a console
+(the previous setup of utils.logger) against the queue-based setup_root_logger.
+The endpoint logs like /get_task: a call line, the assignment and a few debug lines.
+The console is first a plain file, then a slow console whose writes block for CONSOLE_WRITE_SECONDS,
+like a terminal on Windows or a log file on a network share.
+Run from the root of the repo:
+    python benchmarks/bench_logging.py [number_of_requests]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utils.logger import DATE_FORMAT, TEXT_FORMAT, flush_logs, setup_root_logger
+
+DEFAULT_NUMBER_OF_REQUESTS = 2000
+CONSOLE_WRITE_SECONDS = 0.0005
+ASSIGNMENT = {"id": "5f1c", "job_id": "9a0e", "submitter": "bench", "priority": 50, "study_name": "study",
+              "zip_file_path": "C:/data/driver/zip/20251018_120000-study.zip", "workload": "0-7", "worker": "worker_bee"}
+
+app = FastAPI()
+
+
+@app.post("/get_task")
+def get_task(worker: str, cores: int):
+    logging.info(f"Endpoint /get_work called by {worker} for {cores} work units.")
+    logging.info(f"Worker {worker} requesting up to {cores} workload items.")
+    logging.info("Persisting job queue state to disk.")
+    logging.debug(f"Assignment: {ASSIGNMENT}")
+    return ASSIGNMENT
+
+
+class SlowConsole:
+    """A text stream whose writes block, releasing the GIL like a blocking write system call does."""
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        time.sleep(CONSOLE_WRITE_SECONDS)
+        return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def setup_synchronous_logging(log_path: str, console) -> None:
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    file_handler = logging.FileHandler(log_path, encoding="utf-8")
+    console_handler = logging.StreamHandler(console)
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+        root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+
+
+def measure(client: TestClient, number_of_requests: int) -> list[float]:
+    latencies = []
+    for i in range(number_of_requests):
+        start = time.perf_counter()
+        client.post("/get_task", params={"worker": f"worker{i % 16}", "cores": 8}).raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+def report(name: str, latencies: list[float]) -> None:
+    def ms(fraction: float) -> float:
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+    print(f"{name:<28} p50 {ms(0.5):6.3f} ms   p95 {ms(0.95):6.3f} ms   p99 {ms(0.99):6.3f} ms   "
+          f"total {sum(latencies):6.2f} s")
+
+
+def run_benchmark(number_of_requests: int) -> None:
+    initial_cwd = os.getcwd()
+    stderr = sys.stderr
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, TestClient(app) as client, \
+            open(os.path.join(tmp, "console.txt"), "w", encoding="utf-8") as console_file:
+        os.chdir(tmp)
+        try:
+            measure(client, 100)  # warm up
+            for console_name, console in (("file console", console_file), ("slow console", SlowConsole(console_file))):
+                setup_synchronous_logging(os.path.join(tmp, "sync.log.txt"), console)
+                results.append((f"synchronous, {console_name}", measure(client, number_of_requests)))
+                sys.stderr = console  # the console handler of setup_root_logger writes to sys.stderr
+                setup_root_logger("bench.log")
+                results.append((f"queue, {console_name}", measure(client, number_of_requests)))
+                flush_logs()
+                sys.stderr = stderr
+        finally:
+            sys.stderr = stderr
+            os.chdir(initial_cwd)
+    print(f"{number_of_requests} requests, 4 log lines each")
+    for name, latencies in results:
+        report(name, latencies)
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUMBER_OF_REQUESTS)
@@ -0,0 +1,44 @@
+"""
+Benchmark the parallel scanner against the os.walk + os.path.getsize pattern it replaces.
+Run from the root of the repo:
+    python benchmarks/bench_scanner.py [number_of_files] [existing_study_path]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from bench_zip import create_synthetic_study
+from utils.scanner import scan_tree
+
+DEFAULT_NUMBER_OF_FILES = 100000
+
+
+def walk_and_stat(root: str) -> int:
+    total_size = 0
+    for folder_path, folder_names, file_names in os.walk(root):
+        for f in file_names:
+            fp = os.path.join(folder_path, f)
+            if os.path.isfile(fp):
+                total_size += os.path.getsize(fp)
+    return total_size
+
+
+def run_benchmark(study_path: str) -> None:
+    for name, function in (("os.walk + stat", walk_and_stat), ("scan_tree", lambda root: scan_tree(root).total_size)):
+        start = time.perf_counter()
+        total_size = function(study_path)
+        print(f"{name:<16}{time.perf_counter() - start:>8.2f}s  {total_size / 1024**2:.1f} MB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        run_benchmark(sys.argv[2])
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            number_of_files = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUMBER_OF_FILES
+            create_synthetic_study(tmp, number_of_files)
+            print(f"Synthetic study: {number_of_files} files")
+            run_benchmark(tmp)
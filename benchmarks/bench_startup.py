@@ -0,0 +1,82 @@
+"""
+Benchmark the cold start of the driver job queue with a long history of finished jobs.
+Compares unpickling every finished job and checking its files, as the driver did with a single finished list,
+against reading the index of the finished job archive, which loads a job only when it is queried.
+Run from the root of the repo:
+    python benchmarks/bench_startup.py [number_of_jobs] [tasks_per_job]
+"""
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from driver.archive import FinishedJobArchive
+from driver.cost_model import StudyProfile
+from driver.jobs import Job, JobQueue, Task, TaskStatus
+from utils.year_set import YearSet
+
+DEFAULT_NUMBER_OF_JOBS = 5000
+DEFAULT_TASKS_PER_JOB = 50
+
+
+def make_finished_job(study_folder_path: str, number: int, tasks_per_job: int) -> Job:
+    job = Job("user", 50, None, study_name=f"study_{number}")
+    job.study_path = os.path.join(study_folder_path, job.study_name)
+    job.output_dir = os.path.join(job.study_path, "output", "run")
+    job.workload = YearSet(range(tasks_per_job * 8))
+    job.profile = StudyProfile(areas=10, links=12, thermal_clusters=40, renewable_clusters=5, hours=8760,
+                               unit_commitment_mode="fast")
+    for first_year in range(0, len(job.workload), 8):
+        task = Task(job, f"worker_{first_year % 7}")
+        task.workload, task.status = YearSet(range(first_year, first_year + 8)), TaskStatus.COMPLETED
+        task.telemetry = {"wall_time_seconds": 120.0, "cores": 8, "peak_rss_bytes": 2 ** 30}
+        task.spans = [{"name": "run_antares", "start": 0.0, "duration": 120.0}]
+        job.tasks.append(task)
+        job.year_index.update({year: {"worker": task.worker, "task_id": task.id} for year in task.workload})
+    job.percentage_complete = 100
+    job.finished_at = time.time()
+    return job
+
+
+def run_benchmark(number_of_jobs: int, tasks_per_job: int) -> None:
+    print(f"{number_of_jobs} finished jobs of {tasks_per_job} tasks")
+    with tempfile.TemporaryDirectory() as tmp:
+        state_folder_path = os.path.join(tmp, "state")
+        archive = FinishedJobArchive(os.path.join(state_folder_path, "archive"))
+        jobs = [make_finished_job(os.path.join(tmp, "studies"), number, tasks_per_job)
+                for number in range(number_of_jobs)]
+        for job in jobs:
+            os.makedirs(job.output_dir)
+            archive.add(job)
+        finished_file_path = os.path.join(tmp, "finished.pkl")
+        with open(finished_file_path, "wb") as f:
+            pickle.dump(jobs, f)
+        del jobs, archive
+
+        start = time.perf_counter()
+        with open(finished_file_path, "rb") as f:
+            finished = [job for job in pickle.load(f) if job.is_backed_by_files()]
+        elapsed = time.perf_counter() - start
+        print(f"{'finished list':<16}{elapsed:>8.3f}s  {os.path.getsize(finished_file_path) / 1024 ** 2:>8.1f} MB read")
+        del finished
+
+        start = time.perf_counter()
+        job_queue = JobQueue(state_folder_path)
+        elapsed = time.perf_counter() - start
+        index_size = job_queue.archive.get_index_size()
+        print(f"{'archive':<16}{elapsed:>8.3f}s  {index_size / 1024 ** 2:>8.1f} MB read")
+
+        job_id = next(iter(job_queue.archive.records))
+        start = time.perf_counter()
+        job_queue.get_job_by_id(job_id)
+        print(f"{'first query':<16}{time.perf_counter() - start:>8.3f}s")
+        job_queue.synthesis_executor.shutdown()
+
+
+if __name__ == "__main__":
+    number_of_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUMBER_OF_JOBS
+    tasks_per_job = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_TASKS_PER_JOB
+    run_benchmark(number_of_jobs, tasks_per_job)
@@ -0,0 +1,64 @@
+"""
+Benchmark scheduling a study with many MC years, year lists against range-encoded year sets.
+Every round hands out a task of 'cores' years, like JobQueue.assign_task does, and then finishes it.
+Also compares the size of the persisted state and of the API payload.
+Run from the root of the repo:
+    python benchmarks/bench_year_set.py [number_of_years] [cores]
+"""
+import json
+import os
+import pickle
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.year_set import YearSet
+
+DEFAULT_NUMBER_OF_YEARS = 10000
+DEFAULT_CORES = 8
+
+
+def schedule_with_lists(number_of_years: int, cores: int) -> list[list[int]]:
+    workload = list(range(number_of_years))
+    tasks = []
+    while True:
+        unavailable = set()
+        for task in tasks:
+            unavailable.update(task)
+        available = [year for year in workload if year not in unavailable]
+        if not available:
+            return tasks
+        tasks.append(available[:cores])
+
+
+def schedule_with_year_sets(number_of_years: int, cores: int) -> list[YearSet]:
+    workload = YearSet(range(number_of_years))
+    tasks = []
+    while True:
+        unavailable = YearSet.from_ranges(r for task in tasks for r in task.ranges)
+        available = workload - unavailable
+        if not available:
+            return tasks
+        tasks.append(available.take_first(cores))
+
+
+def run_benchmark(number_of_years: int, cores: int) -> None:
+    print(f"{number_of_years} years handed out in tasks of {cores}")
+    for name, function, encode in (("list[int]", schedule_with_lists, lambda task: task),
+                                   ("YearSet", schedule_with_year_sets, str)):
+        start = time.perf_counter()
+        tasks = function(number_of_years, cores)
+        elapsed = time.perf_counter() - start
+        state_size = len(pickle.dumps(tasks))
+        payload_size = len(json.dumps({"workload": encode(tasks[0])}))
+        full_workload = YearSet(range(number_of_years)) if name == "YearSet" else list(range(number_of_years))
+        workload_payload_size = len(json.dumps(encode(full_workload)))
+        print(f"{name:<10}{elapsed:>8.2f}s  state {state_size / 1024:>8.1f} kB  "
+              f"task payload {payload_size:>4} B  full workload payload {workload_payload_size:>6} B")
+
+
+if __name__ == "__main__":
+    number_of_years = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUMBER_OF_YEARS
+    cores = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CORES
+    run_benchmark(number_of_years, cores)
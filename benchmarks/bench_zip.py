@@ -0,0 +1,76 @@
+"""
+Benchmark the available zip and unzip methods on a synthetic study, stored and deflated.
+The study mimics Antares input: many small tab separated time series files.
+Run from the root of the repo:
+    python benchmarks/bench_zip.py [number_of_files]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.compression import CompressionProfile
+from utils.smart_zip import (unzip_with_7z, unzip_with_builtin, unzip_with_builtin_parallel,
+                             zip_with_7z, zip_with_builtin, zip_with_builtin_parallel)
+
+DEFAULT_NUMBER_OF_FILES = 20000
+FILES_PER_FOLDER = 200
+ROWS_PER_FILE = 50
+
+
+def create_synthetic_study(study_path: str, number_of_files: int) -> int:
+    """Write number_of_files small time series files, return the total number of bytes."""
+    rng = random.Random(42)
+    total_bytes = 0
+    for i in range(number_of_files):
+        folder = os.path.join(study_path, "input", "series", f"area_{i // FILES_PER_FOLDER:04d}")
+        os.makedirs(folder, exist_ok=True)
+        rows = ["\t".join(str(rng.randint(0, 5000)) for _ in range(8)) for _ in range(ROWS_PER_FILE)]
+        contents = "\n".join(rows) + "\n"
+        with open(os.path.join(folder, f"series_{i}.txt"), "w") as f:
+            f.write(contents)
+        total_bytes += len(contents)
+    return total_bytes
+
+
+def time_call(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def run_benchmark(number_of_files: int) -> None:
+    seven_zip_exe = shutil.which("7z")
+    zip_methods = {}
+    for profile in (CompressionProfile.STORE, CompressionProfile.FAST, CompressionProfile.BALANCED):
+        zip_methods[f"zipfile {profile.value}"] = (
+            lambda src, dst, profile=profile: zip_with_builtin(src, dst, set(), profile), unzip_with_builtin)
+        zip_methods[f"zipfile_parallel {profile.value}"] = (
+            lambda src, dst, profile=profile: zip_with_builtin_parallel(src, dst, set(), compression_profile=profile),
+            unzip_with_builtin_parallel)
+        if seven_zip_exe:
+            zip_methods[f"7z {profile.value}"] = (
+                lambda src, dst, profile=profile: zip_with_7z(src, dst, seven_zip_exe, set(), profile),
+                lambda src, dst: unzip_with_7z(src, dst, seven_zip_exe))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        study_path = os.path.join(tmp, "study")
+        total_bytes = create_synthetic_study(study_path, number_of_files)
+        print(f"Synthetic study: {number_of_files} files, {total_bytes / 1024**2:.1f} MB, {os.cpu_count()} cores")
+        print(f"{'method':<28}{'zip [s]':>10}{'unzip [s]':>12}{'zip MB/s':>12}{'ratio':>8}")
+        for name, (zip_function, unzip_function) in zip_methods.items():
+            zip_path = os.path.join(tmp, f"{name}.zip")
+            extract_path = os.path.join(tmp, f"{name}_extracted")
+            zip_time = time_call(zip_function, study_path, zip_path)
+            unzip_time = time_call(unzip_function, zip_path, extract_path)
+            ratio = os.path.getsize(zip_path) / total_bytes
+            print(f"{name:<28}{zip_time:>10.2f}{unzip_time:>12.2f}{total_bytes / 1024**2 / zip_time:>12.1f}"
+                  f"{ratio:>8.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUMBER_OF_FILES)
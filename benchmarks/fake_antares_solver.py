@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the Antares solver, to benchmark the driver and workers without solver licences.
+It accepts the command line the worker uses:
+    fake_antares_solver.py --input="<study>" --name="" --force-parallel="<cores>"
+reads the playlist from settings/generaldata.ini, spends a configurable time per MC year, running up to
+--force-parallel years at once, and writes an output folder like Antares does: economy/mc-ind/NNNNN with a
+values table per area and a simulation.log ending in "Quitting the solver gracefully".
+
+The cost model is set with environment variables:
+    FAKE_ANTARES_SECONDS_PER_YEAR  wall time of one MC year (default 0.05)
+    FAKE_ANTARES_JITTER            relative random variation of that time (default 0.2)
+    FAKE_ANTARES_FAILURE_RATE      probability that the output of a year is not written (default 0)
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.ini import robust_read_ini
+from utils.study_metadata import read_study_metadata
+
+VARIABLES = [("OV. COST", "Euro"), ("LOAD", "MWh"), ("UNSP. ENRG", "MWh")]
+
+
+def write_area_table(file_path: str, area_id: str, hours: int, rng: random.Random) -> None:
+    """An hourly values table in the layout read by utils.antares_output."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    header = [
+        f"{area_id.upper()}\tarea\tva\thourly",
+        "\tVARIABLES\tBEGIN\tEND",
+        f"\t{len(VARIABLES)}\t1\t{hours}",
+        "",
+        f"{area_id.upper()}\thourly\t\t\t\t" + "\t".join(name for name, _ in VARIABLES),
+        "\t\t\t\t\t" + "\t".join(unit for _, unit in VARIABLES),
+        "\tindex\tday\tmonth\thour\t" + "\t".join("EXP" for _ in VARIABLES),
+    ]
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(header) + "\n")
+        for hour in range(hours):
+            values = "\t".join(str(rng.randint(0, 100000)) for _ in VARIABLES)
+            f.write(f"\t{hour + 1}\t{hour // 24 + 1:02d}\tJAN\t{hour % 24:02d}:00\t{values}\n")
+
+
+def solve_year(mc_ind_path: str, year: int, area_ids: tuple[str, ...], hours: int,
+               seconds_per_year: float, jitter: float, failure_rate: float) -> bool:
+    rng = random.Random(year)
+    time.sleep(max(0.0, seconds_per_year * (1 + rng.uniform(-jitter, jitter))))
+    if random.random() < failure_rate:
+        return False
+    year_path = os.path.join(mc_ind_path, str(year + 1).zfill(5))
+    for area_id in area_ids:
+        write_area_table(os.path.join(year_path, "areas", area_id, "values-hourly.txt"), area_id, hours, rng)
+    return True
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fake Antares solver for benchmarks.")
+    parser.add_argument("--input", required=True)
+    parser.add_argument("--name", default="")
+    parser.add_argument("--force-parallel", type=int, default=1)
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    metadata = read_study_metadata(args.input)
+    general = robust_read_ini(os.path.join(args.input, "settings", "generaldata.ini")).get("general", {})
+    days = int(general.get("simulation.end", 365)) - int(general.get("simulation.start", 1)) + 1
+    suffix = "eco" if metadata.mode == "economy" else "adq"
+    output_path = os.path.join(args.input, "output", datetime.now().strftime("%Y%m%d-%H%M%S%f") + suffix
+                               + (f"-{args.name}" if args.name else ""))
+    mc_ind_path = os.path.join(output_path, metadata.output_mode_folder, "mc-ind")
+    os.makedirs(mc_ind_path, exist_ok=True)
+
+    seconds_per_year = float(os.environ.get("FAKE_ANTARES_SECONDS_PER_YEAR", 0.05))
+    jitter = float(os.environ.get("FAKE_ANTARES_JITTER", 0.2))
+    failure_rate = float(os.environ.get("FAKE_ANTARES_FAILURE_RATE", 0))
+    years = list(metadata.playlist)
+    with ThreadPoolExecutor(max(1, args.force_parallel)) as executor:
+        solved = list(executor.map(lambda year: solve_year(mc_ind_path, year, metadata.area_ids, days * 24,
+                                                           seconds_per_year, jitter, failure_rate), years))
+
+    with open(os.path.join(output_path, "simulation.log"), "w", encoding="utf-8") as f:
+        f.write(f"[fake solver] Study: {args.input}\n")
+        f.write(f"[fake solver] {len(years)} MC year(s) on {args.force_parallel} core(s), {solved.count(False)} failed\n")
+        f.write(f"[fake solver] Elapsed: {time.monotonic() - start:.3f}s\n")
+        f.write("[fake solver] Quitting the solver gracefully.\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
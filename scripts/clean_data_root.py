@@ -2,6 +2,11 @@
 import logging
 import os
 import shutil
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.scanner import scan_tree
 
 logging.basicConfig(level=logging.INFO)  # Or logging.DEBUG for more details
 
@@ -10,35 +15,29 @@ WORKER_ROOT_FOLDER_PATH = "data/worker/"
 
 def clean_root_data_folder(root_folder_path: str):
     # delete contents of zip, study, and queue folders
-    zip_folder = os.path.join(root_folder_path, "zip")
-    try:
-        shutil.rmtree(zip_folder)
-        logging.info(f"Deleted directory: {zip_folder}")
-    except Exception as e:
-        logging.error(f"Error deleting {zip_folder}: {e}")
-
-    study_folder = os.path.join(root_folder_path, "study")
-    try:
-        shutil.rmtree(study_folder)
-        logging.info(f"Deleted directory: {study_folder}")
-    except Exception as e:
-        logging.error(f"Error deleting {study_folder}: {e}")
-
-    state_folder = os.path.join(root_folder_path, "state")
-    try:
-        shutil.rmtree(state_folder)
-        logging.info(f"Deleted directory: {state_folder}")
-    except Exception as e:
-        logging.error(f"Error deleting {state_folder}: {e}")
+    sub_folders = [os.path.join(root_folder_path, name) for name in ("zip", "study", "state")]
+    for folder in sub_folders:
+        delete_folder(folder)
 
     # creating empty folders again
-    os.makedirs(zip_folder, exist_ok=True)
-    os.makedirs(study_folder, exist_ok=True)
-    os.makedirs(state_folder, exist_ok=True)
+    for folder in sub_folders:
+        os.makedirs(folder, exist_ok=True)
 
     logging.info("Done.")
 
 
+def delete_folder(folder: str):
+    """Delete a folder and report how much was freed, measured with the parallel scanner."""
+    if not os.path.exists(folder):
+        logging.info(f"Nothing to delete at {folder}")
+        return
+    try:
+        tree = scan_tree(folder)
+        shutil.rmtree(folder)
+        logging.info(f"Deleted directory: {folder} ({len(tree.files)} files, {tree.total_size / 1024**2:.1f} MB)")
+    except Exception as e:
+        logging.error(f"Error deleting {folder}: {e}")
+
 if __name__ == "__main__":
     # Comment out one of the two lines below to only clean driver or worker data
     clean_root_data_folder(DRIVER_ROOT_FOLDER_PATH)
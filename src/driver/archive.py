@@ -0,0 +1,174 @@
+"""
+On-disk archive of finished jobs. The driver keeps only a compact record of every finished job in memory, read at
+startup from an index, and loads a job itself when it is queried, e.g. for its tasks, year index or timeline:
+    <folder>/index.jsonl       one JSON record per line, appended to; a later record of a job replaces earlier ones
+                               and a record {"id": ..., "removed": true} removes the job
+    <folder>/jobs/<id>.pkl     the pickled Job
+The index is compacted at startup once it holds more superseded lines than live records.
+"""
+from collections import OrderedDict
+import json
+import logging
+import os
+import pickle
+import threading
+from typing import Optional
+
+from driver.cost_model import get_task_seconds_per_year
+from driver.traces import TraceStore
+
+INDEX_FILE_NAME = "index.jsonl"
+CACHE_SIZE = 32  # jobs loaded from the archive kept in memory, most recently used
+
+
+class ArchivedJob:
+    """Compact record of a finished job: enough to list it, apply retention to it and calibrate the cost model."""
+    __slots__ = ("id", "submitter", "priority", "study_name", "study_path", "output_dir", "zip_file_path",
+                 "sweep_id", "variant_name", "workload_length", "years_done", "percentage_complete", "finished_at",
+                 "deleted_storage", "cost_ratios", "pending")
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+        self.deleted_storage = set(self.deleted_storage or ())
+        self.cost_ratios = list(self.cost_ratios or ())
+
+    @classmethod
+    def from_job(cls, job: "Job", pending: bool) -> "ArchivedJob":
+        """:param pending: background synthesis or export of the job may not be done yet"""
+        from driver.jobs import TaskStatus  # driver.jobs imports this module
+        observed = [get_task_seconds_per_year(task.telemetry, len(task.workload)) for task in job.tasks
+                    if task.status == TaskStatus.COMPLETED]
+        return cls(id=job.id, submitter=job.submitter, priority=job.priority, study_name=job.study_name,
+                   study_path=job.study_path, output_dir=job.output_dir, zip_file_path=job.zip_file_path,
+                   sweep_id=job.sweep_id, variant_name=job.variant["name"] if job.variant else None,
+                   workload_length=len(job.workload) if job.workload else 0,
+                   years_done=len(job.get_succeeded_years()), percentage_complete=job.percentage_complete,
+                   # jobs finished before this was recorded: when their last task started
+                   finished_at=job.finished_at or max((task.created_at for task in job.tasks), default=0.0),
+                   deleted_storage=job.deleted_storage,
+                   cost_ratios=[seconds / job.profile.work_units for seconds in observed if seconds]
+                   if job.profile is not None else [],
+                   pending=pending)
+
+    def to_dict(self) -> dict:
+        record = {name: getattr(self, name) for name in self.__slots__}
+        record["deleted_storage"] = sorted(self.deleted_storage)
+        return record
+
+
+class FinishedJobArchive:
+    def __init__(self, folder_path: str, traces: "Optional[TraceStore]" = None):
+        """:param traces: where the spans and telemetry of the jobs are, they are not pickled with them"""
+        self.folder_path = folder_path
+        self.traces = traces
+        self.index_file = os.path.join(folder_path, INDEX_FILE_NAME)
+        self.jobs_folder_path = os.path.join(folder_path, "jobs")
+        os.makedirs(self.jobs_folder_path, exist_ok=True)
+        self.records: dict[str, ArchivedJob] = {}  # job id -> record, in the order the jobs finished
+        self.cache: OrderedDict[str, "Job"] = OrderedDict()  # loaded jobs by id, least recently used first
+        self.lock = threading.RLock()
+        self.load_index()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self.records
+
+    def load_index(self):
+        lines = 0
+        if os.path.exists(self.index_file):
+            with open(self.index_file, encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logging.warning(f"Skipping unreadable line {lines} of the job archive index.")
+                        continue
+                    if record.get("removed"):
+                        self.records.pop(record["id"], None)
+                    else:
+                        self.records[record["id"]] = ArchivedJob(**record)
+        if lines > 2 * len(self.records):
+            self.compact_index()
+
+    def compact_index(self):
+        """Rewrite the index with only the latest record of every archived job."""
+        partial_index_file = self.index_file + ".part"
+        with open(partial_index_file, "w", encoding="utf-8") as f:
+            for record in self.records.values():
+                f.write(json.dumps(record.to_dict()) + "\n")
+        os.replace(partial_index_file, self.index_file)
+
+    def append_to_index(self, record: dict):
+        with open(self.index_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def get_job_file_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_folder_path, f"{job_id}.pkl")
+
+    def add(self, job: "Job", pending: bool = False):
+        """Archive a finished job, or save it again after its background work is done."""
+        with self.lock:
+            if self.traces is not None:
+                self.traces.attach(job)  # before pickling drops them, for jobs that never were in the queue
+            partial_job_file = self.get_job_file_path(job.id) + ".part"
+            with open(partial_job_file, "wb") as f:
+                pickle.dump(job, f)
+            os.replace(partial_job_file, self.get_job_file_path(job.id))
+            record = ArchivedJob.from_job(job, pending)
+            self.records[job.id] = record
+            self.append_to_index(record.to_dict())
+            self.remember(job)
+
+    def load(self, job_id: str) -> "Optional[Job]":
+        """:return the archived Job, None if it is not in the archive"""
+        with self.lock:
+            record = self.records.get(job_id)
+            if record is None:
+                return None
+            job = self.cache.get(job_id)
+            if job is None:
+                try:
+                    with open(self.get_job_file_path(job_id), "rb") as f:
+                        job = pickle.load(f)
+                except (OSError, pickle.UnpicklingError, EOFError) as e:
+                    logging.error(f"Could not load archived job {job_id}: {e}")
+                    return None
+            job.deleted_storage = set(record.deleted_storage)  # kept up to date in the index only
+            if self.traces is not None:
+                self.traces.attach(job)
+            self.remember(job)
+            return job
+
+    def remember(self, job: "Job"):
+        self.cache[job.id] = job
+        self.cache.move_to_end(job.id)
+        while len(self.cache) > CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+    def update(self, record: ArchivedJob):
+        """Save a changed record, e.g. storage deleted by retention."""
+        with self.lock:
+            self.records[record.id] = record
+            self.append_to_index(record.to_dict())
+            if record.id in self.cache:
+                self.cache[record.id].deleted_storage = set(record.deleted_storage)
+
+    def remove(self, job_id: str):
+        with self.lock:
+            if self.records.pop(job_id, None) is None:
+                return
+            self.cache.pop(job_id, None)
+            self.append_to_index({"id": job_id, "removed": True})
+            if self.traces is not None:
+                self.traces.remove(job_id)
+            try:
+                os.remove(self.get_job_file_path(job_id))
+            except FileNotFoundError:
+                pass
+
+    def get_index_size(self) -> int:
+        return os.path.getsize(self.index_file) if os.path.exists(self.index_file) else 0
@@ -0,0 +1,90 @@
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """Content-addressed store of study files on the driver.
+    Every file is stored once under its sha256 hash, as <store>/<first 2 hex chars>/<hash>.
+    Studies are materialised from the store with hardlinks, so identical files across jobs share disk space.
+    """
+    def __init__(self, store_folder_path: str):
+        self.store_folder_path = os.path.abspath(store_folder_path)
+        os.makedirs(self.store_folder_path, exist_ok=True)
+
+    def get_blob_path(self, sha256: str) -> str:
+        return os.path.join(self.store_folder_path, sha256[:2], sha256)
+
+    def has_blob(self, sha256: str) -> bool:
+        return os.path.exists(self.get_blob_path(sha256))
+
+    def get_missing_blobs(self, hashes: list[str]) -> list[str]:
+        """Return the hashes, without duplicates, that are not in the store yet.
+        The blobs that are there are touched, so retention does not collect them before the study is materialised.
+        """
+        missing = []
+        for sha256 in dict.fromkeys(hashes):
+            try:
+                os.utime(self.get_blob_path(sha256))
+            except FileNotFoundError:
+                missing.append(sha256)
+        return missing
+
+    async def add_blob(self, sha256: str, chunks) -> bool:
+        """Store the bytes of an async chunk iterator under their hash.
+        The content is verified against the announced hash before it becomes visible in the store.
+        :return True if stored, False if the content did not match the hash.
+        """
+        if self.has_blob(sha256):
+            # drain the body anyway, the client is still sending it
+            async for _ in chunks:
+                pass
+            return True
+        blob_path = self.get_blob_path(sha256)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        temporary_path = f"{blob_path}.{uuid.uuid4().hex}.tmp"
+        hasher = hashlib.sha256()
+        with open(temporary_path, "wb") as f:
+            async for chunk in chunks:
+                hasher.update(chunk)
+                f.write(chunk)
+        if hasher.hexdigest() != sha256:
+            logging.error(f"Uploaded blob does not match its hash {sha256}, discarding it.")
+            os.remove(temporary_path)
+            return False
+        os.replace(temporary_path, blob_path)
+        return True
+
+    def materialise(self, files: list[dict], empty_dirs: list[str], target_folder_path: str) -> None:
+        """Recreate a study folder from the store.
+
+        Args:
+            files: manifest entries with a relative "path" (forward slashes) and a "sha256"
+            empty_dirs: relative paths of empty directories to recreate
+            target_folder_path: folder to create, must not exist yet
+        """
+        logging.info(f"Materialising {len(files)} files from the blob store into {target_folder_path}.")
+        os.makedirs(target_folder_path)
+        for rel_dir in empty_dirs:
+            os.makedirs(self.get_target_path(target_folder_path, rel_dir), exist_ok=True)
+        for entry in files:
+            target_path = self.get_target_path(target_folder_path, entry["path"])
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            blob_path = self.get_blob_path(entry["sha256"])
+            try:
+                os.link(blob_path, target_path)
+            except OSError:
+                # e.g. store and study folder on different volumes
+                shutil.copyfile(blob_path, target_path)
+
+    @staticmethod
+    def get_target_path(target_folder_path: str, rel_path: str) -> str:
+        """Join a manifest path to the target folder, refusing paths that escape it."""
+        parts = [part for part in rel_path.split("/") if part]
+        if not parts or rel_path.startswith("/") or ".." in parts or ":" in parts[0]:
+            raise ValueError(f"Invalid path in manifest: {rel_path}")
+        return os.path.join(target_folder_path, *parts)
@@ -0,0 +1,107 @@
+"""
+Cost model of Antares studies, used to estimate when queued jobs start and finish.
+
+A study is profiled once when its job is prepared: the size of its network (areas, links, clusters),
+its time horizon and its unit commitment mode give a number of work units per MC year.
+The model converts work units into core-seconds per MC year with a coefficient calibrated on the
+runtimes of completed tasks, so estimates improve as the driver sees more jobs.
+"""
+from collections import deque
+from dataclasses import asdict, dataclass
+import os
+import statistics
+from typing import Optional
+
+from utils.ini import robust_read_ini
+from utils.study_metadata import read_study_metadata
+
+HOURS_PER_YEAR = 8760
+UNIT_COMMITMENT_FACTORS = {"fast": 1.0, "accurate": 3.0, "milp": 5.0}
+DEFAULT_SECONDS_PER_WORK_UNIT = 0.5  # core-seconds, used until a task has been observed
+MAX_SAMPLES = 200  # most recent task observations used for calibration
+
+
+@dataclass
+class StudyProfile:
+    areas: int
+    links: int
+    thermal_clusters: int
+    renewable_clusters: int
+    hours: int  # simulated hours per MC year
+    unit_commitment_mode: str
+
+    @property
+    def work_units(self) -> float:
+        """Relative cost of one MC year: network elements, scaled by horizon and unit commitment mode."""
+        elements = self.areas + self.links + self.thermal_clusters + self.renewable_clusters
+        factor = UNIT_COMMITMENT_FACTORS.get(self.unit_commitment_mode, 1.0)
+        return max(1, elements) * self.hours / HOURS_PER_YEAR * factor
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "work_units": round(self.work_units, 3)}
+
+
+def count_ini_sections(folder_path: str, file_name: str) -> int:
+    """Sum the sections of <folder>/<area>/<file_name> over all area subfolders."""
+    if not os.path.isdir(folder_path):
+        return 0
+    total = 0
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            ini_file_path = os.path.join(entry.path, file_name)
+            if entry.is_dir() and os.path.exists(ini_file_path):
+                total += len(robust_read_ini(ini_file_path))
+    return total
+
+
+def profile_study(study_path: str) -> StudyProfile:
+    """Profile a study from its input folder and its generaldata.ini."""
+    generaldata = robust_read_ini(os.path.join(study_path, "settings", "generaldata.ini"))
+    general = generaldata.get("general", {})
+    first_day = int(general.get("simulation.start", 1))
+    last_day = int(general.get("simulation.end", 365))
+    return StudyProfile(
+        areas=len(read_study_metadata(study_path).area_ids),
+        links=count_ini_sections(os.path.join(study_path, "input", "links"), "properties.ini"),
+        thermal_clusters=count_ini_sections(os.path.join(study_path, "input", "thermal", "clusters"), "list.ini"),
+        renewable_clusters=count_ini_sections(os.path.join(study_path, "input", "renewables", "clusters"), "list.ini"),
+        hours=max(1, last_day - first_day + 1) * 24,
+        unit_commitment_mode=generaldata.get("other preferences", {}).get("unit-commitment-mode", "fast").lower(),
+    )
+
+
+def get_task_seconds_per_year(telemetry: dict, year_count: int) -> Optional[float]:
+    """Core-seconds per MC year of a finished task. Antares runs up to 'cores' years in parallel."""
+    if not telemetry or year_count == 0:
+        return None
+    return telemetry["wall_time_seconds"] * min(telemetry["cores"], year_count) / year_count
+
+
+class CostModel:
+    """Predicts core-seconds per MC year from a StudyProfile, as coefficient * work units.
+    The coefficient is the median of the observed ratios of the most recent tasks.
+    """
+    def __init__(self):
+        self.ratios: deque[float] = deque(maxlen=MAX_SAMPLES)  # observed core-seconds per work unit
+
+    def observe(self, profile: StudyProfile, seconds_per_year: float) -> None:
+        if profile is None or seconds_per_year is None or seconds_per_year <= 0:
+            return
+        self.ratios.append(seconds_per_year / profile.work_units)
+
+    def observe_ratios(self, ratios: list[float]) -> None:
+        """Replay ratios observed earlier, e.g. those of archived jobs at startup."""
+        self.ratios.extend(ratios)
+
+    @property
+    def seconds_per_work_unit(self) -> float:
+        return statistics.median(self.ratios) if self.ratios else DEFAULT_SECONDS_PER_WORK_UNIT
+
+    def predict(self, profile: Optional[StudyProfile]) -> float:
+        """Core-seconds per MC year of a study."""
+        work_units = profile.work_units if profile is not None else 1.0
+        return self.seconds_per_work_unit * work_units
+
+    def summary(self) -> dict:
+        return {"samples": len(self.ratios), "seconds_per_work_unit": round(self.seconds_per_work_unit, 4)}
+
@@ -0,0 +1,89 @@
+"""
+Job and task state transitions published as they happen, for the /events server-sent event stream.
+Events are published from any thread and delivered to the asyncio queue of every matching subscriber:
+the endpoints publish job_queued, task_assigned, task_finished and job_finished, the synthesis executor
+years_copied and synthesis_done once the background work scheduled by a finished task is done.
+Recent events are kept so a client that reconnects with the id of the last event it saw (the Last-Event-ID header)
+misses nothing.
+"""
+import asyncio
+from collections import deque
+from datetime import datetime
+import itertools
+import json
+import logging
+import threading
+from typing import Optional
+
+HISTORY_SIZE = 1000  # events kept for replay to reconnecting clients
+SUBSCRIBER_QUEUE_SIZE = 1000  # events buffered per client before it is disconnected as too slow
+
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, job_id: Optional[str], submitter: Optional[str]):
+        self.loop = loop
+        self.job_id = job_id
+        self.submitter = submitter
+        self.queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False  # set when the client fell behind, its stream is then closed
+
+    def matches(self, event: dict) -> bool:
+        return (self.job_id is None or event.get("job_id") == self.job_id) and \
+               (self.submitter is None or event.get("submitter") == self.submitter)
+
+    def deliver(self, event: dict) -> None:
+        """Runs in the event loop of the subscriber."""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)  # end of stream, the client reconnects and replays from its last event
+
+
+class EventBus:
+    def __init__(self):
+        self.counter = itertools.count(1)
+        self.history: deque[dict] = deque(maxlen=HISTORY_SIZE)
+        self.subscriptions: list[Subscription] = []
+        self.lock = threading.Lock()
+
+    def publish(self, event_type: str, job_id: str, submitter: str, **data) -> dict:
+        with self.lock:
+            event = {"id": next(self.counter), "type": event_type, "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                     "job_id": job_id, "submitter": submitter, **data}
+            self.history.append(event)
+            subscriptions = [subscription for subscription in self.subscriptions if subscription.matches(event)]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:  # the loop of the subscriber is closed
+                logging.debug(f"Dropping event {event['id']} for a subscriber whose event loop is closed.")
+        return event
+
+    def subscribe(self, job_id: Optional[str] = None, submitter: Optional[str] = None,
+                  last_event_id: Optional[int] = None) -> Subscription:
+        """Subscribe from within the event loop that will consume the events.
+        With last_event_id, the matching events published after it are queued first.
+        """
+        subscription = Subscription(asyncio.get_running_loop(), job_id, submitter)
+        with self.lock:
+            if last_event_id is not None:
+                for event in self.history:
+                    if event["id"] > last_event_id and subscription.matches(event):
+                        subscription.deliver(event)
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+
+
+def format_sse(event: dict) -> str:
+    """Server-sent event text of an event. Events without an id (snapshots) do not move the client's Last-Event-ID."""
+    id_line = f"id: {event['id']}\n" if "id" in event else ""
+    return f"{id_line}event: {event['type']}\ndata: {json.dumps(event)}\n\n"
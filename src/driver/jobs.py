@@ -1,32 +1,76 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import itertools
 import logging
 import os
 import pickle
 from queue import PriorityQueue
+import shutil
+import statistics
 import threading
-from typing import Optional
+import time
+from typing import Callable, Optional
 import uuid
 
+from driver.archive import FinishedJobArchive
 from driver.payload_models import TaskDoneRequest
+from driver.synthesis import McAllSynthesizer
+from driver.blob_store import BlobStore
+from driver.cost_model import CostModel, StudyProfile, get_task_seconds_per_year, profile_study
+from driver.events import EventBus
+from driver.staging import StagingStats, choose_staging_workers
+from driver.traces import TraceStore
 from utils.smart_zip import smart_unzip_file
 from utils.antares import AntaresStudy
-from utils.symlink import create_symlink_with_same_name
+from utils.scanner import PathExistenceCache
+from utils.study_metadata import read_study_metadata
+from utils.symlink import create_link, create_links
+from utils.tracing import Tracer
+from utils.variants import get_variant_playlist, write_variant_files
+from utils.year_set import YearSet
+
+MAX_YEAR_ATTEMPTS = 3  # a year is given up on after failing this many times
 
 class JobQueue:
-    def __init__(self, persisted_queue_folder_path: str):
+    def __init__(self, persisted_queue_folder_path: str, fleet_window_seconds: float = 600,
+                 task_lease_seconds: float = None):
         self.persisted_queue_folder_path = persisted_queue_folder_path
         self.queue_file = os.path.join(persisted_queue_folder_path, "queue.pkl")
-        self.finished_file = os.path.join(persisted_queue_folder_path, "finished.pkl")
+        self.finished_file = os.path.join(persisted_queue_folder_path, "finished.pkl")  # before the archive existed
         self.counter = itertools.count() # unique sequence count to establish round robin for same-priority jobs
         self.queue = PriorityQueue() # (priority, count, job) tuples that are the jobs that aren't done yet
-        self.finished: list[Job] = [] # holds jobs that are finished
+        self.archive: FinishedJobArchive = None # finished jobs, loaded when queried
+        self.traces = TraceStore(os.path.join(persisted_queue_folder_path, "traces")) # spans and telemetry of the jobs
+        self.synthesis_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="synthesis") # mc-all, Parquet, copies
+        self.cost_model = CostModel() # calibrated on the runtimes of completed tasks
+        self.workers_seen: dict[str, tuple[datetime, int]] = {} # worker -> (last task request, cores)
+        self.fleet_window_seconds = fleet_window_seconds # workers seen within this window count as active
+        self.task_lease_seconds = task_lease_seconds # running tasks older than this are failed and reassigned, None: never
+        self.idle_workers: set[str] = set() # workers whose last task request found no work
+        self.last_task_requests: dict[str, tuple[str, Optional["Task"]]] = {} # worker -> (request id, its answer)
+        self.staging = StagingStats() # pre-staging hints and their hit rate, see driver.staging
+        self.events = EventBus() # job and task state transitions, streamed by /events
+        self.persist_stats = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0} # time spent writing state to disk
         self.load_state()
-        self.lock = threading.Lock()
+        self.lock = threading.RLock()
 
     def load_state(self):
         logging.info("Loading job queue state from disk. Removing items no longer backed by files on disk.")
+        existence_cache = PathExistenceCache()  # one directory listing per folder instead of a stat per job
+        # Finished jobs: only their records are read, jobs whose background work was interrupted are resumed
+        self.archive = FinishedJobArchive(os.path.join(self.persisted_queue_folder_path, "archive"), self.traces)
+        if os.path.exists(self.finished_file):
+            self.migrate_finished_jobs(existence_cache)
+        for record in list(self.archive.records.values()):
+            self.cost_model.observe_ratios(record.cost_ratios)
+            if record.pending:
+                job = self.archive.load(record.id)
+                if job is not None:
+                    self.resume_synthesis(job)
+                    self.resume_export(job)
+                    self.synthesis_executor.submit(self.archive.add, job)
         # Load queue
         if os.path.exists(self.queue_file):
             with open(self.queue_file, "rb") as f:
@@ -35,38 +79,210 @@ class JobQueue:
                 self.counter_value = data.get("counter", 0)
                 self.counter = itertools.count(self.counter_value)
                 for prio, cnt, job in queue_items:
-                    if os.path.exists(job.zip_file_path) and os.path.exists(job.antares_study.study_path):
-                        logging.info(f"Re-adding job {job.antares_study.study_name} to queue.")
+                    if job.is_backed_by_files(existence_cache.exists):
+                        logging.info(f"Re-adding job {job.study_name} to queue.")
+                        self.traces.attach(job)
                         self.queue.put((prio, cnt, job))
+                        self.calibrate(job)
+                        self.resume_synthesis(job)
+                        self.resume_export(job)
                     else:
-                        logging.warning(f"Not re-adding job {job.antares_study.study_name}: missing files on disk.")
-        # Load finished list
-        if os.path.exists(self.finished_file):
-            with open(self.finished_file, "rb") as f:
-                finished_jobs = pickle.load(f)
-                for job in finished_jobs:
-                    if os.path.exists(job.zip_file_path) and os.path.exists(job.antares_study.study_path):
-                        self.finished.append(job)
-                    else:
-                        logging.warning(f"Not re-adding finished job {job.antares_study.study_name}: missing files on disk.")
+                        logging.warning(f"Not re-adding job {job.study_name}: missing files on disk.")
+
+    def migrate_finished_jobs(self, existence_cache: PathExistenceCache):
+        """Move the finished jobs of the list persisted before the archive existed into the archive."""
+        with open(self.finished_file, "rb") as f:
+            finished_jobs = pickle.load(f)
+        logging.info(f"Moving {len(finished_jobs)} finished jobs to the archive.")
+        for job in finished_jobs:
+            if job.id in self.archive:
+                continue
+            if job.is_backed_by_files(existence_cache.exists):
+                self.archive.add(job, pending=True)  # resumed once, like finished jobs were at every start before
+            else:
+                logging.warning(f"Not archiving finished job {job.study_name}: missing files on disk.")
+        os.replace(self.finished_file, self.finished_file + ".migrated")
+
+    def schedule_synthesis(self, job: "Job", years: list[int], finalize: bool):
+        """Fold newly linked years into the mc-all synthesis of the job in the background, in arrival order."""
+        if not job.config.get("synthesize_mc_all", True):
+            return
+        if years or finalize:
+            self.synthesis_executor.submit(self.synthesize_years, job, years, finalize)
+
+    def synthesize_years(self, job: "Job", years: list[int], finalize: bool):
+        """Runs on the synthesis executor, see Job.synthesize_years."""
+        job.synthesize_years(years, finalize)
+        self.publish_background_event("synthesis_done", job, years=str(YearSet(years)), finalized=finalize)
+
+    def copy_years(self, job: "Job", years_to_copy: dict[int, dict]):
+        """Runs on the synthesis executor, see Job.copy_years."""
+        copied_years = YearSet(job.copy_years(years_to_copy))
+        self.publish_background_event("years_copied", job, years=str(copied_years),
+                                      failed_years=str(YearSet(years_to_copy) - copied_years))
+
+    def publish_background_event(self, event_type: str, job: "Job", **data):
+        with self.lock:  # the tasks of the job may change meanwhile
+            progress = job.get_progress()
+        self.events.publish(event_type, job.id, job.submitter, **data, **progress)
+
+    def resume_synthesis(self, job: "Job"):
+        """After a restart, synthesize the years that were linked but not yet folded in before the driver stopped.
+        The saved synthesis state is loaded in the background, see Job.get_synthesizer."""
+        if job.config.get("synthesize_mc_all", True):
+            self.synthesis_executor.submit(job.resume_synthesis)
+
+    def schedule_export(self, job: "Job", years: list[int]):
+        """Convert newly linked years to the Parquet dataset of the job in the background."""
+        if job.config.get("export_parquet", False) and years:
+            self.synthesis_executor.submit(job.export_years, years)
+
+    def resume_export(self, job: "Job"):
+        """After a restart, export the years that were linked but are not in the Parquet dataset yet."""
+        if not job.config.get("export_parquet", False):
+            return
+        from utils.columnar import get_exported_years
+        exported = {mc_year - 1 for mc_year in get_exported_years(job.get_parquet_folder_path())}
+        self.schedule_export(job, sorted(job.get_succeeded_years() - exported))
+
+    def calibrate(self, job: "Job", tasks: list["Task"] = None):
+        """Feed the runtimes of completed tasks of a job, all of them by default, to the cost model."""
+        for task in job.tasks if tasks is None else tasks:
+            if task.status == TaskStatus.COMPLETED:
+                seconds_per_year = get_task_seconds_per_year(task.telemetry, len(task.workload))
+                self.cost_model.observe(job.profile, seconds_per_year)
+
+    def get_seconds_per_year(self, job: "Job") -> tuple[float, str]:
+        """Core-seconds one MC year of the job takes, and where the estimate comes from:
+        "observed" runs of the job itself, the calibrated cost "model", or the "default" of an uncalibrated model.
+        """
+        observed = job.get_observed_seconds_per_year()
+        if observed is not None:
+            return observed, "observed"
+        return self.cost_model.predict(job.profile), "model" if self.cost_model.ratios else "default"
+
+    def get_active_workers(self) -> dict[str, int]:
+        """:return cores per active worker, workers are active if they asked for work recently."""
+        now = datetime.now()
+        return {worker: cores for worker, (seen, cores) in self.workers_seen.items()
+                if (now - seen).total_seconds() <= self.fleet_window_seconds}
+
+    def get_fleet_cores(self) -> tuple[int, int]:
+        """:return (active workers, their total cores)"""
+        active = self.get_active_workers()
+        return len(active), sum(active.values())
+
+    def get_staging_hints(self, worker: str, cores: int) -> list["Job"]:
+        """Queued jobs whose study the worker should stage before it gets a task of them, see driver.staging."""
+        with self.lock:
+            workers = self.get_active_workers()
+            workers.setdefault(worker, cores)  # a worker may poll for hints before its first task request
+            hinted: dict[str, Job] = {}
+            years_ahead = 0
+            for prio, cnt, job in sorted(self.queue.queue, key=lambda item: item[:2]):
+                available = len(job.workload - job.get_unavailable_years()) if job.workload else 0
+                if job.study_name not in hinted and not self.staging.is_served(worker, job.study_name) \
+                        and worker in choose_staging_workers(available, years_ahead, workers, self.idle_workers):
+                    hinted[job.study_name] = job
+                years_ahead += available
+            self.staging.record_hints(worker, list(hinted))
+            return list(hinted.values())
+
+    def get_job_eta(self, job_id: str) -> Optional[dict]:
+        """Predict when a job starts and finishes. Jobs are served in priority order, so a job starts
+        once the remaining work of the jobs ahead of it is done by the currently active fleet.
+        :return None if the job is unknown.
+        """
+        with self.lock:
+            job = self.get_job_by_id(job_id)
+            if job is None:
+                return None
+            seconds_per_year, cost_source = self.get_seconds_per_year(job)
+            eta = {"job_id": job.id, "status": "queued", "queue_position": None,
+                   "remaining_years": len(job.get_remaining_years()),
+                   "seconds_per_year": round(seconds_per_year, 3), "cost_source": cost_source,
+                   "profile": job.profile.to_dict() if job.profile else None,
+                   "cost_model": self.cost_model.summary(), "active_workers": 0, "fleet_cores": 0,
+                   "predicted_start": None, "predicted_finish": None}
+            if job.finished_at is not None:
+                eta["status"] = "finished"
+                return eta
+
+            # core-seconds of work left in the jobs ahead of this one, in the order assign_task serves them
+            seconds_ahead = 0.0
+            for position, (prio, cnt, queued_job) in enumerate(sorted(self.queue.queue, key=lambda item: item[:2])):
+                if queued_job is job:
+                    eta["queue_position"] = position
+                    break
+                seconds_ahead += len(queued_job.get_remaining_years()) * self.get_seconds_per_year(queued_job)[0]
+
+            eta["active_workers"], fleet_cores = self.get_fleet_cores()
+            eta["fleet_cores"] = fleet_cores
+            if fleet_cores == 0:
+                return eta  # no throughput, no prediction
+            now = datetime.now()
+            if job.tasks:
+                start = datetime.fromtimestamp(min(task.created_at for task in job.tasks))
+            else:
+                start = now + timedelta(seconds=seconds_ahead / fleet_cores)
+            finish = now + timedelta(seconds=(seconds_ahead + eta["remaining_years"] * seconds_per_year) / fleet_cores)
+            eta["predicted_start"] = start.strftime("%Y-%m-%d %H:%M:%S")
+            eta["predicted_finish"] = finish.strftime("%Y-%m-%d %H:%M:%S")
+            return eta
 
     def persist_state(self):
         logging.info("Persisting job queue state to disk.")
+        start = time.perf_counter()
         # Persist queue
         queue_items = list(self.queue.queue)
         with open(self.queue_file, "wb") as f:
             pickle.dump({"queue": queue_items, "counter": next(self.counter)}, f)
-        # Persist finished list
-        with open(self.finished_file, "wb") as f:
-            pickle.dump(self.finished, f)
+        elapsed = time.perf_counter() - start
+        self.persist_stats["count"] += 1
+        self.persist_stats["total_seconds"] += elapsed
+        self.persist_stats["max_seconds"] = max(self.persist_stats["max_seconds"], elapsed)
 
     def get_queue_length(self):
         return self.queue.qsize()
 
     def add_job(self, job: "Job"):
-        logging.info(f"Adding job {job.study_name} to the queue.")
-        self.queue.put((job.priority, next(self.counter), job))
-        self.persist_state()
+        self.add_jobs([job])
+
+    def add_jobs(self, jobs: list["Job"]):
+        """Queue jobs, e.g. the variants of a sweep, persisting the queue once."""
+        with self.lock:
+            for job in jobs:
+                logging.info(f"Adding job {job.study_name} to the queue.")
+                self.traces.attach(job)
+                self.queue.put((job.priority, next(self.counter), job))
+            self.persist_state()
+        for job in jobs:
+            self.events.publish("job_queued", job.id, job.submitter, **job.get_progress())
+
+    def get_sweep_jobs(self, sweep_id: str) -> list["Job"]:
+        """The jobs of the variants of a sweep, the queued ones in queue order, then the finished ones."""
+        with self.lock:
+            queued = [job for prio, cnt, job in sorted(self.queue.queue, key=lambda item: item[:2])
+                      if job.sweep_id == sweep_id]
+            finished = [self.archive.load(record.id) for record in list(self.archive.records.values())
+                        if record.sweep_id == sweep_id]
+            return queued + [job for job in finished if job is not None]
+
+    def get_next_variant(self, job: "Job") -> "Job":
+        """Interleave the variants of a sweep: of the queued jobs of the sweep of this job with work available,
+        the one with the smallest share of its years done or running. Ties go to the earliest submitted.
+        """
+        best_job, best_share = job, None
+        for prio, cnt, sibling in sorted(self.queue.queue, key=lambda item: item[:2]):
+            if sibling.sweep_id != job.sweep_id or not sibling.workload:
+                continue
+            unavailable = sibling.get_unavailable_years()
+            if not sibling.workload - unavailable:
+                continue
+            share = len(unavailable) / len(sibling.workload)
+            if best_share is None or share < best_share:
+                best_job, best_share = sibling, share
+        return best_job
 
     def get_job_by_id(self, job_id: str) -> "Optional[Job]":
         # Check queued jobs
@@ -74,54 +290,121 @@ class JobQueue:
             if job.id == job_id:
                 return job
         # Check finished jobs
-        for job in self.finished:
-            if job.id == job_id:
-                return job
-        return None
+        return self.archive.load(job_id)
 
-    def assign_task(self, worker: str, amount: int) -> "Optional[Task]":
+    def assign_task(self, worker: str, amount: int, staged: set[str] = frozenset(),
+                    request_id: str = None) -> "Optional[Task]":
         """Assign up to 'amount' workload items to the worker,
         returning a Task instance or None if no work is available.
-        Requires a lock due to synchronized access to the queue and job tasks."""
+        Requires a lock due to synchronized access to the queue and job tasks.
+        :param staged: names of the studies the worker has staged already
+        :param request_id: id of the request of the worker, a retry of the last request gets the same answer"""
         logging.info(f"Worker {worker} requesting up to {amount} workload items.")
         with self.lock:
+            last_request_id, last_task = self.last_task_requests.get(worker, (None, None))
+            if request_id is not None and request_id == last_request_id:
+                logging.info(f"Worker {worker} repeated task request {request_id}, sending the same answer.")
+                return last_task
+            self.workers_seen[worker] = (datetime.now(), amount)
+            self.expire_tasks()
             # Iterate over jobs in priority order
             for prio, cnt, job in list(self.queue.queue):
-                # Collect all already assigned workload items
-                already_assigned = []
-                if job.tasks:
-                    for t in job.tasks:
-                        already_assigned.extend(t.workload)
+                if job.sweep_id is not None:
+                    job = self.get_next_variant(job)
+                # Collect workload items that are running, done or given up on
+                already_assigned = job.get_unavailable_years()
                 # Find available workload items
-                available = [item for item in job.workload if item not in already_assigned]
+                available = job.workload - already_assigned
                 if available:
                     # Assign up to 'amount' items
                     task = Task(job, worker)
                     task.set_workload_subset(amount, already_assigned)
                     job.tasks.append(task)
+                    self.idle_workers.discard(worker)
+                    self.staging.record_task(worker, job.study_name, job.study_name in staged)
                     self.persist_state() # make sure the work assignment is saved
+                    self.events.publish("task_assigned", job.id, job.submitter, task_id=task.id, worker=worker,
+                                        workload=str(task.workload), **job.get_progress())
+                    self.last_task_requests[worker] = (request_id, task)
                     return task
             # No available work found
+            self.idle_workers.add(worker)
+            self.last_task_requests[worker] = (request_id, None)
             return None
 
-    def finish_task(self, request: TaskDoneRequest):
-        # update the job by registering a completed task
-        job = self.get_job_by_id(request.job_id)
-        if not job:
-            logging.error(f"Job {request.job_id} not found.")
-            return
-        job.task_done(request.task_id, request.success, request.output_path, request.workload)
+    def expire_tasks(self) -> list["Task"]:
+        """Fail the running tasks whose lease ran out, e.g. because their worker died, so their years are handed
+        out again. The failure counts as an attempt of every year of the task, like a run that crashed.
+        A report the worker still sends afterwards is ignored.
+        :return the expired tasks
+        """
+        if not self.task_lease_seconds:
+            return []
+        with self.lock:
+            deadline = time.time() - self.task_lease_seconds
+            expired = [task for prio, cnt, job in list(self.queue.queue) for task in job.tasks
+                       if task.status == TaskStatus.RUNNING and task.created_at < deadline]
+            for task in expired:
+                logging.warning(f"Task {task.id} of job {task.job.id} on worker {task.worker} did not report back "
+                                f"within {self.task_lease_seconds} seconds, its years {task.workload} will be retried.")
+                self.finish_task(TaskDoneRequest(task_id=task.id, job_id=task.job.id, workload=task.workload,
+                                                 output_path="", success=False))
+            return expired
 
-        # If all tasks are completed, move job to finished
-        if job.percentage_complete == 100:
-            logging.info(f"Job {job.id} is now 100% complete.")
-            # Remove from queue and put in finished list
-            with self.lock:
+    def finish_task(self, request: TaskDoneRequest) -> bool:
+        """Register a completed task. Idempotent by task id: a repeated completion report is ignored.
+        :return True if the report was processed, False if it was ignored.
+        """
+        with self.lock:
+            # update the job by registering a completed task
+            job = self.get_job_by_id(request.job_id)
+            if not job:
+                logging.error(f"Job {request.job_id} not found.")
+                return False
+            task = job.get_task_by_id(request.task_id)
+            if task is None:
+                logging.error(f"Task {request.task_id} not found in job {request.job_id}.")
+                return False
+            if task.status != TaskStatus.RUNNING:
+                logging.info(f"Task {request.task_id} was already marked {task.status.value}, ignoring repeated report.")
+                return False
+            telemetry = request.telemetry.model_dump() if request.telemetry else None
+            year_details = {year: details.model_dump() for year, details in (request.year_details or {}).items()}
+            task.spans = [{**span.model_dump(), "task_id": task.id} for span in request.spans or []]
+            with job.tracer.span("link_output", task_id=task.id, years=len(request.workload)):
+                linked_years, years_to_copy = job.task_done(request.task_id, request.success, request.output_path,
+                                                            request.workload, telemetry, request.failed_years,
+                                                            request.shipped_years, year_details)
+            self.traces.record_task(task)
+            self.calibrate(job, [job.get_task_by_id(request.task_id)])
+            if years_to_copy:
+                # copied before the synthesis and export scheduled below, the executor runs one thing at a time
+                self.synthesis_executor.submit(self.copy_years, job, years_to_copy)
+            self.schedule_synthesis(job, linked_years + list(years_to_copy), finalize=job.percentage_complete == 100)
+            self.schedule_export(job, linked_years + list(years_to_copy))
+
+            # If all tasks are completed, move job to finished
+            if job.percentage_complete == 100:
+                logging.info(f"Job {job.id} is now 100% complete.")
+                # Remove from queue and put in the archive
                 self.queue.queue = [item for item in self.queue.queue if item[2].id != job.id]
-            self.finished.append(job)
+                job.finished_at = time.time()
+                self.archive.add(job, pending=True)
+                # saved again once the synthesis and export scheduled above are done
+                self.synthesis_executor.submit(self.archive.add, job)
+                if not any(queued_job.study_name == job.study_name for prio, cnt, queued_job in self.queue.queue):
+                    self.staging.forget(job.study_name)
 
-        # make sure changes to the queues are saved
-        self.persist_state()
+            # make sure changes to the queues are saved
+            with job.tracer.span("persist_state", task_id=task.id):
+                self.persist_state()
+            progress = job.get_progress()
+            self.events.publish("task_finished", job.id, job.submitter, task_id=task.id, worker=task.worker,
+                                task_status=task.status.value, task_years=len(task.workload),
+                                failed_years=str(task.get_failed_years()), **progress)
+            if job.percentage_complete == 100:
+                self.events.publish("job_finished", job.id, job.submitter, **progress)
+            return True
 
     def __repr__(self):
         # No direct peek into PriorityQueue (not thread-safe), so just return a placeholder
@@ -129,18 +412,45 @@ class JobQueue:
 
 
 class Job:
-    def __init__(self, submitter: str, priority: int, zip_file_path: str, config):
-        logging.info(f"Creating new Job instance from {os.path.basename(zip_file_path)}.")
+    __slots__ = ("id", "submitter", "priority", "zip_file_path", "study_name", "study_path", "output_dir", "workload",
+                 "tasks", "percentage_complete", "synthesizer", "year_index", "profile", "tracer", "sweep_id",
+                 "variant", "finished_at", "deleted_storage")
+    config: dict = {}  # the driver config, shared by all jobs and not persisted with them, set by the driver
+
+    def __init__(self, submitter: str, priority: int, zip_file_path: Optional[str], study_name: str = None):
+        """A job is created from an uploaded zip, or from the blob store in which case zip_file_path is None."""
         self.id = str(uuid.uuid4())  # unique job id
         self.submitter: str = submitter
         self.priority: int = priority
-        self.zip_file_path: str = zip_file_path  # file path to the uploaded zip file
-        self.study_name: str = os.path.splitext(os.path.basename(zip_file_path))[0]
-        self.config: dict = config
-        self.antares_study: AntaresStudy = None
-        self.workload: list[int] = None
+        self.zip_file_path: Optional[str] = zip_file_path  # file path to the uploaded zip file
+        self.study_name: str = study_name or os.path.splitext(os.path.basename(zip_file_path))[0]
+        logging.info(f"Creating new Job instance for {self.study_name}.")
+        self.study_path: Optional[str] = None  # driver copy of the study
+        self.output_dir: Optional[str] = None  # output collection folder in the study
+        self.workload: YearSet = None
         self.tasks: list["Task"] = []
         self.percentage_complete: int = 0  # 0 - 100
+        self.synthesizer: Optional[McAllSynthesizer] = None  # loaded when needed, see get_synthesizer
+        self.year_index: dict[int, dict] = {}  # year -> where its output lives and how it was produced
+        self.profile: Optional[StudyProfile] = None  # size of the study, for the cost model
+        self.tracer: Tracer = Tracer("driver")  # timed bookkeeping of the driver for this job, see get_timeline
+        self.sweep_id: Optional[str] = None  # set for the jobs of a parameter sweep, one per variant
+        self.variant: Optional[dict] = None  # {"name", "ini_overrides", "files_path"}, see utils.variants
+        self.finished_at: Optional[float] = None  # timestamp
+        self.deleted_storage: set[str] = set()  # "zip", "inputs" and "results" once freed, see driver.retention
+
+    @property
+    def antares_study(self) -> Optional[AntaresStudy]:
+        if self.study_path is None:
+            return None
+        antares_study = AntaresStudy(self.study_path)
+        antares_study.output_dir = self.output_dir
+        return antares_study
+
+    @antares_study.setter
+    def antares_study(self, antares_study: Optional[AntaresStudy]):
+        self.study_path = antares_study.study_path if antares_study is not None else None
+        self.output_dir = antares_study.output_dir if antares_study is not None else None
 
     def validate_job_parameters(self) -> bool:
         """Validate job parameters such as priority and submitter."""
@@ -150,7 +460,7 @@ class Job:
         if not self.submitter or not isinstance(self.submitter, str):
             logging.error(f"Job {self.id} has invalid submitter '{self.submitter}'. Must be a non-empty string.")
             return False
-        if not os.path.exists(self.zip_file_path) or not os.path.isfile(self.zip_file_path):
+        if self.zip_file_path is not None and not os.path.isfile(self.zip_file_path):
             logging.error(f"Job {self.id} has invalid zip file path '{self.zip_file_path}'. File does not exist.")
             return False
         extraction_folder_path = self.config.get("new_jobs_study_folder_path", "")
@@ -166,42 +476,373 @@ class Job:
     def prepare_job_for_queue(self):
         """Prepare a job for processing by unzipping it and estimating work."""
         logging.info(f"Preparing Job instance for {self.study_name}: unzipping and wrapping in Antares class instance.")
+        with self.tracer.span("prepare_job", bytes=os.path.getsize(self.zip_file_path)):
+            self.wrap_study(self.extract_study())
+
+    def extract_study(self) -> str:
+        """Unzip the uploaded study into the folder of new studies and return its folder."""
         extraction_folder_path = self.config.get("new_jobs_study_folder_path", "")
         seven_zip_exe = self.config.get("7_zip_file_path", None)
-        study_folder_path = smart_unzip_file(self.zip_file_path, extraction_folder_path, seven_zip_exe)
-        self.antares_study = AntaresStudy(study_folder_path)
-        self.antares_study.create_output_collection_folder()
-        self.workload = self.antares_study.get_active_playlist_years().copy()
+        return smart_unzip_file(self.zip_file_path, extraction_folder_path, seven_zip_exe, self.config.get("zip_method"))
+
+    def prepare_job_as_variant(self, study_folder_path: str, sweep_id: str, variant: dict):
+        """Prepare a job of a sweep on the base study extracted once for all variants.
+        The replacement files of the variant are stored next to the base study, its output gets its own folder.
+        """
+        logging.info(f"Preparing Job instance for variant {variant['name']} of {self.study_name}.")
+        self.sweep_id = sweep_id
+        self.variant = {"name": variant["name"], "ini_overrides": variant["ini_overrides"], "files_path": ""}
+        with self.tracer.span("prepare_variant", files=len(variant["files"])):
+            if variant["files"]:
+                self.variant["files_path"] = os.path.join(f"{study_folder_path}.variants", variant["name"])
+                write_variant_files(variant["files"], self.variant["files_path"])
+            self.wrap_study(study_folder_path)
+
+    def prepare_job_from_blob_store(self, blob_store: BlobStore, files: list[dict], empty_dirs: list[str]):
+        """Prepare a job by materialising its study from the blob store with hardlinks, instead of unzipping."""
+        logging.info(f"Preparing Job instance for {self.study_name}: materialising from blob store.")
+        extraction_folder_path = self.config.get("new_jobs_study_folder_path", "")
+        study_folder_path = os.path.join(extraction_folder_path, self.study_name)
+        with self.tracer.span("prepare_job", bytes=sum(entry["size"] for entry in files)):
+            blob_store.materialise(files, empty_dirs, study_folder_path)
+            self.wrap_study(study_folder_path)
+
+    def wrap_study(self, study_folder_path: str):
+        """Wrap the driver copy of the study in an AntaresStudy and derive the workload from it."""
+        antares_study = AntaresStudy(study_folder_path)
+        if self.variant is None:
+            antares_study.create_output_collection_folder()
+            self.workload = antares_study.get_active_playlist_years()
+        else:
+            antares_study.create_output_collection_folder(self.variant["name"])
+            self.workload = get_variant_playlist(study_folder_path, self.variant["ini_overrides"])
+        self.antares_study = antares_study
+        try:
+            self.profile = profile_study(study_folder_path)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not profile study {self.study_name}, its cost will be learned from its runs: {e}")
+
+    def is_backed_by_files(self, exists: Callable[[str], bool] = os.path.exists) -> bool:
+        """Check that the files this job depends on, and that retention did not delete, still exist on disk."""
+        if self.zip_file_path is not None and "zip" not in self.deleted_storage and not exists(self.zip_file_path):
+            return False
+        if "inputs" in self.deleted_storage:
+            return exists(self.output_dir)
+        return exists(self.study_path)
+
+    def task_done(self, task_id: str, success: bool, output_path: str, workload: YearSet = None,
+                  telemetry: dict = None, failed_years: YearSet = None, shipped_years: YearSet = None,
+                  year_details: dict[int, dict] = None) -> tuple[list[int], dict[int, dict]]:
+        """Register a finished task and link its validated years into the output collection folder.
+        Years the worker shipped to the driver are already in place and are not linked.
+        Years that can not be linked are not copied here, the caller holds the queue lock, see copy_years.
+        :return (the years that were linked or shipped, year -> year index entry of the years to copy)
+        """
+        # a run that did not end gracefully means none of its years can be trusted, whatever the per-year report says
+        workload = YearSet(workload)
+        if failed_years is None or not success:
+            failed_years = YearSet() if success else workload
+        failed_years = YearSet(failed_years)
+        shipped_years = YearSet(shipped_years or ())
+        succeeded_years = workload - failed_years
 
-    def task_done(self, task_id: str, success: bool, output_path: str, workload: list[int] = None):
         # update task status
-        for task in self.tasks:
-            if task.id == task_id:
-                task.status = TaskStatus.COMPLETED if success else TaskStatus.FAILED
-                break
+        task = self.get_task_by_id(task_id)
+        if task is not None:
+            task.status = TaskStatus.COMPLETED if not failed_years else TaskStatus.FAILED
+            task.failed_years = failed_years
+            task.telemetry = telemetry
+        if failed_years:
+            logging.warning(f"Task {task_id} of job {self.id} failed for year(s) {failed_years}, they will be retried.")
 
-        # make the symlinks from the worker to the driver node
-        # relies on the fact that simu are run in economy and have individual mc output activated"
-        if success:
-            driver_output_path = os.path.join(self.antares_study.output_dir, "economy", "mc-ind")
+        # make the symlinks from the worker to the driver node for the years that were validated
+        # relies on the fact that simu have individual mc output activated
+        linked_years = []
+        years_to_copy = {}
+        if succeeded_years:
+            output_mode_folder = self.get_output_mode_folder()
+            driver_output_path = os.path.join(self.output_dir, output_mode_folder, "mc-ind")
             os.makedirs(driver_output_path, exist_ok=True)
-            worker_output_path = os.path.join(output_path, "economy", "mc-ind")
-            worker_output_years = os.listdir(worker_output_path)
-            for year in workload:
+            worker_output_path = os.path.join(output_path, output_mode_folder, "mc-ind")
+            worker_output_years = None  # listed on first use, shipped output may already be gone from the worker
+            years_to_link = {}  # worker year folder -> year
+            link_methods = {}  # year -> (how its folder got into the output collection folder, source folder)
+            for year in succeeded_years:
                 output_year_string = str(year+1).zfill(5) # note +1 because antares folders are 1-based
+                driver_output_year_path = os.path.join(driver_output_path, output_year_string)
+                if year in shipped_years and os.path.isdir(driver_output_year_path) \
+                        and not os.path.islink(driver_output_year_path):
+                    linked_years.append(year)
+                    link_methods[year] = ("shipped", None)
+                    continue
+                if worker_output_years is None:
+                    worker_output_years = os.listdir(worker_output_path) if os.path.isdir(worker_output_path) else []
                 if output_year_string not in worker_output_years:
                     logging.error(f"Year {output_year_string} not found in worker output at {worker_output_path} even thought the worker said it had finished it. Skipping symlink creation for this year.")
                     continue
-                worker_output_year_full_path = os.path.join(worker_output_path, output_year_string)
-                create_symlink_with_same_name(driver_output_path, worker_output_year_full_path)
+                years_to_link[os.path.join(worker_output_path, output_year_string)] = year
+            # all links of the task in one batch, a year only counts as done if its link exists
+            link_results = create_links(driver_output_path, list(years_to_link), allow_copy=False)
+            linked_years += [years_to_link[result.target] for result in link_results if result.ok]
+            link_methods.update({years_to_link[result.target]: (result.method, result.target)
+                                 for result in link_results if result.ok})
+            if self.config.get("copy_when_link_fails", True):
+                link_methods.update({years_to_link[result.target]: ("copy", result.target)
+                                     for result in link_results if not result.ok})
+                years_to_copy = {years_to_link[result.target]: None for result in link_results if not result.ok}
+            for year in linked_years + list(years_to_copy):
+                entry = {
+                    "path": os.path.join(driver_output_path, str(year + 1).zfill(5)),
+                    "method": link_methods[year][0],
+                    "source_path": link_methods[year][1],
+                    "task_id": task_id,
+                    "worker": task.worker if task is not None else None,
+                    "completed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "completed_after_seconds": ((telemetry or {}).get("per_year", {}).get(year) or {}).get(
+                        "completed_after_seconds"),
+                    **(year_details or {}).get(year, {}),
+                }
+                if year in years_to_copy:
+                    years_to_copy[year] = entry
+                else:
+                    self.year_index[year] = entry
 
-        # update percentage_complete
+        # update percentage_complete, years that failed too often count as done so the job can finish
         total = len(self.workload)
-        amount_complete = 0
-        for task in self.tasks:
-            if task.status == TaskStatus.COMPLETED or task.status == TaskStatus.FAILED:
-                amount_complete += len(task.workload)
+        amount_complete = len(self.get_succeeded_years() | self.get_given_up_years())
         self.percentage_complete = int((amount_complete / total) * 100) if total > 0 else 0
+        return linked_years, years_to_copy
+
+    def copy_years(self, years_to_copy: dict[int, dict]) -> list[int]:
+        """Copy the year folders that could not be linked into the output collection folder, in the background.
+        :param years_to_copy: year -> year index entry, as returned by task_done
+        :return The years that were copied.
+        """
+        with self.tracer.span("copy_output", years=len(years_to_copy)):
+            results = [create_link(entry["path"], entry["source_path"], allow_copy=True)
+                       for entry in years_to_copy.values()]
+        copied_years = []
+        for (year, entry), result in zip(years_to_copy.items(), results):
+            if not result.ok:
+                logging.error(f"Could not copy year {year + 1} of job {self.id}: {result.error}")
+                continue
+            self.year_index[year] = {**entry, "method": result.method,
+                                     "completed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+            copied_years.append(year)
+        return copied_years
+
+    def receive_year_output(self, year: int, zip_file_path: str) -> str:
+        """Unpack the zipped output of one year, uploaded by a worker, into the output collection folder.
+        The zip must be named after the year folder (e.g. 00001.zip) and sit in a folder of its own,
+        which is removed afterwards.
+        :return The year folder in the output collection folder.
+        """
+        incoming_folder_path = os.path.dirname(zip_file_path)
+        year_folder_path = os.path.join(self.output_dir, self.get_output_mode_folder(), "mc-ind",
+                                        str(year + 1).zfill(5))
+        try:
+            extracted_folder_path = smart_unzip_file(zip_file_path, incoming_folder_path,
+                                                     self.config.get("7_zip_file_path"), self.config.get("zip_method"))
+            os.makedirs(os.path.dirname(year_folder_path), exist_ok=True)
+            # a repeated upload, or a link from an earlier attempt, is replaced
+            if os.path.islink(year_folder_path):
+                os.unlink(year_folder_path)
+            elif os.path.isdir(year_folder_path):
+                shutil.rmtree(year_folder_path)
+            os.replace(extracted_folder_path, year_folder_path)
+        finally:
+            shutil.rmtree(incoming_folder_path, ignore_errors=True)
+        logging.info(f"Received output of year {year + 1} of job {self.id}.")
+        return year_folder_path
+
+    def get_output_mode_folder(self) -> str:
+        """Folder of the output holding mc-ind and mc-all, named after the simulation mode, e.g. "economy"."""
+        mode = None
+        if self.variant is not None:  # a variant may run the base study in another mode
+            mode = self.variant["ini_overrides"].get("settings/generaldata.ini", {}).get("general", {}).get("mode")
+        if isinstance(mode, str):
+            return mode.strip().lower()
+        return read_study_metadata(self.study_path).output_mode_folder
+
+    def get_incoming_folder_path(self) -> str:
+        """A new, empty folder for an upload of output to the driver."""
+        incoming_folder_path = os.path.join(self.output_dir, ".incoming", uuid.uuid4().hex)
+        os.makedirs(incoming_folder_path)
+        return incoming_folder_path
+
+    def get_synthesis_state_path(self) -> str:
+        return os.path.join(self.output_dir, "mc-all-synthesis.npz")
+
+    def get_synthesizer(self) -> McAllSynthesizer:
+        """The mc-all synthesizer of the job, loaded from its saved state the first time it is needed.
+        Only called from the synthesis executor."""
+        if self.synthesizer is None:
+            state_path = self.get_synthesis_state_path()
+            self.synthesizer = McAllSynthesizer()
+            if os.path.isfile(state_path):
+                try:
+                    self.synthesizer = McAllSynthesizer.load(state_path)
+                except Exception:
+                    logging.exception(f"Could not load the mc-all synthesis of job {self.id}, starting over.")
+        return self.synthesizer
+
+    def synthesize_years(self, years: list[int], finalize: bool):
+        """Add linked years to the mc-all synthesis and, once the job is complete, write the mc-all tables."""
+        output_mode_path = os.path.join(self.output_dir, self.get_output_mode_folder())
+        mc_ind_path = os.path.join(output_mode_path, "mc-ind")
+        synthesizer = self.get_synthesizer()
+        with self.tracer.span("synthesize", years=len(years), finalize=finalize):
+            for year in years:
+                try:
+                    synthesizer.add_year(year, os.path.join(mc_ind_path, str(year + 1).zfill(5)))
+                except Exception:
+                    logging.exception(f"Could not add year {year + 1} of job {self.id} to the mc-all synthesis.")
+            if finalize:
+                try:
+                    synthesizer.write(os.path.join(output_mode_path, "mc-all"))
+                except Exception:
+                    logging.exception(f"Could not write the mc-all synthesis of job {self.id}.")
+            try:
+                synthesizer.save(self.get_synthesis_state_path())
+            except Exception:
+                logging.exception(f"Could not save the mc-all synthesis of job {self.id}.")
+        if finalize:
+            self.synthesizer = None  # the job is complete, free the statistics until a year is added again
+
+    def resume_synthesis(self):
+        """Synthesize the linked years the saved synthesis state does not have, and write the tables if due."""
+        synthesizer = self.get_synthesizer()
+        pending = sorted(self.get_succeeded_years() - synthesizer.added_years)
+        finalize = self.percentage_complete == 100 and (pending or not synthesizer.is_written)
+        if pending or finalize:
+            self.synthesize_years(pending, finalize)
+
+    def get_parquet_folder_path(self) -> str:
+        return os.path.join(self.output_dir, "parquet")
+
+    def export_years(self, years: list[int]):
+        """Convert linked years to the Parquet dataset of the job, see utils.columnar."""
+        from utils.columnar import export_year  # pyarrow is an optional dependency
+        mc_ind_path = os.path.join(self.output_dir, self.get_output_mode_folder(), "mc-ind")
+        with self.tracer.span("export_parquet", years=len(years)):
+            for year in years:
+                try:
+                    export_year(os.path.join(mc_ind_path, str(year + 1).zfill(5)), year + 1,
+                                self.get_parquet_folder_path(), self.config.get("parquet_compression", "zstd"))
+                except Exception:
+                    logging.exception(f"Could not export year {year + 1} of job {self.id} to Parquet.")
+
+    def get_year_index(self, status: str = None) -> list[dict]:
+        """Describe every year of the workload: its status ("done", "missing" or "given_up"),
+        how often it failed and, once done, where its output lives and how it was produced.
+
+        Args:
+            status: only return years with this status, or "failed" for years that failed at least once
+        """
+        year_index = self.year_index
+        failed_attempts = Counter(year for task in self.tasks for year in task.get_failed_years())
+        succeeded_years = self.get_succeeded_years()
+        given_up_years = self.get_given_up_years()
+        entries = []
+        for year in self.workload or []:
+            if year in succeeded_years:
+                year_status = "done"
+            elif year in given_up_years:
+                year_status = "given_up"
+            else:
+                year_status = "missing"
+            if status == "failed":
+                if failed_attempts[year] == 0:
+                    continue
+            elif status is not None and status != year_status:
+                continue
+            entries.append({"year": year, "folder": str(year + 1).zfill(5), "status": year_status,
+                            "failed_attempts": failed_attempts[year], **year_index.get(year, {})})
+        return entries
+
+    def get_timeline(self) -> list[dict]:
+        """Spans of the driver for this job and of every task on its worker, in start order, see utils.tracing."""
+        spans = list(self.tracer.spans)
+        for task in self.tasks:
+            spans += task.spans
+        return sorted(spans, key=lambda span: span["start"])
+
+    def get_task_by_id(self, task_id: str) -> "Optional[Task]":
+        for task in self.tasks:
+            if task.id == task_id:
+                return task
+        return None
+
+    def get_succeeded_years(self) -> YearSet:
+        """Years for which a task delivered validated output."""
+        return YearSet.from_ranges(r for task in self.tasks if task.status in (TaskStatus.COMPLETED, TaskStatus.FAILED)
+                                   for r in (task.workload - task.get_failed_years()).ranges)
+
+    def get_remaining_years(self) -> YearSet:
+        """Years without validated output that will still be attempted."""
+        return self.workload - self.get_succeeded_years() - self.get_given_up_years()
+
+    def get_progress(self) -> dict:
+        """Counts of years by state, as published in job events."""
+        done = self.get_succeeded_years()
+        given_up = self.get_given_up_years()
+        running = [task for task in self.tasks if task.status == TaskStatus.RUNNING]
+        return {
+            "study_name": self.study_name,
+            "variant": self.variant["name"] if self.variant else None,
+            "priority": self.priority,
+            "years_total": len(self.workload),
+            "years_done": len(done),
+            "years_given_up": len(given_up),
+            "years_running": sum(len(task.workload) for task in running),
+            "running_tasks": len(running),
+            "percentage_complete": self.percentage_complete,
+        }
+
+    def get_observed_seconds_per_year(self) -> Optional[float]:
+        """Median core-seconds per MC year over the completed tasks of this job, None before the first one."""
+        observed = [get_task_seconds_per_year(task.telemetry, len(task.workload))
+                    for task in self.tasks if task.status == TaskStatus.COMPLETED]
+        observed = [seconds for seconds in observed if seconds]
+        return statistics.median(observed) if observed else None
+
+    def get_given_up_years(self) -> YearSet:
+        """Years that failed MAX_YEAR_ATTEMPTS times and will not be retried anymore."""
+        attempts = Counter()
+        for task in self.tasks:
+            attempts.update(task.get_failed_years())
+        return YearSet(year for year, count in attempts.items() if count >= MAX_YEAR_ATTEMPTS) - self.get_succeeded_years()
+
+    def get_unavailable_years(self) -> YearSet:
+        """Years that can not be handed out: running, succeeded or given up on."""
+        running = [r for task in self.tasks if task.status == TaskStatus.RUNNING for r in task.workload.ranges]
+        return self.get_succeeded_years() | self.get_given_up_years() | YearSet.from_ranges(running)
+
+    def __getstate__(self):
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state["synthesizer"] = None  # saved next to the output by the synthesis executor, see get_synthesizer
+        state["tracer"] = None  # its spans are in the trace store, see driver.traces
+        return state
+
+    def __setstate__(self, state):
+        # jobs persisted before the compact layout held the config and an AntaresStudy
+        state.pop("config", None)
+        antares_study = state.pop("antares_study", None)
+        if antares_study is not None:
+            state["study_path"], state["output_dir"] = antares_study.study_path, antares_study.output_dir
+        # jobs persisted before year sets held a plain list
+        if isinstance(state.get("workload"), list):
+            state["workload"] = YearSet(state["workload"])
+        if isinstance(state.get("finished_at"), datetime):
+            state["finished_at"] = state["finished_at"].timestamp()
+        # fields added after the first jobs were persisted
+        defaults = {"year_index": {}, "profile": None, "sweep_id": None, "variant": None, "finished_at": None}
+        for name in self.__slots__:
+            setattr(self, name, state.get(name, defaults.get(name)))
+        if self.tracer is None:
+            self.tracer = Tracer("driver")
+        if self.deleted_storage is None:
+            self.deleted_storage = set()
 
     def __repr__(self):
         return f"<Job id={self.id} prio={self.priority} submitter={self.submitter}>"
@@ -214,18 +855,45 @@ class TaskStatus(Enum):
 
 class Task():
     """A task will always subclass from a job"""
+    __slots__ = ("id", "job", "worker", "created_at", "status", "workload", "telemetry", "failed_years", "spans")
+
     def __init__(self, job: Job, worker: str):
         self.id = str(uuid.uuid4()) # unique task id
         self.job = job # reference parent Job instance
         self.worker = worker
-        self.created_at: datetime = datetime.now()
+        self.created_at: float = time.time()
         self.status: TaskStatus = TaskStatus.RUNNING
-        self.workload = None
+        self.workload: YearSet = None
+        self.telemetry: Optional[dict] = None  # resource usage of the solver as reported by the worker
+        self.failed_years: YearSet = YearSet()  # years of the workload the worker could not deliver
+        self.spans: list[dict] = []  # timed stages on the worker, see utils.tracing
+
+    def __getstate__(self):
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state["telemetry"], state["spans"] = None, []  # in the trace store, see driver.traces
+        return state
+
+    def __setstate__(self, state):
+        # tasks persisted before year sets held plain lists
+        for name in ("workload", "failed_years"):
+            if isinstance(state.get(name), list):
+                state[name] = YearSet(state[name])
+        if isinstance(state.get("created_at"), datetime):
+            state["created_at"] = state["created_at"].timestamp()
+        if "failed_years" not in state:
+            # tasks persisted before per-year reporting failed as a whole
+            state["failed_years"] = state["workload"] if state.get("status") == TaskStatus.FAILED else YearSet()
+        state.setdefault("telemetry", None)
+        state.setdefault("spans", [])  # tasks persisted before tracing
+        for name in self.__slots__:
+            setattr(self, name, state[name])
+
+    def get_failed_years(self) -> YearSet:
+        """Failed years of a finished task."""
+        return self.failed_years
 
-    def set_workload_subset(self, amount: int, already_assigned: list[int]):
+    def set_workload_subset(self, amount: int, already_assigned: YearSet):
         """Set workload to a subset of length amount, excluding already_assigned."""
-        available_years = [year for year in self.job.workload if year not in already_assigned]
-        actual = min(amount, len(available_years))
-        self.workload = available_years[:actual]
+        self.workload = (self.job.workload - already_assigned).take_first(amount)
 
 
@@ -1,23 +1,114 @@
-from pydantic import BaseModel, ConfigDict
+from typing import Annotated, Optional
+
+from pydantic import BaseModel, ConfigDict, PlainSerializer, PlainValidator, WithJsonSchema
+
+from utils.year_set import YearSet
+
+
+def parse_year_set(value) -> YearSet:
+    """Accept a range string such as "0-99,150-199", or a list of years as sent by older workers."""
+    if isinstance(value, YearSet):
+        return value
+    if isinstance(value, str):
+        return YearSet.from_string(value)
+    if isinstance(value, (list, tuple)) and all(isinstance(year, int) for year in value):
+        return YearSet(value)
+    raise ValueError("Expected years as a range string like '0-99,150-199' or a list of integers.")
+
+
+# MC years, 0-based, written as comma separated inclusive ranges in JSON
+Years = Annotated[YearSet, PlainValidator(parse_year_set), PlainSerializer(str, return_type=str),
+                  WithJsonSchema({"type": "string", "examples": ["0-99,150-199"]})]
 
 class GetTaskRequest(BaseModel):
     worker: str
     cores: int
+    staged: list[str] = []  # names of the studies the worker staged ahead, for the staging hit rate
+    request_id: Optional[str] = None  # the same on retries of one request, which then get the same answer
+
+class StagingHintsRequest(BaseModel):
+    worker: str
+    cores: int
+
+class StagingHint(BaseModel):
+    """A study to stage ahead of its first task, with the fields of GetTaskResponse needed to stage it."""
+    job_id: str
+    priority: int
+    zip_file_path: str  # empty for jobs materialised from the blob store, use study_path instead
+    study_path: str = ""
+    study_name: str
+
+class StagingHintsResponse(BaseModel):
+    hints: list[StagingHint]
+
+class VariantAssignment(BaseModel):
+    name: str
+    ini_overrides: dict[str, dict[str, dict[str, Optional[str | list[str]]]]] = {}
+    files_path: str = ""  # folder on the driver with the replacement files of the variant, empty if none
 
 class GetTaskResponse(BaseModel):
     id: str
     job_id: str
     submitter: str
     priority: int
-    zip_file_path: str
+    zip_file_path: str  # empty for jobs materialised from the blob store, use study_path instead
+    study_path: str = ""
     study_name: str
     worker: str
-    workload: list[int]
+    workload: Years
     percentage_complete: int
+    variant: Optional[VariantAssignment] = None  # set for the jobs of a parameter sweep
+
+class YearTelemetry(BaseModel):
+    completed_after_seconds: float
+
+class TaskTelemetry(BaseModel):
+    wall_time_seconds: float
+    cpu_seconds: float
+    cpu_utilisation: float  # cpu_seconds / (wall_time_seconds * cores)
+    cores: int
+    peak_rss_bytes: int
+    read_bytes: int
+    write_bytes: int
+    per_year: dict[int, YearTelemetry] = {}
+
+class YearOutputDetails(BaseModel):
+    size_bytes: int
+    file_count: int
+    sha256: Optional[str] = None  # see utils.manifest.describe_folder
+
+class TraceSpan(BaseModel):
+    """A stage of a task, see utils.tracing. Extra attributes (e.g. years, cores, error) are kept."""
+    model_config = ConfigDict(extra="allow")
+    name: str
+    process: str = ""
+    start: float  # seconds since the epoch
+    end: Optional[float] = None
+    bytes: Optional[int] = None
 
 class TaskDoneRequest(BaseModel):
     task_id: str
     job_id: str
-    workload: list[int]
+    workload: Years
     output_path: str
-    success: bool
\ No newline at end of file
+    success: bool  # whether the solver ended gracefully, if not all years of the workload count as failed
+    failed_years: Optional[Years] = None  # years whose output is missing or incomplete, None if not validated per year
+    telemetry: Optional[TaskTelemetry] = None
+    shipped_years: Optional[Years] = None  # years whose output was uploaded to the driver, see /task_output
+    year_details: Optional[dict[int, YearOutputDetails]] = None  # size and checksum of the output of validated years
+    spans: Optional[list[TraceSpan]] = None  # timed stages of the task on the worker
+
+class ManifestEntry(BaseModel):
+    path: str  # relative to the study root, forward slashes
+    sha256: str
+    size: int
+
+class MissingBlobsRequest(BaseModel):
+    hashes: list[str]
+
+class SubmitManifestRequest(BaseModel):
+    study_name: str
+    priority: int
+    submitter: str
+    files: list[ManifestEntry]
+    empty_dirs: list[str] = []
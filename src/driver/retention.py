@@ -0,0 +1,296 @@
+"""
+Retention of the driver storage: uploaded zips, extracted studies ("inputs") and output collection folders
+("results"). A background thread applies the policies of the driver config periodically:
+    retention_keep_jobs_per_submitter: finished jobs kept per submitter, a sweep counts as one job
+    retention_max_age_days: finished jobs that finished longer ago are removed
+    retention_disk_budget_gb: while the storage is over budget, that of the oldest finished jobs is freed,
+                              zips first, then extracted inputs, then results
+Storage of queued jobs is never touched, storage shared by several jobs (the base study of a sweep) only once
+none of them needs it anymore. A finished job whose results are deleted is removed from the archive.
+Uploads that no job refers to, e.g. a zip that failed validation, are removed after ORPHAN_GRACE_SECONDS.
+So are the files of the blob store that no study is hardlinked to anymore ("blob"), see driver.blob_store.
+"""
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Optional
+
+from driver.archive import ArchivedJob
+from driver.jobs import Job, JobQueue
+from utils.scanner import scan_tree
+
+STORAGE_KINDS = ("orphan", "blob", "zip", "inputs", "results")  # the order in which storage is freed
+ORPHAN_GRACE_SECONDS = 24 * 3600  # an unreferenced upload younger than this may still become a job
+HISTORY_LENGTH = 1000  # deletions kept for the /retention endpoint
+
+
+@dataclass
+class RetentionPolicy:
+    keep_jobs_per_submitter: Optional[int] = None
+    max_age_days: Optional[float] = None
+    disk_budget_bytes: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RetentionPolicy":
+        budget_gb = config.get("retention_disk_budget_gb")
+        return cls(config.get("retention_keep_jobs_per_submitter"), config.get("retention_max_age_days"),
+                   int(budget_gb * 1024 ** 3) if budget_gb is not None else None)
+
+    def to_dict(self) -> dict:
+        return {"keep_jobs_per_submitter": self.keep_jobs_per_submitter, "max_age_days": self.max_age_days,
+                "disk_budget_bytes": self.disk_budget_bytes}
+
+
+@dataclass
+class StorageItem:
+    kind: str  # one of STORAGE_KINDS
+    path: str
+    jobs: list[Job | ArchivedJob] = field(default_factory=list)  # queued jobs and records of finished jobs needing it
+    active: bool = False  # needed by a queued job
+    size_bytes: int = 0
+    last_used: float = 0.0  # timestamp when the last of its jobs finished, or of the upload for orphans
+
+
+def get_expired_jobs(finished: list[ArchivedJob], policy: RetentionPolicy, now: float) -> dict[str, str]:
+    """:return job id -> the policy that removes the job"""
+    expired = {}
+    kept_per_submitter: dict[str, set[str]] = {}
+    for job in sorted(finished, key=lambda job: job.finished_at, reverse=True):
+        if policy.max_age_days is not None and now - job.finished_at > policy.max_age_days * 24 * 3600:
+            expired[job.id] = "max_age_days"
+            continue
+        if policy.keep_jobs_per_submitter is not None:
+            kept = kept_per_submitter.setdefault(job.submitter, set())
+            submission = job.sweep_id or job.id
+            if submission not in kept and len(kept) >= policy.keep_jobs_per_submitter:
+                expired[job.id] = "keep_jobs_per_submitter"
+            else:
+                kept.add(submission)
+    return expired
+
+
+def plan_cleanup(items: list[StorageItem], policy: RetentionPolicy, now: float) -> list[tuple[StorageItem, str]]:
+    """Choose the storage to free and why: orphans and unreferenced blobs, the storage of expired jobs, then,
+    while over the disk budget, the oldest storage of the finished jobs, by kind in the order of STORAGE_KINDS.
+    """
+    finished = {job.id: job for item in items if not item.active for job in item.jobs}
+    expired = get_expired_jobs(list(finished.values()), policy, now)
+    plan = []
+    for item in items:
+        if item.active:
+            continue
+        if item.kind in {"orphan", "blob"}:
+            plan.append((item, item.kind))
+        elif all(job.id in expired for job in item.jobs):
+            plan.append((item, expired[item.jobs[0].id]))
+
+    if policy.disk_budget_bytes is not None:
+        planned = {id(item) for item, _ in plan}
+        usage = sum(item.size_bytes for item in items if id(item) not in planned)
+        candidates = sorted((item for item in items if not item.active and id(item) not in planned),
+                            key=lambda item: (STORAGE_KINDS.index(item.kind), item.last_used))
+        for item in candidates:
+            if usage <= policy.disk_budget_bytes:
+                break
+            plan.append((item, "disk_budget"))
+            usage -= item.size_bytes
+    return sorted(plan, key=lambda planned_item: STORAGE_KINDS.index(planned_item[0].kind))
+
+
+class RetentionService:
+    def __init__(self, job_queue: JobQueue, config: dict):
+        self.job_queue = job_queue
+        self.policy = RetentionPolicy.from_config(config)
+        self.zip_folder_path = os.path.abspath(config["new_jobs_zip_folder_path"])
+        self.study_folder_path = os.path.abspath(config["new_jobs_study_folder_path"])
+        self.blob_store_folder_path = os.path.abspath(config["blob_store_folder_path"]) \
+            if config.get("blob_store_folder_path") else None
+        self.interval_seconds = config.get("retention_interval_seconds", 3600)
+        self.history: deque[dict] = deque(maxlen=HISTORY_LENGTH)  # deletions, most recent last
+        self.last_run: Optional[dict] = None
+        self.run_lock = threading.Lock()  # one cleanup at a time, periodic or requested
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Clean up every interval_seconds in a background thread, unless the interval is 0 or empty."""
+        if not self.interval_seconds:
+            logging.info("Retention of driver storage is disabled.")
+            return
+        self.thread = threading.Thread(target=self.run_periodically, name="retention", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run_periodically(self):
+        while not self.stop_event.wait(self.interval_seconds):
+            try:
+                self.run()
+            except Exception:
+                logging.exception("Retention of driver storage failed.")
+
+    def collect_storage(self) -> list[StorageItem]:
+        """The storage of every job, shared items merged, and the unreferenced entries of the upload folders and of
+        the blob store."""
+        with self.job_queue.lock:
+            queued = [job for prio, cnt, job in self.job_queue.queue.queue]
+            finished = list(self.job_queue.archive.records.values())
+        items: dict[tuple[str, str], StorageItem] = {}
+
+        def add(kind: str, path: str, job: Job | ArchivedJob, active: bool):
+            item = items.setdefault((kind, os.path.normcase(os.path.abspath(path))), StorageItem(kind, path))
+            item.jobs.append(job)
+            item.active = item.active or active
+            if not active:
+                item.last_used = max(item.last_used, job.finished_at)
+
+        for job, active in [(job, True) for job in queued] + [(job, False) for job in finished]:
+            if job.study_path is None:
+                continue
+            if job.zip_file_path is not None and "zip" not in job.deleted_storage:
+                add("zip", job.zip_file_path, job, active)
+            if "inputs" not in job.deleted_storage:
+                add("inputs", job.study_path, job, active)
+            if job.output_dir is not None:
+                add("results", job.output_dir, job, active)
+
+        # uploads and studies no job refers to, including the replacement files of sweeps
+        referenced = {os.path.normcase(os.path.abspath(job.zip_file_path)) for job in queued + finished
+                      if job.zip_file_path is not None}
+        for job in queued + finished:
+            if job.study_path is not None:
+                study_path = os.path.normcase(job.study_path)
+                referenced.update({study_path, f"{study_path}.variants"})
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        for folder_path in (self.zip_folder_path, self.study_folder_path):
+            if not os.path.isdir(folder_path):
+                continue
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    if os.path.normcase(entry.path) not in referenced and entry.stat().st_mtime < cutoff:
+                        item = StorageItem("orphan", entry.path)
+                        item.last_used = entry.stat().st_mtime
+                        items[("orphan", entry.path)] = item
+        for blob_path, mtime in self.find_unreferenced_blobs(cutoff):
+            item = StorageItem("blob", blob_path)
+            item.last_used = mtime
+            items[("blob", blob_path)] = item
+
+        for item in items.values():
+            item.size_bytes = measure(item)
+        return list(items.values())
+
+    def find_unreferenced_blobs(self, cutoff: float) -> list[tuple[str, float]]:
+        """Blobs, and interrupted uploads of blobs, last used before cutoff that no study is hardlinked to.
+        A study copied from the store because it could not be linked does not need its blobs either.
+        :return (path, last modification time) of the blobs
+        """
+        blobs = []
+        if self.blob_store_folder_path is None or not os.path.isdir(self.blob_store_folder_path):
+            return blobs
+        with os.scandir(self.blob_store_folder_path) as prefixes:
+            for prefix in prefixes:
+                if not prefix.is_dir(follow_symlinks=False):
+                    continue
+                with os.scandir(prefix.path) as entries:
+                    for entry in entries:
+                        # DirEntry.stat has no link count on Windows
+                        stat = os.stat(entry.path, follow_symlinks=False)
+                        if stat.st_nlink == 1 and stat.st_mtime < cutoff:
+                            blobs.append((entry.path, stat.st_mtime))
+        return blobs
+
+    def run(self, dry_run: bool = False) -> dict:
+        """Apply the policies once. :return what was (or, for a dry run, would be) deleted"""
+        with self.run_lock:
+            started_at, start = datetime.now(), time.monotonic()
+            items = self.collect_storage()
+            usage_before = sum(item.size_bytes for item in items)
+            plan = plan_cleanup(items, self.policy, time.time())
+            if not dry_run:
+                # background synthesis and export of finished jobs, scheduled before the plan, must complete first
+                self.job_queue.synthesis_executor.submit(lambda: None).result()
+            actions = []
+            for item, reason in plan:
+                action = {"time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "kind": item.kind, "path": item.path,
+                          "bytes": item.size_bytes, "reason": reason, "job_ids": [job.id for job in item.jobs]}
+                if not dry_run:
+                    try:
+                        self.delete(item)
+                    except OSError as e:
+                        action["error"] = str(e)
+                        logging.error(f"Retention could not delete {item.kind} {item.path}: {e}")
+                    else:
+                        logging.info(f"Retention deleted {item.kind} {item.path} ({item.size_bytes} bytes): {reason}.")
+                    self.history.append(action)
+                actions.append(action)
+            if not dry_run and plan:
+                with self.job_queue.lock:
+                    self.job_queue.persist_state()
+            freed = sum(action["bytes"] for action in actions if "error" not in action)
+            report = {"started_at": started_at.strftime("%Y-%m-%d %H:%M:%S"),
+                      "seconds": round(time.monotonic() - start, 3), "dry_run": dry_run, "usage_bytes_before": usage_before, "usage_bytes_after": usage_before - freed,
+                      "freed_bytes": freed, "actions": actions}
+            if not dry_run:
+                self.last_run = {key: value for key, value in report.items() if key != "actions"}
+            return report
+
+    def delete(self, item: StorageItem):
+        """Delete the storage of an item and record it in the archive."""
+        if item.kind in {"orphan", "blob"}:
+            remove_path(item.path)
+            return
+        if item.kind == "zip":
+            remove_path(item.path)
+        elif item.kind == "inputs":
+            # everything of the extracted study but the output collection folders, which are results
+            for entry in os.listdir(item.path) if os.path.isdir(item.path) else []:
+                if entry != "output":
+                    remove_path(os.path.join(item.path, entry))
+            remove_path(f"{item.path}.variants")
+        elif item.kind == "results":
+            remove_path(item.path)
+            study_path = item.jobs[0].study_path
+            output_path = os.path.join(study_path, "output")
+            if all("inputs" in job.deleted_storage for job in item.jobs) and os.path.isdir(output_path) \
+                    and not os.listdir(output_path):
+                remove_path(study_path)
+        with self.job_queue.lock:
+            for record in item.jobs:
+                record.deleted_storage.add(item.kind)
+                if item.kind == "results":
+                    self.job_queue.archive.remove(record.id)
+                else:
+                    self.job_queue.archive.update(record)
+
+    def get_status(self) -> dict:
+        return {"policy": self.policy.to_dict(), "interval_seconds": self.interval_seconds,
+                "last_run": self.last_run, "deleted_bytes": sum(action["bytes"] for action in self.history
+                                                                if "error" not in action),
+                "history": list(self.history)}
+
+
+def measure(item: StorageItem) -> int:
+    """Bytes on the driver disk, not following links, e.g. to year folders on workers."""
+    if not os.path.lexists(item.path):
+        return 0
+    if not os.path.isdir(item.path) or os.path.islink(item.path):
+        return os.lstat(item.path).st_size
+    if item.kind == "inputs":
+        size = scan_tree(item.path, exclude_patterns=["output"]).total_size
+        variants_path = f"{item.path}.variants"
+        return size + (scan_tree(variants_path).total_size if os.path.isdir(variants_path) else 0)
+    return scan_tree(item.path).total_size
+
+
+def remove_path(path: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
@@ -0,0 +1,72 @@
+"""
+Pre-staging of queued studies on workers. A worker copies and extracts a study when it gets its first task of it,
+so that task waits for the staging. Workers that poll /staging_hints stage the studies they are likely to get next
+in the background instead, while they are idle or underloaded (see Worker.prestage_once).
+
+A queued job is hinted to a worker when the active fleet reaches the job within STAGING_HORIZON_ROUNDS rounds of
+tasks, given the work left in the jobs ahead of it, and the worker is among those expected to get its first tasks:
+idle workers first, then those with the most cores, as many as the available years of the job fill.
+The variants of a sweep share their base study, which is hinted once.
+"""
+STAGING_HORIZON_ROUNDS = 2  # rounds of tasks of the whole fleet within which a queued job is staged ahead
+
+
+def choose_staging_workers(available_years: int, years_ahead: int, workers: dict[str, int],
+                           idle_workers: set[str]) -> list[str]:
+    """The workers likely to get the first tasks of a job.
+
+    Args:
+        available_years: years of the job not assigned yet
+        years_ahead: years not assigned yet of the jobs served before this one
+        workers: active worker -> cores, the years of a task it gets
+        idle_workers: workers whose last task request found no work
+    """
+    fleet_cores = sum(workers.values())
+    if not available_years or not fleet_cores or years_ahead > STAGING_HORIZON_ROUNDS * fleet_cores:
+        return []
+    chosen, covered = [], 0
+    for worker in sorted(workers, key=lambda worker: (worker not in idle_workers, -workers[worker], worker)):
+        if covered >= available_years:
+            break
+        chosen.append(worker)
+        covered += workers[worker]
+    return chosen
+
+
+class StagingStats:
+    """Hints sent and the first task of every study on every worker, to measure the staging hit rate."""
+    def __init__(self):
+        self.hinted: dict[str, set[str]] = {}  # study name -> workers it was hinted to
+        self.served: dict[str, set[str]] = {}  # study name -> workers that got a task of it
+        self.hints_sent = 0  # distinct studies hinted to a worker
+        self.first_tasks = 0  # first task of a study on a worker
+        self.hinted_first_tasks = 0  # of which the study was hinted to the worker
+        self.staged_first_tasks = 0  # of which the worker had the study staged already
+
+    def is_served(self, worker: str, study_name: str) -> bool:
+        return worker in self.served.get(study_name, ())
+
+    def record_hints(self, worker: str, study_names: list[str]):
+        for study_name in study_names:
+            workers = self.hinted.setdefault(study_name, set())
+            if worker not in workers:
+                workers.add(worker)
+                self.hints_sent += 1
+
+    def record_task(self, worker: str, study_name: str, staged: bool):
+        if self.is_served(worker, study_name):
+            return
+        self.served.setdefault(study_name, set()).add(worker)
+        self.first_tasks += 1
+        self.hinted_first_tasks += worker in self.hinted.get(study_name, ())
+        self.staged_first_tasks += staged
+
+    def forget(self, study_name: str):
+        """Drop the bookkeeping of a study no queued job needs anymore."""
+        self.hinted.pop(study_name, None)
+        self.served.pop(study_name, None)
+
+    def summary(self) -> dict:
+        return {"hints_sent": self.hints_sent, "first_tasks": self.first_tasks,
+                "hinted_first_tasks": self.hinted_first_tasks, "staged_first_tasks": self.staged_first_tasks,
+                "hit_rate": round(self.staged_first_tasks / self.first_tasks, 3) if self.first_tasks else None}
@@ -0,0 +1,121 @@
+"""
+Incremental synthesis of MC year outputs into mc-all tables.
+Every year is folded into running statistics as soon as it arrives (Welford's algorithm, vectorised
+with NumPy per table), so memory depends on the size of one year of output and not on the number of years.
+The running statistics of a job are saved next to its output with np.savez, not in the persisted job queue.
+"""
+import json
+import logging
+import os
+
+import numpy as np
+
+from utils.antares_output import OutputTable, read_output_table, write_statistics_table
+from utils.scanner import scan_tree
+
+
+STATISTICS_ARRAYS = ("mean", "m2", "min", "max")
+
+
+class RunningStatistics:
+    """Element-wise count, mean, variance, min and max of a stream of equally shaped arrays."""
+    def __init__(self, shape: tuple[int, ...]):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)  # sum of squared differences from the mean
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+
+    def add(self, values: np.ndarray) -> None:
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (values - self.mean)
+        np.fmin(self.min, values, out=self.min)
+        np.fmax(self.max, values, out=self.max)
+
+    @property
+    def std(self) -> np.ndarray:
+        """Population standard deviation across the added arrays."""
+        return np.sqrt(self.m2 / self.count) if self.count > 0 else np.zeros_like(self.mean)
+
+
+class McAllSynthesizer:
+    """Running mc-all statistics of one job, fed year by year as the years are linked into its output folder.
+    Only used from the synthesis executor of the driver, one thread, so it needs no lock."""
+    def __init__(self):
+        self.added_years: set[int] = set()
+        self.statistics: dict[str, RunningStatistics] = {}  # table path relative to the year folder -> statistics
+        self.templates: dict[str, OutputTable] = {}  # header and time columns of every table, without values
+        self.is_written = False  # whether the mc-all tables reflect all added years
+
+    def add_year(self, year: int, year_folder_path: str) -> None:
+        """Fold all output tables of one MC year into the running statistics. Adding a year twice is a no-op."""
+        if year in self.added_years:
+            return
+        tables = [entry.path for entry in scan_tree(year_folder_path).files
+                  if os.path.basename(entry.path).startswith("values-") and entry.path.endswith(".txt")]
+        parsed = {}
+        for rel_path in tables:
+            try:
+                parsed[rel_path] = read_output_table(os.path.join(year_folder_path, *rel_path.split("/")))
+            except (OSError, ValueError) as e:
+                logging.error(f"Could not parse output table {rel_path} of year {year + 1}: {e}")
+
+        for rel_path, table in parsed.items():
+            if rel_path not in self.statistics:
+                self.statistics[rel_path] = RunningStatistics(table.values.shape)
+                self.templates[rel_path] = OutputTable(table.header, table.time_columns,
+                                                       table.value_column_indices, np.empty((0, 0)))
+            if self.statistics[rel_path].mean.shape != table.values.shape:
+                logging.error(f"Output table {rel_path} of year {year + 1} has an unexpected shape, skipping it.")
+                continue
+            self.statistics[rel_path].add(table.values)
+        self.added_years.add(year)
+        self.is_written = False
+        logging.info(f"Added year {year + 1} to the mc-all synthesis ({len(parsed)} tables).")
+
+    def write(self, mc_all_folder_path: str) -> None:
+        """Write the current statistics as mc-all tables, mirroring the layout of the year folders."""
+        for rel_path, statistics in self.statistics.items():
+            table_path = os.path.join(mc_all_folder_path, *rel_path.split("/"))
+            write_statistics_table(table_path, self.templates[rel_path], {
+                "EXP": statistics.mean,
+                "std": statistics.std,
+                "min": statistics.min,
+                "max": statistics.max,
+            })
+        self.is_written = True
+        logging.info(f"Wrote mc-all synthesis of {len(self.added_years)} years to {mc_all_folder_path}.")
+
+    def save(self, file_path: str) -> None:
+        """Save the running statistics to an .npz file, replaced at once so a crash leaves the previous one."""
+        tables = [{"path": rel_path, "count": statistics.count, "header": self.templates[rel_path].header,
+                   "time_columns": self.templates[rel_path].time_columns,
+                   "value_column_indices": [int(i) for i in self.templates[rel_path].value_column_indices]}
+                  for rel_path, statistics in self.statistics.items()]
+        metadata = {"added_years": sorted(self.added_years), "is_written": self.is_written, "tables": tables}
+        arrays = {f"{i}_{name}": getattr(statistics, name)
+                  for i, statistics in enumerate(self.statistics.values()) for name in STATISTICS_ARRAYS}
+        temporary_path = file_path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            np.savez(f, metadata=np.array(json.dumps(metadata)), **arrays)
+        os.replace(temporary_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> "McAllSynthesizer":
+        """Restore a synthesizer saved with save."""
+        synthesizer = cls()
+        with np.load(file_path) as data:
+            metadata = json.loads(data["metadata"].item())
+            for i, table in enumerate(metadata["tables"]):
+                statistics = RunningStatistics(data[f"{i}_mean"].shape)
+                statistics.count = table["count"]
+                for name in STATISTICS_ARRAYS:
+                    setattr(statistics, name, data[f"{i}_{name}"])
+                synthesizer.statistics[table["path"]] = statistics
+                synthesizer.templates[table["path"]] = OutputTable(table["header"], table["time_columns"],
+                                                                   table["value_column_indices"], np.empty((0, 0)))
+        synthesizer.added_years = set(metadata["added_years"])
+        synthesizer.is_written = metadata["is_written"]
+        return synthesizer
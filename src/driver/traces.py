@@ -0,0 +1,79 @@
+"""
+Spans and solver telemetry of the jobs, kept out of queue.pkl so persisting the queue only writes scheduling state
+and does not get slower with every finished task. Every job has an append-only file of JSON records:
+    <folder>/<job id>.jsonl    {"span": {...}} for a span of the driver, written when the span ends
+                               {"task_id": ..., "telemetry": {...}, "spans": [...]} for a finished task
+The records are read back into the job when it is loaded from queue.pkl or from the archive.
+"""
+from functools import partial
+import json
+import logging
+import os
+import threading
+
+
+class TraceStore:
+    def __init__(self, folder_path: str):
+        self.folder_path = folder_path
+        os.makedirs(folder_path, exist_ok=True)
+        self.lock = threading.Lock()  # spans end on request threads and on the synthesis executor
+
+    def get_file_path(self, job_id: str) -> str:
+        return os.path.join(self.folder_path, f"{job_id}.jsonl")
+
+    def append(self, job_id: str, records: list[dict]):
+        if not records:
+            return
+        try:
+            with self.lock, open(self.get_file_path(job_id), "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(record) + "\n" for record in records)
+        except (OSError, TypeError, ValueError) as e:
+            # tracing is diagnostics, it must not break the bookkeeping it measures
+            logging.warning(f"Could not record the trace of job {job_id}: {e}")
+
+    def record_span(self, job_id: str, span: dict):
+        self.append(job_id, [{"span": span}])
+
+    def record_task(self, task: "Task"):
+        if task.telemetry is not None or task.spans:
+            self.append(task.job.id, [{"task_id": task.id, "telemetry": task.telemetry, "spans": task.spans}])
+
+    def attach(self, job: "Job"):
+        """Fill in the spans and telemetry of a job loaded from disk, and record its driver spans from now on.
+        A job that has no file yet, e.g. a new one or one persisted before this store, gets its current ones written.
+        """
+        if job.tracer.sink is not None:
+            return
+        if os.path.exists(self.get_file_path(job.id)):
+            self.load(job)
+        else:
+            self.append(job.id, [{"span": span} for span in job.tracer.spans])
+            for task in job.tasks:
+                self.record_task(task)
+        job.tracer.sink = partial(self.record_span, job.id)
+
+    def load(self, job: "Job"):
+        tasks = {task.id: task for task in job.tasks}
+        spans = []
+        with self.lock, open(self.get_file_path(job.id), encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logging.warning(f"Skipping unreadable line {number} of the trace of job {job.id}.")
+                    continue
+                if "span" in record:
+                    spans.append(record["span"])
+                elif record.get("task_id") in tasks:
+                    task = tasks[record["task_id"]]
+                    task.telemetry, task.spans = record["telemetry"], record["spans"]
+                    if task.telemetry and "per_year" in task.telemetry:  # JSON object keys are strings
+                        task.telemetry["per_year"] = {int(year): usage
+                                                      for year, usage in task.telemetry["per_year"].items()}
+        job.tracer.spans = spans
+
+    def remove(self, job_id: str):
+        try:
+            os.remove(self.get_file_path(job_id))
+        except FileNotFoundError:
+            pass
@@ -1,22 +1,45 @@
 # import os
+import asyncio
+from datetime import datetime
+import hashlib
+import json
 import os
+import re
+import shutil
 import sys
 import logging
-from typing import Annotated
+import time
+from typing import Annotated, Optional
+import uuid
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
 
-from driver.jobs import Job, JobQueue
-from driver.payload_models import GetTaskRequest, GetTaskResponse, TaskDoneRequest
+from driver.blob_store import BlobStore
+from driver.events import format_sse
+from utils.tracing import summarize_spans, to_chrome_trace
+from driver.jobs import Job, JobQueue, TaskStatus
+from driver.retention import RetentionService
+from driver.payload_models import (GetTaskRequest, GetTaskResponse, MissingBlobsRequest, StagingHintsRequest,
+                                   StagingHintsResponse, SubmitManifestRequest, TaskDoneRequest)
 from utils.config import read_config
 from utils.logger import setup_root_logger
+from utils.variants import validate_variants
 
 DRIVER_CONFIG_FILE_NAME = "config_driver.yaml"
+EVENT_KEEPALIVE_SECONDS = 15  # a comment is sent on idle event streams so proxies keep them open
 
-setup_root_logger("driver.log")
-app = FastAPI(title="Antares Winjobs Driver")
 config = read_config(DRIVER_CONFIG_FILE_NAME)
-job_queue = JobQueue(config["persisted_queue_folder_path"])
+setup_root_logger("driver.log", config)
+Job.config = config
+app = FastAPI(title="Antares Winjobs Driver")
+job_queue = JobQueue(config["persisted_queue_folder_path"], config.get("fleet_window_seconds", 600),
+                     config.get("task_lease_seconds"))
+blob_store = BlobStore(config["blob_store_folder_path"])
+retention = RetentionService(job_queue, config)
+retention.start()
 
 @app.get("/health")
 def health():
@@ -24,6 +47,33 @@ def health():
     wd = os.getcwd()
     return {"status": "ok", "cwd": wd, "sys.path": sys.path}
 
+@app.get("/metrics")
+def metrics():
+    """Resource usage of the driver process and time spent persisting the job queue, e.g. for benchmarks."""
+    with job_queue.lock:
+        return {
+            "cpu_seconds": round(time.process_time(), 3),
+            "persist": {**job_queue.persist_stats,
+                        "queue_file_bytes": os.path.getsize(job_queue.queue_file) if os.path.exists(job_queue.queue_file) else 0,
+                        "archive_index_bytes": job_queue.archive.get_index_size()},
+            "queue_length": job_queue.get_queue_length(),
+            "finished_jobs": len(job_queue.archive),
+            "event_subscribers": len(job_queue.events.subscriptions),
+            "staging": job_queue.staging.summary(),
+        }
+
+@app.get("/retention")
+def retention_status():
+    """Retention policies of the driver storage, the last clean-up and the recent deletions."""
+    logging.info("Endpoint /retention called.")
+    return retention.get_status()
+
+@app.post("/retention/run")
+async def retention_run(dry_run: bool = False):
+    """Clean up the driver storage now. With dry_run, only report what would be deleted."""
+    logging.info(f"Endpoint /retention/run called, dry run: {dry_run}.")
+    return await run_in_threadpool(retention.run, dry_run)
+
 @app.post("/submit_job")
 async def submit_job(
     zip_file: Annotated[UploadFile, File()],
@@ -41,23 +91,133 @@ async def submit_job(
         submitter: userid string identifying the submitter
     """
     logging.info("Endpoint /submit_job called.")
+    local_zip_file = await save_uploaded_zip(zip_file)
+    if local_zip_file is None:
+        return {"error": f"File {zip_file.filename} already exists on server. Use a different file name."}
+    return create_job(local_zip_file, priority, submitter)
+
+@app.post("/submit_sweep")
+async def submit_sweep(
+    zip_file: Annotated[UploadFile, File()],
+    priority: Annotated[int, Form()],
+    submitter: Annotated[str, Form()],
+    variants: Annotated[str, Form()]
+):
+    """
+    Submit a parameter sweep: one base study as a zip upload and the variants to run it with.
+
+    The base study is stored once, every variant becomes a job with its own output folder,
+    and the years of all variants are handed out interleaved.
+
+    Args:
+        zip_file: must be a .zip file containing the base Antares study
+        priority: 1-100
+        submitter: userid string identifying the submitter
+        variants: JSON list of variants, see utils.variants
+    """
+    logging.info("Endpoint /submit_sweep called.")
+    try:
+        variants = validate_variants(json.loads(variants))
+    except ValueError as e:  # json.JSONDecodeError is a ValueError
+        raise HTTPException(status_code=400, detail=f"Invalid variants: {e}")
+    local_zip_file = await save_uploaded_zip(zip_file)
+    if local_zip_file is None:
+        return {"error": f"File {zip_file.filename} already exists on server. Use a different file name."}
+    return create_sweep(local_zip_file, priority, submitter, variants)
+
+async def save_uploaded_zip(zip_file: UploadFile) -> Optional[str]:
+    """Save an uploaded zip on the driver server. :return its path, None if a file with that name exists."""
     if not zip_file.filename.endswith(".zip"):
         raise HTTPException(status_code=400, detail="Only .zip uploads supported (for now).")
-
-    # save uploaded zip on the driver server
     local_zip_folder_path = os.path.abspath(config["new_jobs_zip_folder_path"])
     local_zip_file = os.path.join(local_zip_folder_path, zip_file.filename)
     if os.path.exists(local_zip_file):
         logging.error(f"File {zip_file.filename} already exists on server.")
-        return {"error": f"File {zip_file.filename} already exists on server. Use a different file name."}
+        return None
+    with open(local_zip_file, "wb") as f:
+        logging.info(f"Saving uploaded zip file to: {local_zip_file}")
+        contents = await zip_file.read()
+        f.write(contents)
+    return local_zip_file
+
+@app.post("/submit_job_stream")
+async def submit_job_stream(request: Request, zip_file_name: str, priority: int, submitter: str):
+    """
+    Submit a job as a raw zip request body of unknown length, e.g. sent with chunked transfer encoding.
+
+    The body is written to disk as it arrives, so the user can zip and upload at the same time.
+
+    Args:
+        zip_file_name: name of the .zip file to store the upload as
+        priority: 1-100
+        submitter: userid string identifying the submitter
+    """
+    logging.info("Endpoint /submit_job_stream called.")
+    if not zip_file_name.endswith(".zip") or os.path.basename(zip_file_name) != zip_file_name:
+        raise HTTPException(status_code=400, detail="zip_file_name must be a plain .zip file name.")
+
+    local_zip_folder_path = os.path.abspath(config["new_jobs_zip_folder_path"])
+    local_zip_file = os.path.join(local_zip_folder_path, zip_file_name)
+    if os.path.exists(local_zip_file):
+        logging.error(f"File {zip_file_name} already exists on server.")
+        return {"error": f"File {zip_file_name} already exists on server. Use a different file name."}
+
+    # write to a partial file first, so an interrupted upload never looks like a complete zip
+    partial_zip_file = local_zip_file + ".part"
+    logging.info(f"Streaming uploaded zip file to: {local_zip_file}")
+    try:
+        with open(partial_zip_file, "wb") as f:
+            async for chunk in request.stream():
+                f.write(chunk)
+    except ClientDisconnect:
+        logging.error(f"Upload of {zip_file_name} was interrupted by the client.")
+        os.remove(partial_zip_file)
+        raise HTTPException(status_code=400, detail="Upload interrupted.")
+    os.replace(partial_zip_file, local_zip_file)
+
+    return create_job(local_zip_file, priority, submitter)
+
+@app.post("/missing_blobs")
+async def missing_blobs(request: MissingBlobsRequest):
+    """Return which of the given file hashes are not in the blob store yet, so only those need uploading."""
+    logging.info(f"Endpoint /missing_blobs called for {len(request.hashes)} hashes.")
+    return {"missing": blob_store.get_missing_blobs(request.hashes)}
+
+@app.put("/blob/{sha256}")
+async def upload_blob(sha256: str, request: Request):
+    """Upload the raw bytes of one file to the blob store. The content must match its sha256 hash."""
+    if not re.fullmatch(r"[0-9a-f]{64}", sha256):
+        raise HTTPException(status_code=400, detail="Blob key must be a lowercase sha256 hex digest.")
+    if not await blob_store.add_blob(sha256, request.stream()):
+        raise HTTPException(status_code=400, detail="Uploaded content does not match its sha256 hash.")
+    return {"stored": sha256}
+
+@app.post("/submit_job_manifest")
+async def submit_job_manifest(request: SubmitManifestRequest):
+    """
+    Submit a job as a manifest of files that are all present in the blob store.
+
+    The study is materialised from the store with hardlinks, so an unchanged resubmission costs no upload and no extra disk.
+    """
+    logging.info(f"Endpoint /submit_job_manifest called for {request.study_name} with {len(request.files)} files.")
+    if os.path.basename(request.study_name) != request.study_name:
+        raise HTTPException(status_code=400, detail="study_name must be a plain folder name.")
+    missing = blob_store.get_missing_blobs([entry.sha256 for entry in request.files])
+    if missing:
+        raise HTTPException(status_code=409, detail={"error": "Blobs missing from the store.", "missing": missing})
+
+    new_job = Job(request.submitter, request.priority, None, study_name=request.study_name)
+    if new_job.validate_job_parameters():
+        files = [entry.model_dump() for entry in request.files]
+        new_job.prepare_job_from_blob_store(blob_store, files, request.empty_dirs)
+        job_queue.add_job(new_job)
+        return {"job_id": new_job.id, "workload_length": len(new_job.workload), "job_queue_length": job_queue.get_queue_length()}
     else:
-        with open(local_zip_file, "wb") as f:
-            logging.info(f"Saving uploaded zip file to: {local_zip_file}")
-            contents = await zip_file.read()
-            f.write(contents)
+        return {"error": "Job validation failed. See server logs for details."}
 
-    # create a new job
-    new_job = Job(submitter, priority, local_zip_file, config)
+def create_job(local_zip_file: str, priority: int, submitter: str) -> dict:
+    """Create a job from a zip stored on the driver, prepare it and add it to the queue."""
+    new_job = Job(submitter, priority, local_zip_file)
     if new_job.validate_job_parameters():
         new_job.prepare_job_for_queue()
         job_queue.add_job(new_job)
@@ -65,6 +225,45 @@ async def submit_job(
     else:
         return {"error": "Job validation failed. See server logs for details."}
 
+def create_sweep(local_zip_file: str, priority: int, submitter: str, variants: list[dict]) -> dict:
+    """Create a job per variant on a base study extracted once, and add them to the queue together."""
+    sweep_id = str(uuid.uuid4())
+    jobs = [Job(submitter, priority, local_zip_file) for _ in variants]
+    if not jobs[0].validate_job_parameters():
+        return {"error": "Job validation failed. See server logs for details."}
+    with jobs[0].tracer.span("prepare_job", bytes=os.path.getsize(local_zip_file)):
+        study_folder_path = jobs[0].extract_study()
+    try:
+        for job, variant in zip(jobs, variants):
+            job.prepare_job_as_variant(study_folder_path, sweep_id, variant)
+    except ValueError as e:  # e.g. a base study whose generaldata.ini gives no playlist with the overrides
+        logging.error(f"Could not prepare sweep {sweep_id}, removing its base study and zip: {e}")
+        shutil.rmtree(study_folder_path, ignore_errors=True)
+        shutil.rmtree(f"{study_folder_path}.variants", ignore_errors=True)
+        os.remove(local_zip_file)
+        return {"error": f"Invalid sweep: {e}"}
+    job_queue.add_jobs(jobs)
+    return {"sweep_id": sweep_id,
+            "jobs": [{"variant": job.variant["name"], "job_id": job.id, "workload_length": len(job.workload)}
+                     for job in jobs],
+            "job_queue_length": job_queue.get_queue_length()}
+
+@app.get("/sweep_overview/{sweep_id}")
+async def sweep_overview(sweep_id: str):
+    """Progress of every variant of a sweep and of the sweep as a whole."""
+    logging.info(f"Endpoint /sweep_overview/{sweep_id} called.")
+    with job_queue.lock:
+        jobs = job_queue.get_sweep_jobs(sweep_id)
+        if not jobs:
+            raise HTTPException(status_code=404, detail=f"Sweep {sweep_id} not found.")
+        variants = [{"job_id": job.id, "output_dir": job.output_dir, **job.get_progress()}
+                    for job in jobs]
+    years_total = sum(variant["years_total"] for variant in variants)
+    years_done = sum(variant["years_done"] for variant in variants)
+    return {"sweep_id": sweep_id, "years_total": years_total, "years_done": years_done,
+            "percentage_complete": int(100 * years_done / years_total) if years_total else 100,
+            "variants": variants}
+
 @app.get("/job_details/{job_id}")
 async def job_details(job_id: str):
     logging.info(f"Endpoint /job_details/{job_id} called.")
@@ -86,25 +285,29 @@ async def jobs_overview():
             "id": job.id,
             "submitter": job.submitter,
             "zip_file_path": job.zip_file_path,
-            "study_name": job.antares_study.study_name,
-            "study_path": job.antares_study.study_path,
+            "study_name": os.path.basename(job.study_path),
+            "study_path": job.study_path,
             "workload_length": len(job.workload) if job.workload else 0,
             "percentage_complete": job.percentage_complete,
+            "sweep_id": job.sweep_id,
+            "variant": job.variant["name"] if job.variant else None,
             "status": "queued",
             "queue_priority": prio,
             "queue_counter": cnt
         })
 
-    # Finished jobs
-    for job in job_queue.finished:
+    # Finished jobs, from their records in the archive
+    for record in list(job_queue.archive.records.values()):
         jobs.append({
-            "id": job.id,
-            "submitter": job.submitter,
-            "zip_file_path": job.zip_file_path,
-            "study_name": job.antares_study.study_name,
-            "study_path": job.antares_study.study_path,
-            "workload_length": len(job.workload) if job.workload else 0,
-            "percentage_complete": job.percentage_complete,
+            "id": record.id,
+            "submitter": record.submitter,
+            "zip_file_path": record.zip_file_path,
+            "study_name": os.path.basename(record.study_path),
+            "study_path": record.study_path,
+            "workload_length": record.workload_length,
+            "percentage_complete": record.percentage_complete,
+            "sweep_id": record.sweep_id,
+            "variant": record.variant_name,
             "status": "finished"
         })
     return jobs
@@ -113,23 +316,35 @@ async def jobs_overview():
 async def get_task(request: GetTaskRequest) -> GetTaskResponse | dict :
     """Create a task for the worker and send it as a respone."""
     logging.info(f"Endpoint /get_work called by {request.worker} for {request.cores} work units.")
-    task = job_queue.assign_task(request.worker, amount=request.cores)
+    task = job_queue.assign_task(request.worker, amount=request.cores, staged=set(request.staged),
+                                 request_id=request.request_id)
     if task:
         resp = {
             "id": task.id,
             "job_id": task.job.id,
             "submitter": task.job.submitter,
             "priority": task.job.priority,
-            "zip_file_path": task.job.zip_file_path,
+            "zip_file_path": task.job.zip_file_path or "",
+            "study_path": task.job.study_path,
             "study_name": task.job.study_name,
             "worker": task.worker,
-            "workload": task.workload or [],
+            "workload": task.workload,
             "percentage_complete": int(task.job.percentage_complete or 0),
+            "variant": task.job.variant,
         }
         return GetTaskResponse.model_validate(resp)
     else:
         return {"message": "No work available at this time."}
 
+@app.post("/staging_hints")
+async def staging_hints(request: StagingHintsRequest) -> StagingHintsResponse:
+    """Studies of queued jobs the worker is likely to get tasks of next, to stage in the background."""
+    logging.info(f"Endpoint /staging_hints called by {request.worker}.")
+    jobs = job_queue.get_staging_hints(request.worker, request.cores)
+    return StagingHintsResponse(hints=[{"job_id": job.id, "priority": job.priority,
+                                        "zip_file_path": job.zip_file_path or "", "study_path": job.study_path,
+                                        "study_name": job.study_name} for job in jobs])
+
 @app.get("/task_overview/{job_id}")
 async def task_overview(job_id: str):
     logging.info(f"Endpoint /task_overview/{job_id} called.")
@@ -143,9 +358,11 @@ async def task_overview(job_id: str):
             tasks.append({
                 "id": task.id,
                 "worker": task.worker,
-                "created_at": task.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                "workload": task.workload,
+                "created_at": datetime.fromtimestamp(task.created_at).strftime("%Y-%m-%d %H:%M:%S"),
+                "workload": str(task.workload),
                 "status": task.status,
+                "failed_years": str(task.get_failed_years()),
+                "telemetry": task.telemetry,
             })
         return {
             "job_id": job.id,
@@ -180,14 +397,154 @@ async def task_details(job_id: str, task_id: str):
                 "task": specific_task
             }
 
+@app.get("/job_eta/{job_id}")
+async def job_eta(job_id: str):
+    """
+    Predict when a job starts and finishes, from the remaining work of the jobs ahead of it in the queue,
+    the cost per MC year of each job and the cores of the workers that recently asked for work.
+    Predicted times are None when no worker is active.
+    """
+    logging.info(f"Endpoint /job_eta/{job_id} called.")
+    eta = job_queue.get_job_eta(job_id)
+    if eta is None:
+        return {"error": "Job not found."}
+    return eta
+
+@app.get("/events")
+async def events(request: Request, job_id: Optional[str] = None, submitter: Optional[str] = None,
+                 last_event_id: Annotated[Optional[int], Header()] = None):
+    """
+    Server-sent event stream of job and task state transitions: job_queued, task_assigned, task_finished
+    and job_finished, each carrying the progress of its job. A new stream starts with a job_state event
+    per matching unfinished job. A client reconnecting with the Last-Event-ID header gets the events it missed.
+
+    Args:
+        job_id: only stream events of this job
+        submitter: only stream events of jobs of this submitter
+    """
+    logging.info(f"Endpoint /events called for job {job_id}, submitter {submitter}.")
+    subscription = job_queue.events.subscribe(job_id, submitter, last_event_id)
+    snapshot = []
+    if last_event_id is None:
+        with job_queue.lock:
+            jobs = [job for prio, cnt, job in sorted(job_queue.queue.queue, key=lambda item: item[:2])]
+            finished_job = job_queue.archive.load(job_id) if job_id is not None else None
+            if finished_job is not None:
+                jobs.append(finished_job)
+            snapshot = [{"type": "job_state", "job_id": job.id, "submitter": job.submitter, **job.get_progress()}
+                        for job in jobs if subscription.matches({"job_id": job.id, "submitter": job.submitter})]
+
+    async def stream():
+        try:
+            for event in snapshot:
+                yield format_sse(event)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:  # the client fell behind
+                    break
+                yield format_sse(event)
+        finally:
+            job_queue.events.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/job_timeline/{job_id}")
+async def job_timeline(job_id: str, format: str = "json"):
+    """
+    Timed stages of a job: preparation, synthesis and per-task bookkeeping on the driver, and staging, solving,
+    validation and shipping of every task on its worker, with bytes processed where relevant.
+
+    Args:
+        format: "json" for the spans and a summary per stage, "chrome" for Trace Event Format JSON
+                to open in chrome://tracing or ui.perfetto.dev
+    """
+    logging.info(f"Endpoint /job_timeline/{job_id} called.")
+    if format not in {"json", "chrome"}:
+        raise HTTPException(status_code=400, detail="format must be json or chrome.")
+    job = job_queue.get_job_by_id(job_id)
+    if job is None:
+        return {"error": "Job not found."}
+    with job_queue.lock:
+        spans = job.get_timeline()
+    if format == "chrome":
+        return to_chrome_trace(spans)
+    return {"job_id": job.id, "study_name": job.study_name, "summary": summarize_spans(spans), "spans": spans}
+
+@app.get("/year_index/{job_id}")
+async def year_index(job_id: str, year: Optional[int] = None, status: Optional[str] = None):
+    """
+    Query where the output of the MC years of a job lives, which worker and task produced it, its size and checksum.
+
+    Args:
+        year: 0-based MC year to locate, all years if omitted
+        status: only list years that are "done", "missing" (not done yet), "given_up" or "failed" (failed at least once)
+    """
+    logging.info(f"Endpoint /year_index/{job_id} called.")
+    if status not in {None, "done", "missing", "given_up", "failed"}:
+        raise HTTPException(status_code=400, detail="status must be one of done, missing, given_up or failed.")
+    job = job_queue.get_job_by_id(job_id)
+    if job is None:
+        return {"error": "Job not found."}
+    with job_queue.lock:
+        entries = job.get_year_index(status)
+    if year is not None:
+        entries = [entry for entry in entries if entry["year"] == year]
+        if not entries:
+            return {"error": "Year not found."}
+        return entries[0]
+    return {"job_id": job.id, "study_name": job.study_name, "years": entries}
+
+@app.put("/task_output/{job_id}/{task_id}/{year}")
+async def upload_task_output(job_id: str, task_id: str, year: int, sha256: str, request: Request):
+    """
+    Upload the zipped output folder of one MC year of a running task, so the driver keeps its own copy.
+
+    Args:
+        year: 0-based MC year, must be part of the workload of the task
+        sha256: hex digest of the zip, the upload is rejected if the content does not match
+    """
+    logging.info(f"Endpoint /task_output called for year {year + 1} of task {task_id}.")
+    job = job_queue.get_job_by_id(job_id)
+    task = job.get_task_by_id(task_id) if job else None
+    if task is None or task.status != TaskStatus.RUNNING or year not in task.workload:
+        raise HTTPException(status_code=404, detail="No running task with this year in its workload.")
+    if not re.fullmatch(r"[0-9a-f]{64}", sha256):
+        raise HTTPException(status_code=400, detail="sha256 must be a lowercase sha256 hex digest.")
+
+    incoming_folder_path = job.get_incoming_folder_path()
+    zip_file_path = os.path.join(incoming_folder_path, f"{str(year + 1).zfill(5)}.zip")
+    hasher = hashlib.sha256()
+    try:
+        with open(zip_file_path, "wb") as f:
+            async for chunk in request.stream():
+                hasher.update(chunk)
+                f.write(chunk)
+    except ClientDisconnect:
+        logging.error(f"Upload of year {year + 1} of task {task_id} was interrupted by the client.")
+        shutil.rmtree(incoming_folder_path, ignore_errors=True)
+        raise HTTPException(status_code=400, detail="Upload interrupted.")
+    if hasher.hexdigest() != sha256:
+        logging.error(f"Uploaded output of year {year + 1} of task {task_id} does not match its hash, discarding it.")
+        shutil.rmtree(incoming_folder_path, ignore_errors=True)
+        raise HTTPException(status_code=400, detail="Uploaded content does not match its sha256 hash.")
+
+    await run_in_threadpool(job.receive_year_output, year, zip_file_path)
+    return {"received": year}
+
 @app.post("/finish_task")
 async def finish_task(request: TaskDoneRequest) -> dict :
     """Create a task for the worker and send it as a respone."""
     logging.info(f"Endpoint /finish_task called.")
-    job_queue.finish_task(request)
-    return {"response": "Task marked as finished."}
+    if job_queue.finish_task(request):
+        return {"response": "Task marked as finished."}
+    else:
+        return {"response": "Task completion ignored, it was already registered or is unknown."}
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="localhost", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="localhost", port=8000, log_config=None)  # uvicorn logs go through the root logger
\ No newline at end of file
@@ -1,25 +1,56 @@
 """Entrypoint for the user entity of this project."""
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import os
 import getpass
+import json
 import logging
+from typing import Optional
+
 import requests
 
 from utils.antares import AntaresStudy
+from utils.bulk_submit import resolve_studies, submit_bulk
+from utils.compression import get_compression_profile
 from utils.config import read_config
+from utils.event_stream import ProgressTracker, follow_events
 from utils.logger import setup_root_logger
+from utils.manifest import build_manifest
+from utils.variants import read_sweep_spec
 
 USER_CONFIG_FILE_NAME = "config_user.yaml"
-
-setup_root_logger("user.log")
+UPLOAD_THREADS = 8
 
 def main():
     parser = argparse.ArgumentParser(description="Submit an Antares study to the driver.")
     parser.add_argument("--study_path", type=str, help="Absolute path to the Antares study folder.")
+    parser.add_argument("--study_paths", type=str, nargs="+", default=[],
+                        help="Bulk mode: paths or glob patterns of several studies, submitted with --priority.")
+    parser.add_argument("--manifest", type=str,
+                        help="Bulk mode: YAML list of studies, each a path or a mapping with 'path' and 'priority'.")
+    parser.add_argument("--summary", type=str,
+                        help="Bulk mode: write the JSON summary of the batch to this file instead of printing it.")
+    parser.add_argument("--watch", type=str, nargs="?", const="", metavar="JOB_ID",
+                        help="Follow live progress of a job, or of all your jobs if no job id is given, instead of submitting.")
+    parser.add_argument("--sweep", type=str,
+                        help="Parameter sweep: YAML list of variants to run the study of --study_path with.")
     parser.add_argument("--priority", type=int, default=50, help="Job priority (default: 50)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Zip and upload at the same time, without writing an intermediate zip file.")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Only upload files the driver does not have yet, identified by content hash.")
     args = parser.parse_args()
 
     config = read_config(USER_CONFIG_FILE_NAME)
+    setup_root_logger("user.log", config)
+
+    if args.watch is not None:
+        watch(f"http://{config['driver_ip']}:{config['driver_port']}", args.watch or None, getpass.getuser())
+        return
+
+    if args.study_paths or args.manifest:
+        submit_many(args, config)
+        return
 
     # VALIDATION
     study_path = os.path.abspath(args.study_path)
@@ -31,6 +62,18 @@ def main():
         logging.error("Provided path is not a valid Antares study.")
         return
 
+    variants = None
+    if args.sweep:
+        if args.stream or args.dedup:
+            logging.error("A sweep uploads its base study as a zip, --sweep can't be combined with --stream or --dedup.")
+            return
+        try:
+            variants = read_sweep_spec(args.sweep)
+        except (OSError, ValueError) as e:
+            logging.error(f"Invalid sweep file {args.sweep}: {e}")
+            return
+        logging.info(f"Sweep of {len(variants)} variants: {', '.join(variant['name'] for variant in variants)}")
+
     antares_study = AntaresStudy(study_path)
     version = antares_study.get_antares_version()
     logging.info(f"Antares version: {version}")
@@ -43,24 +86,112 @@ def main():
     else:
         logging.info("Output is not empty. Note that existing output will not be sent to the driver.")
 
+    driver_ip = config["driver_ip"]
+    driver_port = config["driver_port"]
+    driver_uri = f"http://{driver_ip}:{driver_port}"
+    username = getpass.getuser()
+    compression_profile = get_compression_profile(config.get("compression_profile"))
+    link_bandwidth_mbps = config.get("link_bandwidth_mbps")
+
+    if args.dedup:
+        response = submit_with_manifest(antares_study, driver_uri, args.priority, username)
+        logging.info(f"Driver response: {response}")
+        return
+
+    if args.stream:
+        # ZIP & SUBMIT at the same time, the zip is generated on the fly and sent with chunked transfer encoding
+        params = {"zip_file_name": antares_study.get_package_name(), "priority": args.priority, "submitter": username}
+        response = requests.post(driver_uri + "/submit_job_stream", params=params,
+                                 data=antares_study.stream_study(compression_profile, link_bandwidth_mbps), headers={"Content-Type": "application/zip"})
+        logging.info(f"Driver response: {response.json()}")
+        return
+
     # ZIP
     output_zip_folder = config.get("local_zip_folder_path")
     user_7z_path = config.get("user_7z_path")
-    zip_file_path = antares_study.package_study(output_zip_folder, user_7z_path)
+    zip_file_path = antares_study.package_study(output_zip_folder, user_7z_path, config.get("zip_method"),
+                                                compression_profile, link_bandwidth_mbps)
 
     # SUBMIT
-    driver_ip = config["driver_ip"]
-    driver_port = config["driver_port"]
-    driver_uri = f"http://{driver_ip}:{driver_port}"
-    driver_endpoint = driver_uri + "/submit_job"
-    username = getpass.getuser()
+    driver_endpoint = driver_uri + ("/submit_sweep" if variants else "/submit_job")
     with open(zip_file_path, "rb") as zip_file:
         files = {"zip_file": (os.path.basename(zip_file_path), zip_file, "application/zip")}
         data = {"priority": args.priority, "submitter": username}
+        if variants:
+            data["variants"] = json.dumps(variants)
         response = requests.post(driver_endpoint, files=files, data=data)
         logging.info(f"Driver response: {response.json()}")
 
 
+def watch(driver_uri: str, job_id: Optional[str], username: str) -> None:
+    """Log progress and throughput of a job, or of all jobs of the user, as the driver reports changes.
+    Watching a single job ends when it finishes, watching all jobs runs until interrupted.
+    """
+    tracker = ProgressTracker()
+    try:
+        for event in follow_events(driver_uri, job_id=job_id, submitter=None if job_id else username):
+            logging.info(tracker.describe(event))
+            if job_id and event["percentage_complete"] == 100:
+                logging.info(f"Job {job_id} finished.")
+                return
+    except KeyboardInterrupt:
+        pass
+
+
+def submit_many(args: argparse.Namespace, config: dict) -> None:
+    """Bulk mode: package studies in parallel, upload them concurrently and report a JSON summary."""
+    submissions = resolve_studies(args.study_paths, args.manifest, args.priority)
+    if not submissions:
+        logging.error("No studies found to submit.")
+        return
+    logging.info(f"Submitting {len(submissions)} studies.")
+    summary = submit_bulk(
+        submissions,
+        driver_uri=f"http://{config['driver_ip']}:{config['driver_port']}",
+        username=getpass.getuser(),
+        output_zip_folder_path=config.get("local_zip_folder_path"),
+        user_7z_path=config.get("user_7z_path"),
+        zip_method=config.get("zip_method"),
+        compression_profile=get_compression_profile(config.get("compression_profile")),
+        link_bandwidth_mbps=config.get("link_bandwidth_mbps"),
+        package_processes=config.get("bulk_package_processes"),
+        upload_threads=config.get("bulk_upload_threads", 4),
+    )
+    logging.info(f"Bulk submit done in {summary['total_seconds']}s: {summary['submitted']} submitted, "
+                 f"{summary['failed']} failed, {summary['bytes_sent'] / (1024 * 1024):.1f} MB sent.")
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    else:
+        print(json.dumps(summary, indent=2))
+
+
+def submit_with_manifest(antares_study: AntaresStudy, driver_uri: str, priority: int, username: str) -> dict:
+    """Submit a study by content: send a manifest of file hashes and only upload the files the driver lacks."""
+    manifest = build_manifest(antares_study.study_path, ["output"])
+    local_paths = {entry["sha256"]: entry["local_path"] for entry in manifest["files"]}
+    response = requests.post(driver_uri + "/missing_blobs", json={"hashes": list(local_paths)})
+    response.raise_for_status()
+    missing = response.json()["missing"]
+    logging.info(f"Driver lacks {len(missing)} of {len(local_paths)} unique files, uploading those.")
+
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=UPLOAD_THREADS) as executor:
+        def upload_blob(sha256: str) -> None:
+            with open(local_paths[sha256], "rb") as f:
+                session.put(f"{driver_uri}/blob/{sha256}", data=f).raise_for_status()
+        list(executor.map(upload_blob, missing))
+
+    payload = {
+        "study_name": os.path.splitext(antares_study.get_package_name())[0],
+        "priority": priority,
+        "submitter": username,
+        "files": [{"path": entry["path"], "sha256": entry["sha256"], "size": entry["size"]}
+                  for entry in manifest["files"]],
+        "empty_dirs": manifest["empty_dirs"],
+    }
+    response = requests.post(driver_uri + "/submit_job_manifest", json=payload)
+    return response.json()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,21 +1,34 @@
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import os
 import logging
+import tempfile
+import threading
 import time
+from typing import Optional
 
+import psutil
 import requests
 import socket
+import subprocess
+import uuid
 
 from utils.antares import AntaresStudy
+from utils.compression import get_compression_profile
 from utils.config import read_config
+from utils.http_client import DriverClient, DriverUnavailableError, Outbox
 from utils.logger import setup_root_logger
-from utils.smart_zip import smart_unzip_file
+from utils.manifest import describe_folder, hash_file
+from utils.rate_limit import RateLimiter, copy_file
+from utils.smart_zip import smart_unzip_file, smart_zip_folder
+from utils.study_metadata import read_study_metadata
+from utils.tracing import Tracer, summarize_spans
+from utils.variants import create_variant_study
+from utils.year_set import YearSet
 
 WORKER_CONFIG_FILE_NAME = "config_worker.yaml"
 
-setup_root_logger("worker.log")
-
 class Worker:
     def __init__(self, config_file_name, name=None):
         logging.info("Creating Worker instance.")
@@ -28,6 +41,15 @@ class Worker:
         self.local_study_folder_path = os.path.abspath(self.config["local_study_folder_path"])
         self.wait_time_between_requests = int(self.config["wait_time_between_requests"])
         self.wait_until_time_for_next_request: datetime = datetime.now()
+        self.driver_client = DriverClient(self.driver_uri,
+                                          timeout=self.config.get("request_timeout_seconds", 30),
+                                          max_retries=self.config.get("max_request_retries", 5))
+        self.outbox = Outbox(self.config.get("outbox_folder_path", "data/worker/outbox"))
+        self.tracer = Tracer(self.name)  # stages of the current task, sent to the driver with its completion
+        self.staging_locks: dict[str, threading.Lock] = {}  # study name -> held while the study is being staged
+        self.prestage_limiters: dict[str, RateLimiter] = {}  # study name -> bandwidth limit of its background staging
+        self.prestaged: set[str] = set()  # studies staged ahead of a task, reported to the driver for its hit rate
+        self.prestage_stop = threading.Event()
 
     def determine_cores(self):
         """Determine number of CPU cores to use. User can specify not to use all system cores."""
@@ -49,8 +71,14 @@ class Worker:
 
     def request_new_task(self) -> dict:
         """Notify server, get work assignment"""
-        response = requests.post(f"{self.driver_uri}/get_task",
-                                 json={"worker": self.name, "cores": self.max_cores_to_use})
+        try:
+            # the request id stays the same on retries, so a retry after a lost answer gets the same task
+            response = self.driver_client.post("get_task", json={"worker": self.name, "cores": self.max_cores_to_use,
+                                                                 "staged": sorted(self.prestaged),
+                                                                 "request_id": uuid.uuid4().hex})
+        except DriverUnavailableError as e:
+            logging.error(f"Could not request a new task: {e}")
+            return {"message": "No work available at this time."}
         return response.json()  # Should contain model_path, years
 
     def verify_if_model_is_local(self, driver_zip_file_path: str) -> bool:
@@ -60,73 +88,342 @@ class Worker:
         local_zip_file = os.path.join(self.local_zip_folder_path, os.path.basename(driver_zip_file_path))
         return os.path.exists(local_zip_file)
 
-    def copy_model_from_driver(self, driver_zip_file_path: str) -> str:
+    def copy_model_from_driver(self, driver_zip_file_path: str, tracer: Tracer = None,
+                               rate_limiter: RateLimiter = None) -> str:
         logging.info("Copying model zip from driver to local storage.")
         local_zip_file_path = os.path.join(self.local_zip_folder_path, os.path.basename(driver_zip_file_path))
-        shutil.copy(driver_zip_file_path, local_zip_file_path)
+        partial_zip_file_path = local_zip_file_path + ".part"  # an interrupted copy is not taken for the model
+        with (tracer or self.tracer).span("copy_model") as span:
+            copy_file(driver_zip_file_path, partial_zip_file_path, rate_limiter)
+            os.replace(partial_zip_file_path, local_zip_file_path)
+            span["bytes"] = os.path.getsize(local_zip_file_path)
         return local_zip_file_path
 
-    def extract_local_model_to_study_folder(self, local_zip_file_path: str) -> str:
+    def extract_local_model_to_study_folder(self, local_zip_file_path: str, tracer: Tracer = None) -> str:
         logging.info("Extracting model zip to local study folder.")
         local_7z_path = self.config["7_zip_file_path"]
-        study_folder_path = smart_unzip_file(local_zip_file_path, self.local_study_folder_path, local_7z_path)
+        with (tracer or self.tracer).span("extract", bytes=os.path.getsize(local_zip_file_path)):
+            study_folder_path = smart_unzip_file(local_zip_file_path, self.local_study_folder_path, local_7z_path,
+                                                 self.config.get("zip_method"))
+        return study_folder_path
+
+    def copy_study_folder_from_driver(self, driver_study_path: str, study_name: str, tracer: Tracer = None,
+                                      rate_limiter: RateLimiter = None) -> str:
+        """Copy a study folder, without its output, for jobs the driver materialised from its blob store."""
+        logging.info("Copying study folder from driver to local storage.")
+        study_folder_path = os.path.join(self.local_study_folder_path, study_name)
+        partial_study_folder_path = study_folder_path + ".part"
+        if os.path.exists(partial_study_folder_path):
+            shutil.rmtree(partial_study_folder_path)
+        with (tracer or self.tracer).span("copy_study_folder"):
+            shutil.copytree(driver_study_path, partial_study_folder_path, ignore=shutil.ignore_patterns("output"),
+                            copy_function=lambda source, target: copy_file(source, target, rate_limiter))
+        os.makedirs(os.path.join(partial_study_folder_path, "output"), exist_ok=True)
+        os.replace(partial_study_folder_path, study_folder_path)
         return study_folder_path
 
-    def tune_model_years(self, study_folder_path: str, years: list[int]) -> None:
+    def is_study_local(self, assignment: dict) -> bool:
+        if assignment["zip_file_path"]:
+            return self.verify_if_model_is_local(assignment["zip_file_path"])
+        return os.path.exists(os.path.join(self.local_study_folder_path, assignment["study_name"]))
+
+    def stage_study(self, assignment: dict, tracer: Tracer = None, rate_limiter: RateLimiter = None) -> str:
+        """Make sure the study of the assignment (or staging hint) is available locally and return its folder.
+        A task for a study that is being staged in the background waits for it, and lifts its bandwidth limit.
+        """
+        study_name = assignment["study_name"]
+        background_limiter = self.prestage_limiters.get(study_name)
+        if rate_limiter is None and background_limiter is not None:
+            background_limiter.lift()
+        with self.staging_locks.setdefault(study_name, threading.Lock()):
+            study_folder_path = os.path.join(self.local_study_folder_path, study_name)
+            if self.is_study_local(assignment):
+                logging.info("Assignment study found locally.")
+                return study_folder_path
+            logging.info("Assignment study not found locally.")
+            if not assignment["zip_file_path"]:
+                return self.copy_study_folder_from_driver(assignment["study_path"], study_name, tracer, rate_limiter)
+            local_zip_file_path = self.copy_model_from_driver(assignment["zip_file_path"], tracer, rate_limiter)
+            return self.extract_local_model_to_study_folder(local_zip_file_path, tracer)
+
+    def is_underloaded(self) -> bool:
+        """Whether the machine has CPU to spare for background staging, e.g. it is idle."""
+        return psutil.cpu_percent(interval=1.0) < self.config.get("prestage_max_cpu_percent", 50)
+
+    def prestage_once(self) -> list[str]:
+        """Stage the studies the driver expects this worker to get next, while the worker is underloaded.
+        :return the studies that were staged
+        """
+        try:
+            response = self.driver_client.post("staging_hints", json={"worker": self.name,
+                                                                      "cores": self.max_cores_to_use})
+        except DriverUnavailableError as e:
+            logging.error(f"Could not get staging hints: {e}")
+            return []
+        hints = response.json()["hints"]
+        # studies no longer hinted were served already or are not needed anymore
+        self.prestaged = self.prestaged & {hint["study_name"] for hint in hints}
+        staged = []
+        for hint in hints:
+            study_name = hint["study_name"]
+            if self.is_study_local(hint):
+                self.prestaged = self.prestaged | {study_name}
+                continue
+            if not self.is_underloaded():
+                logging.debug("Worker is busy, staging of hinted studies is postponed.")
+                break
+            tracer = Tracer(self.name)
+            self.prestage_limiters[study_name] = RateLimiter.from_mbps(self.config.get("prestage_bandwidth_mbps"))
+            try:
+                with tracer.span("prestage_study", study=study_name):
+                    self.stage_study(hint, tracer, self.prestage_limiters[study_name])
+            except (OSError, ValueError) as e:
+                logging.error(f"Could not stage study {study_name} ahead of its tasks: {e}")
+                continue
+            finally:
+                self.prestage_limiters.pop(study_name, None)
+            self.prestaged = self.prestaged | {study_name}
+            staged.append(study_name)
+            logging.info(f"Staged study {study_name} ahead of its tasks in "
+                         f"{summarize_spans(tracer.spans)['makespan_seconds']} seconds.")
+        return staged
+
+    def prestage_loop(self):
+        while not self.prestage_stop.is_set():
+            try:
+                self.prestage_once()
+            except Exception:
+                logging.exception("Staging of hinted studies failed.")
+            self.prestage_stop.wait(self.config.get("prestage_poll_seconds", 30))
+
+    def start_prestaging(self) -> Optional[threading.Thread]:
+        """Stage hinted studies in a background thread, if prestage_studies is set."""
+        if not self.config.get("prestage_studies", False):
+            return None
+        thread = threading.Thread(target=self.prestage_loop, name="prestage", daemon=True)
+        thread.start()
+        return thread
+
+    def stage_variant(self, base_study_folder_path: str, variant: dict) -> str:
+        """Materialise the variant of a sweep as an overlay of the staged base study and return its folder."""
+        variant_study_folder_path = os.path.join(self.local_study_folder_path,
+                                                 f"{os.path.basename(base_study_folder_path)}--{variant['name']}")
+        return create_variant_study(base_study_folder_path, variant_study_folder_path, variant["ini_overrides"],
+                                    variant["files_path"] or None)
+
+    def tune_model_years(self, study_folder_path: str, years: YearSet) -> None:
         logging.info(f"Tuning model to only execute years: {years}")
         antares_study = AntaresStudy(study_folder_path)
         antares_study.set_playlist(years)
 
-    def run_antares(self, study_folder_path: str) -> None:
+    def run_antares(self, study_folder_path: str) -> dict:
+        """Run the solver and return the resource telemetry of the run."""
         antares_study = AntaresStudy(study_folder_path)
-        antares_study.run_antares(self.antares_path, self.max_cores_to_use)
+        return antares_study.run_antares(self.antares_path, self.max_cores_to_use)
 
-    def verify_run_correctness(self, study_folder_path: str) -> bool:
+    def verify_run_correctness(self, study_folder_path: str, years: YearSet) -> tuple[bool, list[int]]:
+        """Check the solver log and the output of every assigned year.
+        A run that did not end gracefully fails as a whole, none of its years can be trusted.
+        :return (whether the solver ended gracefully, years whose output is missing, incomplete or untrusted)
+        """
         antares_study = AntaresStudy(study_folder_path)
-        return antares_study.verify_if_last_run_was_successful()
+        if not antares_study.verify_if_last_run_was_successful():
+            logging.warning("The solver did not end gracefully, reporting all years of the workload as failed.")
+            return False, list(years)
+        output_folder_path = antares_study.get_last_output_folder()
+        year_validity = antares_study.validate_output_years(output_folder_path, years, self.max_cores_to_use)
+        failed_years = [year for year, valid in year_validity.items() if not valid]
+        return True, failed_years
+
+    @staticmethod
+    def get_mc_ind_path(output_folder_path: str) -> str:
+        """Folder of the individual year outputs of an output folder of a study, e.g. economy/mc-ind."""
+        study_folder_path = os.path.dirname(os.path.dirname(output_folder_path))  # <study>/output/<run>
+        return os.path.join(output_folder_path, read_study_metadata(study_folder_path).output_mode_folder, "mc-ind")
+
+    def describe_output_years(self, output_folder_path: str, years: list[int]) -> dict[int, dict]:
+        """Size, file count and, if checksum_output is set, checksum of the output of every year."""
+        checksum = self.config.get("checksum_output", True)
+        details = {}
+        for year in years:
+            year_folder_path = os.path.join(self.get_mc_ind_path(output_folder_path), str(year + 1).zfill(5))
+            details[year] = describe_folder(year_folder_path, checksum, self.max_cores_to_use)
+        return details
+
+    def ship_output(self, assignment: dict, output_folder_path: str, years: list[int]) -> tuple[str, list[int]]:
+        """Copy the output of the validated years off the worker, as configured by output_shipping.
+        :return (output path to report to the driver, years that were uploaded to the driver)
+        """
+        shipping = self.config.get("output_shipping") or ""
+        if not years or shipping not in {"driver", "store"}:
+            return output_folder_path, []
+        if shipping == "store":
+            reported_path = self.copy_output_to_results_store(assignment, output_folder_path, years)
+            shipped_years = []
+            all_shipped = reported_path != output_folder_path
+        else:
+            reported_path = output_folder_path
+            shipped_years = self.upload_output_to_driver(assignment, output_folder_path, years)
+            all_shipped = len(shipped_years) == len(years)
+        if all_shipped and self.config.get("delete_shipped_output", False):
+            logging.info(f"Deleting shipped output folder {output_folder_path}.")
+            shutil.rmtree(output_folder_path, ignore_errors=True)
+        return reported_path, shipped_years
+
+    def upload_output_to_driver(self, assignment: dict, output_folder_path: str, years: list[int]) -> list[int]:
+        """Upload the output of every year concurrently. Years that fail to upload stay linked from this worker.
+        :return the years that were uploaded
+        """
+        logging.info(f"Uploading output of {len(years)} year(s) to the driver.")
+        with ThreadPoolExecutor(self.config.get("upload_threads", 4)) as executor:
+            uploaded = list(executor.map(lambda year: self.upload_year_output(assignment, output_folder_path, year),
+                                         years))
+        return [year for year, ok in zip(years, uploaded) if ok]
+
+    def upload_year_output(self, assignment: dict, output_folder_path: str, year: int) -> bool:
+        year_string = str(year + 1).zfill(5)
+        year_folder_path = os.path.join(self.get_mc_ind_path(output_folder_path), year_string)
+        endpoint = f"task_output/{assignment['job_id']}/{assignment['id']}/{year}"
+        with tempfile.TemporaryDirectory(dir=self.local_zip_folder_path) as tmp:
+            zip_file_path = os.path.join(tmp, f"{year_string}.zip")
+            smart_zip_folder(year_folder_path, zip_file_path, user_7z_path=self.config["7_zip_file_path"],
+                             preferred_method=self.config.get("zip_method"),
+                             compression_profile=get_compression_profile(self.config.get("output_compression_profile")))
+            sha256 = hash_file(zip_file_path)
+            try:
+                with open(zip_file_path, "rb") as f:
+                    self.driver_client.request("PUT", endpoint, params={"sha256": sha256}, data=f)
+            except (DriverUnavailableError, requests.HTTPError) as e:
+                logging.error(f"Could not upload output of year {year_string}, the driver will link it instead: {e}")
+                return False
+        return True
+
+    def copy_output_to_results_store(self, assignment: dict, output_folder_path: str, years: list[int]) -> str:
+        """Copy the output of the years to <results store>/<job id>/<task id>, laid out like an output folder.
+        :return the output folder in the store, or the local one if the copy failed
+        """
+        store_output_path = os.path.join(os.path.abspath(self.config["results_store_folder_path"]),
+                                         assignment["job_id"], assignment["id"])
+        logging.info(f"Copying output of {len(years)} year(s) to the results store at {store_output_path}.")
+        mc_ind_path = self.get_mc_ind_path(output_folder_path)
+        store_mc_ind_path = os.path.join(store_output_path, os.path.relpath(mc_ind_path, output_folder_path))
+
+        def copy_year(year: int) -> None:
+            year_string = str(year + 1).zfill(5)
+            shutil.copytree(os.path.join(mc_ind_path, year_string), os.path.join(store_mc_ind_path, year_string),
+                            dirs_exist_ok=True)
+
+        try:
+            with ThreadPoolExecutor(self.config.get("upload_threads", 4)) as executor:
+                list(executor.map(copy_year, years))
+        except OSError as e:
+            logging.error(f"Could not copy output to the results store, the driver will link the local output: {e}")
+            return output_folder_path
+        return store_output_path
 
     def notify_task_done(self, task_id: str, job_id: str,
-                         workload: list[int], output_path: str, success: bool) -> None:
+                         workload: YearSet, output_path: str, success: bool,
+                         failed_years: list[int] = None, telemetry: dict = None,
+                         shipped_years: list[int] = None, year_details: dict[int, dict] = None,
+                         spans: list[dict] = None) -> None:
         logging.info("Informing driver of completed work.")
         payload = {'task_id': task_id,
                    'job_id': job_id,
-                   'workload': workload,
+                   'workload': str(workload),
                    'output_path': output_path,
-                    'success': success}
-        requests.post(f"{self.driver_uri}/finish_task", json=payload)
+                    'success': success,
+                   'failed_years': str(YearSet(failed_years or [])),
+                   'telemetry': telemetry,
+                   'shipped_years': str(YearSet(shipped_years or [])),
+                   'year_details': year_details or {},
+                   'spans': spans or []}
+        # store the report durably first, so it survives a driver outage or a worker crash
+        self.outbox.put(task_id, payload)
+        self.deliver_outbox()
+
+    def deliver_outbox(self) -> None:
+        """Replay undelivered task completion reports. The driver handles them idempotently by task id."""
+        for task_id, payload in self.outbox.items():
+            try:
+                self.driver_client.post("finish_task", json=payload)
+            except DriverUnavailableError as e:
+                logging.error(f"Could not deliver completion of task {task_id}, keeping it in the outbox: {e}")
+                return
+            except requests.HTTPError as e:
+                # rejected, e.g. a 422 for a malformed report, replaying it would fail the same way at every start
+                reason = f"{e}\n{e.response.text if e.response is not None else ''}"
+                logging.error(f"Driver rejected completion of task {task_id}, moving it to the dead letters: {reason}")
+                self.outbox.dead_letter(task_id, reason)
+                continue
+            self.outbox.remove(task_id)
+            logging.info(f"Delivered completion of task {task_id} to the driver.")
+
+    def work_once(self) -> bool:
+        """Deliver pending completion reports, then request a task and run it.
+        :return True if a task was run, False if no work was available
+        """
+        if len(self.outbox) > 0:
+            self.deliver_outbox()
+        self.tracer = Tracer(self.name)
+        with self.tracer.span("get_task"):
+            assignment = self.request_new_task()
+        logging.debug(f"Received assignment: {assignment}")
+        if assignment == {"message": "No work available at this time."}:
+            logging.debug(f"{datetime.now()}: No work available, waiting {self.wait_time_between_requests} seconds.")
+            return False
+
+        logging.info("Received work assignment from driver.")
+        workload = YearSet.from_string(assignment["workload"])
+        with self.tracer.span("stage_study", prestaged=assignment["study_name"] in self.prestaged):
+            study_folder_path = self.stage_study(assignment)
+        if assignment.get("variant"):
+            with self.tracer.span("stage_variant", variant=assignment["variant"]["name"]):
+                study_folder_path = self.stage_variant(study_folder_path, assignment["variant"])
+        with self.tracer.span("tune_model_years"):
+            self.tune_model_years(study_folder_path, workload)
+        try:
+            with self.tracer.span("run_antares", years=len(workload), cores=self.max_cores_to_use):
+                telemetry = self.run_antares(study_folder_path)
+        except subprocess.CalledProcessError as e:
+            # the solver crashed, report it so the driver retries the years instead of waiting for them forever
+            logging.error(f"The solver failed, reporting all years of the workload as failed: {e}")
+            self.notify_task_done(assignment["id"], assignment["job_id"], workload, "", False, list(workload),
+                                  spans=self.tracer.spans)
+            return True
+        with self.tracer.span("verify_run_correctness"):
+            success, failed_years = self.verify_run_correctness(study_folder_path, workload)
+
+        antares_study = AntaresStudy(study_folder_path)
+        last_output_folder = antares_study.get_last_output_folder()
+        succeeded_years = list(workload - failed_years)
+        with self.tracer.span("describe_output") as span:
+            year_details = self.describe_output_years(last_output_folder, succeeded_years)
+            span["bytes"] = sum(details["size_bytes"] for details in year_details.values())
+        with self.tracer.span("ship_output") as span:
+            output_path, shipped_years = self.ship_output(assignment, last_output_folder, succeeded_years)
+            copied_years = shipped_years if output_path == last_output_folder else succeeded_years
+            span["bytes"] = sum(year_details[year]["size_bytes"] for year in copied_years)
+        self.notify_task_done(assignment["id"],
+                              assignment["job_id"],
+                              workload,
+                              output_path,
+                              success,
+                              failed_years,
+                              telemetry,
+                              shipped_years,
+                              year_details,
+                              self.tracer.spans)
+        return True
 
     def work_loop(self):
         logging.info("Entering work loop.")
+        self.start_prestaging()
         while True:
             # set the next equidistant time point
             self.wait_until_time_for_next_request = datetime.now() + timedelta(seconds=self.wait_time_between_requests)
 
             # perform the loop workflow
-            assignment = self.request_new_task()
-            logging.debug(f"Received assignment: {assignment}")
-            if assignment == {"message": "No work available at this time."}:
-                logging.debug(f"{datetime.now()}: No work available, waiting {self.wait_time_between_requests} seconds.")
-            else:
-                logging.info("Received work assignment from driver.")
-                if not self.verify_if_model_is_local(assignment["zip_file_path"]):
-                    logging.info("Assignment study not found locally.")
-                    local_zip_file_path = self.copy_model_from_driver(assignment["zip_file_path"])
-                    study_folder_path = self.extract_local_model_to_study_folder(local_zip_file_path)
-                else:
-                    logging.info("Assignment study found locally.")
-                    study_folder_path = os.path.join(self.local_study_folder_path, assignment["study_name"])
-
-                self.tune_model_years(study_folder_path, assignment["workload"])
-                self.run_antares(study_folder_path)
-                success = self.verify_run_correctness(study_folder_path)
-
-                antares_study = AntaresStudy(study_folder_path)
-                last_output_folder = antares_study.get_last_output_folder()
-                self.notify_task_done(assignment["id"],
-                                      assignment["job_id"],
-                                      assignment["workload"],
-                                      last_output_folder,
-                                      success)
+            self.work_once()
 
             # wait here if we haven't reached the next time point yet
             if datetime.now() < self.wait_until_time_for_next_request:
@@ -134,7 +431,7 @@ class Worker:
                 time.sleep(wait_more)
 
 
-
 if __name__ == "__main__":
+    setup_root_logger("worker.log", read_config(WORKER_CONFIG_FILE_NAME))
     worker = Worker(config_file_name=WORKER_CONFIG_FILE_NAME, name="worker_bee")
     worker.work_loop()
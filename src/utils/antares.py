@@ -1,9 +1,15 @@
-import configparser
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
 import subprocess
+from typing import Iterable, Iterator
+from utils.compression import CompressionProfile
 from utils.ini import robust_read_ini, robust_write_ini
-from utils.smart_zip import smart_zip_folder
+from utils.scanner import scan_tree
+from utils.smart_zip import smart_zip_folder, stream_zip_folder
+from utils.study_metadata import StudyMetadata, invalidate_study_metadata, read_study_metadata
+from utils.telemetry import ResourceSampler
+from utils.year_set import YearSet
 from utils.time_utils import get_datetime_stamp
 
 class AntaresStudy:
@@ -12,29 +18,18 @@ class AntaresStudy:
         self.study_name = os.path.basename(self.study_path)
         self.output_dir = None
 
+    @property
+    def metadata(self) -> StudyMetadata:
+        """Parsed study.antares, generaldata.ini and area list, shared by all instances for the same study."""
+        return read_study_metadata(self.study_path)
+
     def get_antares_version(self) -> str:
         """Reads an antares file and returns the version string as parsed from INI format."""
-        ini_file_path = os.path.join(self.study_path, "study.antares")
-        config = configparser.ConfigParser()
-        config.read(ini_file_path)
-
-        if "antares" not in config:
-            raise ValueError("Section [antares] not found in file.")
-
-        if "version" not in config["antares"]:
-            raise ValueError("Version key not found in [antares] section.")
-
-        return config["antares"]["version"].strip()
+        return self.metadata.antares_version
 
     def get_size_on_disk(self) -> float:
         """Return size in megabytes"""
-        total_size = 0
-        for folder_path, folder_names, file_names in os.walk(self.study_path):
-            for f in file_names:
-                fp = os.path.join(folder_path, f)
-                if os.path.isfile(fp):
-                    total_size += os.path.getsize(fp)
-        return total_size / (1024 * 1024)
+        return scan_tree(self.study_path).total_size / (1024 * 1024)
 
     def is_output_empty(self) -> bool:
         """Check if the output folder is empty or contains only the folder 'maps'"""
@@ -50,62 +45,46 @@ class AntaresStudy:
             return True
         return False
 
-    def create_output_collection_folder(self) -> None:
-        """Create the output collection folder from a timestamp."""
-        output_folder_name = get_datetime_stamp("", "_", "")
+    def create_output_collection_folder(self, suffix: str = "") -> None:
+        """Create the output collection folder from a timestamp, and a suffix when several jobs share the study."""
+        output_folder_name = get_datetime_stamp("", "_", "") + (f"-{suffix}" if suffix else "")
         output_collection_path = os.path.join(self.study_path, "output", output_folder_name)
         os.makedirs(output_collection_path, exist_ok=True)
         self.output_dir = output_collection_path
 
-    def package_study(self, output_zip_folder_path: str, user_7z_path: str = None) -> str:
+    def get_package_name(self, suffix: str = None) -> str:
+        """Return a zip file name for this study, prefixed with a timestamp.
+        Studies with the same name packaged in the same second need a suffix to tell their zips apart."""
+        return get_datetime_stamp("", "_", "") + "-" + self.study_name + (f"-{suffix}" if suffix else "") + ".zip"
+
+    def package_study(self, output_zip_folder_path: str, user_7z_path: str = None, zip_method: str = None,
+                      compression_profile: CompressionProfile = CompressionProfile.STORE,
+                      link_bandwidth_mbps: float = None, package_name_suffix: str = None,
+                      max_workers: int = None) -> str:
         """Package the study into a zip file, excluding the output folder.
         :return The path to the created zip file.
         """
         logging.info(f"Packageing study {self.study_name} into zip file")
-        study_folder_name = os.path.basename(self.study_path)
-        zip_file_name = get_datetime_stamp("", "_", "") + "-" + study_folder_name + ".zip"
+        zip_file_name = self.get_package_name(package_name_suffix)
         output_zip_file_path = os.path.join(output_zip_folder_path, zip_file_name)
         output_zip_file_path = os.path.abspath(output_zip_file_path)
         exclude_folder_names = ["output"]
-        return smart_zip_folder(self.study_path, output_zip_file_path, exclude_folder_names, user_7z_path)
-
-    def get_active_playlist_years(self) -> list[int]:
-        """Establishes which monte carlo years need to be solved.
-        In antares settings file the mcYear 1 corresponds to index 0.
-        This method follows that convention.
-
-        If we have playlist_reset we start from nothing and add entries:
-          [playlist]
-          playlist_reset = false
-          playlist_year + = 0
-          playlist_year + = 99
-        else we subtract entries from a full list
-          [playlist]
-          playlist_year - = 0
-          playlist_year - = 1
-        """
+        return smart_zip_folder(self.study_path, output_zip_file_path, exclude_folder_names, user_7z_path, zip_method,
+                                compression_profile, link_bandwidth_mbps, max_workers)
+
+    def stream_study(self, compression_profile: CompressionProfile = CompressionProfile.STORE,
+                     link_bandwidth_mbps: float = None) -> Iterator[bytes]:
+        """Package the study on the fly, excluding the output folder, and yield the zip as chunks of bytes."""
+        logging.info(f"Streaming study {self.study_name} as zip")
+        return stream_zip_folder(self.study_path, ["output"], compression_profile=compression_profile,
+                                 link_bandwidth_mbps=link_bandwidth_mbps)
+
+    def get_active_playlist_years(self) -> YearSet:
+        """Establishes which monte carlo years need to be solved, 0-based, see utils.study_metadata."""
         logging.info(f"Fetching active playlist years for study {self.study_name}")
-        ini_file_path = os.path.join(self.study_path, "settings", "generaldata.ini")
-        config = robust_read_ini(ini_file_path)
-        if "general" not in config:
-            raise ValueError("Section [general] not found in settings file.")
-        if "nbyears" not in config["general"]:
-            raise ValueError("nbyears key not found in [general] section.")
-
-        max_value = int(config["general"]["nbyears"].strip())
-        playlist = [i for i in range(max_value)]
-
-        if "playlist" in config:
-            if "playlist_reset" in config["playlist"]:
-                playlist = [int(i.strip()) for i in config["playlist"]["playlist_year +"]]
-            else:
-                for inactive_year in config["playlist"]["playlist_year -"]:
-                    year = int(inactive_year.strip())
-                    if year in playlist:
-                        playlist.remove(year)
-        return playlist
-
-    def set_playlist(self, years: list[int]) -> None:
+        return self.metadata.playlist
+
+    def set_playlist(self, years: Iterable[int]) -> None:
         """Read the generaldata ini, wipe the playlist section, write a new one with only the specified years."""
         logging.info("Setting playlist years using AntaresStudy object to: " + str(years))
 
@@ -121,9 +100,12 @@ class AntaresStudy:
 
         # write back to disk
         robust_write_ini(ini_file_path, new_config)
+        invalidate_study_metadata(self.study_path)
 
-    def run_antares(self, antares_path: str, max_cores_to_use: int) -> None:
-        """Run the antares simulation using the provided antares executable path and core count."""
+    def run_antares(self, antares_path: str, max_cores_to_use: int) -> dict:
+        """Run the antares simulation using the provided antares executable path and core count.
+        :return Resource telemetry of the solver process tree, see utils.telemetry.
+        """
         logging.info(f"Running Antares simulation with {max_cores_to_use} core(s).")
         cmd = [
             f'"{antares_path}"',
@@ -134,8 +116,18 @@ class AntaresStudy:
         # Join command for Windows cmd, handle spaces
         cmd_str = ' '.join(cmd)
         logging.debug(f"Antares run command: {cmd_str}")
-        # run and suppress output
-        subprocess.run(cmd_str, shell=True, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+        # run and suppress output, while sampling the resources used by the solver process tree
+        process = subprocess.Popen(cmd_str, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+        sampler = ResourceSampler(process.pid, max_cores_to_use, os.path.join(self.study_path, "output"),
+                                  output_mode_folder=self.metadata.output_mode_folder)
+        sampler.start()
+        try:
+            return_code = process.wait()
+        finally:
+            telemetry = sampler.stop()
+        if return_code != 0:
+            raise subprocess.CalledProcessError(return_code, cmd_str)
+        return telemetry
 
     def get_last_output_folder(self) -> str:
         """Get the path to the most recent output folder."""
@@ -152,19 +144,42 @@ class AntaresStudy:
 
         # find last folder in this output folder
         most_recent_output_folder = self.get_last_output_folder()
+        if most_recent_output_folder is None:
+            return False
         log_file_path = os.path.join(most_recent_output_folder, "simulation.log")
 
         # check if the last 5 lines of the log contain "Quitting the solver gracefully"
         if not os.path.exists(log_file_path):
             return False
-        with open(log_file_path, "r") as log_file:
-            lines = log_file.readlines()
-            last_lines = lines[-5:] if len(lines) >= 5 else lines
-            for line in last_lines:
-                if "Quitting the solver gracefully" in line:
-                    return True
+        for line in read_last_lines(log_file_path, 5):
+            if "Quitting the solver gracefully" in line:
+                return True
         return False
 
+    def get_area_ids(self) -> list[str]:
+        """Return the area ids of the study, as antares uses them for output folder names."""
+        return list(self.metadata.area_ids)
+
+    def validate_output_years(self, output_folder_path: str, years: list[int], max_workers: int = 8) -> dict[int, bool]:
+        """Check per year whether economy/mc-ind/NNNNN in the output folder is complete.
+        A year is complete when its folder exists, contains a non-empty folder for every area
+        and has no empty files. The years are checked concurrently in a thread pool.
+        :return Mapping of 0-based year to validity.
+        """
+        logging.info(f"Validating output of {len(years)} year(s) in {output_folder_path}.")
+        if output_folder_path is None:
+            return {year: False for year in years}
+        metadata = self.metadata
+        mc_ind_path = os.path.join(output_folder_path, metadata.output_mode_folder, "mc-ind")
+        area_ids = list(metadata.area_ids)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(lambda year: is_output_year_complete(mc_ind_path, year, area_ids), years)
+            year_validity = dict(zip(years, results))
+        invalid_years = [year for year, valid in year_validity.items() if not valid]
+        if invalid_years:
+            logging.warning(f"Output of year(s) {invalid_years} is missing or incomplete.")
+        return year_validity
+
     # static method to check if a study is a valid Antares study
     @staticmethod
     def is_valid_study(study_path):
@@ -182,6 +197,34 @@ class AntaresStudy:
         return True
 
 
+def read_last_lines(file_path: str, n_lines: int, block_size: int = 4096) -> list[str]:
+    """Return the last n_lines of a text file by seeking backwards from the end instead of reading it all."""
+    with open(file_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        while position > 0 and data.count(b"\n") <= n_lines:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    return lines[-n_lines:]
+
+
+def is_output_year_complete(mc_ind_path: str, year: int, area_ids: list[str]) -> bool:
+    """Verify one economy/mc-ind/NNNNN folder: it exists, holds every area and no empty files."""
+    year_path = os.path.join(mc_ind_path, str(year + 1).zfill(5))  # antares folders are 1-based
+    if not os.path.isdir(year_path):
+        return False
+    for area_id in area_ids:
+        if not os.path.isdir(os.path.join(year_path, "areas", area_id)):
+            return False
+    # years are already validated concurrently, so scan each one with a single thread
+    tree = scan_tree(year_path, max_workers=1)
+    return len(tree.files) > 0 and all(entry.size > 0 for entry in tree.files)
+
+
 if __name__ == "__main__":
     study_path = r"C:\links\LENOVO_C\dev\python\antares_winjobs\data\worker\study\20250923_222610-ant8.8"
     antares_study = AntaresStudy(study_path)
@@ -0,0 +1,107 @@
+"""
+Read and write Antares output tables (e.g. economy/mc-ind/00001/areas/de/values-hourly.txt).
+
+An output table is a tab separated text file with a 7 line header:
+    0  element, kind ("area"/"link"), "va"/"id"/"details", time step
+    1  "VARIABLES BEGIN END"
+    2  variable count, first and last time step
+    3  empty
+    4  element, time step, ..., variable names
+    5  units
+    6  time column labels (index, day, month, hour, ...) followed by the statistic of each variable column
+and then one row per time step: time columns followed by the numeric values.
+"""
+from dataclasses import dataclass
+import math
+import os
+
+import numpy as np
+
+HEADER_LINE_COUNT = 7
+TIME_LABELS = {"index", "day", "month", "hour", "week", "year"}
+
+
+@dataclass
+class OutputTable:
+    header: list[list[str]]  # the 7 header lines, split on tabs
+    time_columns: list[list[str]]  # leading time columns of every data row
+    value_column_indices: list[int]  # positions of the value columns in a row
+    values: np.ndarray  # float64, rows x value columns, NaN for N/A
+
+    @property
+    def variable_names(self) -> list[str]:
+        return [self.header[4][i] for i in self.value_column_indices]
+
+    @property
+    def units(self) -> list[str]:
+        units_line = self.header[5]
+        return [units_line[i] if i < len(units_line) else "" for i in self.value_column_indices]
+
+
+def parse_value(token: str) -> float:
+    try:
+        return float(token)
+    except ValueError:
+        return math.nan
+
+
+def read_output_table(file_path: str) -> OutputTable:
+    """Parse an Antares output table into its header, time columns and a NumPy array of values."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    if len(lines) < HEADER_LINE_COUNT:
+        raise ValueError(f"{file_path} is not an Antares output table: header is incomplete.")
+    header = [line.split("\t") for line in lines[:HEADER_LINE_COUNT]]
+
+    time_positions = [i for i, label in enumerate(header[6]) if label.strip().lower() in TIME_LABELS]
+    first_value_column = (max(time_positions) + 1) if time_positions else 1
+    value_column_indices = [i for i, name in enumerate(header[4]) if i >= first_value_column and name.strip()]
+
+    rows = [line.split("\t") for line in lines[HEADER_LINE_COUNT:] if line.strip()]
+    time_columns = [row[:first_value_column] for row in rows]
+    values = np.array([[parse_value(row[i]) if i < len(row) else math.nan for i in value_column_indices]
+                       for row in rows], dtype=np.float64).reshape(len(rows), len(value_column_indices))
+    return OutputTable(header, time_columns, value_column_indices, values)
+
+
+def format_value(value: float) -> str:
+    if not math.isfinite(value):
+        # N/A in the inputs, or min/max of a column that was N/A in every year
+        return "N/A"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return f"{value:.2f}"
+
+
+def write_statistics_table(file_path: str, template: OutputTable, statistics: dict[str, np.ndarray]) -> None:
+    """Write an mc-all style table: for every variable one column per statistic (e.g. EXP, std, min, max).
+
+    Args:
+        file_path: table to write, parent folders are created
+        template: a parsed table of the same kind, only its header and time columns are used
+        statistics: statistic label -> array of rows x variables, like OutputTable.values
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    time_column_count = len(template.time_columns[0]) if template.time_columns else len(template.header[6])
+    labels = list(statistics)
+    variable_names = template.variable_names
+    units = template.units
+
+    def time_part(line: list[str]) -> list[str]:
+        return (line + [""] * time_column_count)[:time_column_count]
+
+    header = [list(line) for line in template.header[:4]]
+    if len(header[2]) > 1:
+        header[2][1] = str(len(variable_names) * len(labels))
+    names_line = time_part(template.header[4]) + [name for name in variable_names for _ in labels]
+    units_line = time_part(template.header[5]) + [unit for unit in units for _ in labels]
+    labels_line = time_part(template.header[6]) + [label for _ in variable_names for label in labels]
+
+    # interleave the statistics per variable: var1 EXP, var1 std, ..., var2 EXP, ...
+    stacked = np.stack([statistics[label] for label in labels], axis=2)
+    stacked = stacked.reshape(stacked.shape[0], -1)
+    with open(file_path, "w", encoding="utf-8") as f:
+        for line in header + [names_line, units_line, labels_line]:
+            f.write("\t".join(line) + "\n")
+        for time_columns, row in zip(template.time_columns, stacked):
+            f.write("\t".join(time_columns + [format_value(value) for value in row]) + "\n")
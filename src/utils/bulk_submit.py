@@ -0,0 +1,198 @@
+"""
+Submit many Antares studies in one go, e.g. the scenario studies of a nightly run.
+Studies are packaged in a process pool and every zip is uploaded as soon as it is ready, by a bounded
+thread pool, so packaging and uploading of different studies overlap and the batch takes about as long
+as its slowest study instead of the sum of all of them.
+"""
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+import glob
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import requests
+import yaml
+
+from utils.antares import AntaresStudy
+from utils.compression import CompressionProfile
+
+
+@dataclass
+class StudySubmission:
+    study_path: str
+    priority: int
+    status: str = "pending"  # pending, packaged, submitted or failed
+    zip_file_path: Optional[str] = None
+    job_id: Optional[str] = None
+    bytes_sent: int = 0
+    error: Optional[str] = None
+    seconds: dict[str, float] = field(default_factory=dict)  # duration per stage: validate, package, upload
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def resolve_studies(paths: list[str], manifest_file_path: Optional[str], default_priority: int) -> list[StudySubmission]:
+    """List the studies to submit from paths or glob patterns, and from a manifest file.
+
+    The manifest is a YAML list whose entries are either a path (or glob pattern) or a mapping
+    with keys 'path' and optionally 'priority', e.g.:
+      - path: D:/studies/scenario_a
+        priority: 10
+      - D:/studies/nightly/*
+    A study listed twice is submitted once, with the priority of its first occurrence.
+    """
+    entries = [(path, default_priority) for path in paths]
+    if manifest_file_path:
+        with open(manifest_file_path, "r", encoding="utf-8") as f:
+            manifest = yaml.safe_load(f) or []
+        for entry in manifest:
+            if isinstance(entry, dict):
+                entries.append((entry["path"], int(entry.get("priority", default_priority))))
+            else:
+                entries.append((str(entry), default_priority))
+
+    submissions, seen = [], set()
+    for pattern, priority in entries:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for study_path in matches:
+            study_path = os.path.abspath(study_path)
+            if study_path in seen or (glob.has_magic(pattern) and not os.path.isdir(study_path)):
+                continue
+            seen.add(study_path)
+            submissions.append(StudySubmission(study_path, priority))
+    return submissions
+
+
+def package_study(study_path: str, output_zip_folder_path: str, user_7z_path: Optional[str], zip_method: Optional[str],
+                  compression_profile: CompressionProfile, link_bandwidth_mbps: Optional[float], index: int,
+                  zip_threads: int) -> str:
+    """Package one study into a zip, runs in a worker process of the packaging pool.
+    The zip name ends with the index of the study in the batch, so studies of the same name get zips of their own.
+    """
+    return AntaresStudy(study_path).package_study(output_zip_folder_path, user_7z_path, zip_method,
+                                                  compression_profile, link_bandwidth_mbps, str(index), zip_threads)
+
+
+def get_zip_threads(package_processes: int) -> int:
+    """Threads per packaging process, so the processes together use as many as a single zip would by default."""
+    return max(1, min(32, (os.cpu_count() or 1) * 4) // package_processes)
+
+
+def upload_zip(session: requests.Session, driver_uri: str, zip_file_path: str, priority: int, username: str) -> dict:
+    with open(zip_file_path, "rb") as zip_file:
+        files = {"zip_file": (os.path.basename(zip_file_path), zip_file, "application/zip")}
+        data = {"priority": priority, "submitter": username}
+        response = session.post(driver_uri + "/submit_job", files=files, data=data)
+    response.raise_for_status()
+    return response.json()
+
+
+class BulkProgress:
+    """Counts studies per stage and logs one aggregate line whenever a study moves on."""
+    def __init__(self, submissions: list[StudySubmission]):
+        self.submissions = submissions
+        self.started_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def update(self, submission: StudySubmission, status: str, error: Optional[str] = None) -> None:
+        with self.lock:
+            submission.status = status
+            submission.error = error
+            if error:
+                logging.error(f"{submission.study_path}: {error}")
+            counts = {s: sum(1 for sub in self.submissions if sub.status == s)
+                      for s in ("packaged", "submitted", "failed")}
+            sent_mb = sum(sub.bytes_sent for sub in self.submissions) / (1024 * 1024)
+            logging.info(f"Bulk submit [{time.monotonic() - self.started_at:.0f}s]: "
+                         f"{counts['packaged'] + counts['submitted']}/{len(self.submissions)} packaged, "
+                         f"{counts['submitted']}/{len(self.submissions)} submitted, {counts['failed']} failed, "
+                         f"{sent_mb:.1f} MB sent")
+
+
+def validate_study(submission: StudySubmission) -> Optional[str]:
+    """:return an error message, or None if the study can be submitted."""
+    if not os.path.exists(submission.study_path):
+        return "Study path does not exist."
+    if not AntaresStudy.is_valid_study(submission.study_path):
+        return "Not a valid Antares study."
+    AntaresStudy(submission.study_path).get_antares_version()
+    return None
+
+
+def submit_bulk(submissions: list[StudySubmission], driver_uri: str, username: str, output_zip_folder_path: str,
+                user_7z_path: Optional[str] = None, zip_method: Optional[str] = None,
+                compression_profile: CompressionProfile = CompressionProfile.STORE,
+                link_bandwidth_mbps: Optional[float] = None,
+                package_processes: Optional[int] = None, upload_threads: int = 4) -> dict:
+    """Validate, package and upload all studies, and return a summary of the batch.
+
+    Args:
+        package_processes: size of the packaging process pool, defaults to the number of CPUs
+        upload_threads: maximum number of uploads in flight
+    """
+    started_at = time.monotonic()
+    progress = BulkProgress(submissions)
+    for submission in submissions:
+        stage_start = time.monotonic()
+        try:
+            error = validate_study(submission)
+        except (OSError, ValueError, KeyError) as e:
+            error = f"Invalid study: {e}"
+        submission.seconds["validate"] = round(time.monotonic() - stage_start, 3)
+        if error:
+            progress.update(submission, "failed", error)
+    to_package = [submission for submission in submissions if submission.status == "pending"]
+    os.makedirs(output_zip_folder_path, exist_ok=True)
+
+    def upload(submission: StudySubmission) -> None:
+        stage_start = time.monotonic()
+        try:
+            response = upload_zip(session, driver_uri, submission.zip_file_path, submission.priority, username)
+        except (OSError, requests.RequestException) as e:
+            submission.seconds["upload"] = round(time.monotonic() - stage_start, 3)
+            progress.update(submission, "failed", f"Upload failed: {e}")
+            return
+        submission.seconds["upload"] = round(time.monotonic() - stage_start, 3)
+        submission.bytes_sent = os.path.getsize(submission.zip_file_path)
+        submission.job_id = response.get("job_id")
+        if submission.job_id is None:
+            progress.update(submission, "failed", f"Driver refused the job: {response.get('error', response)}")
+        else:
+            progress.update(submission, "submitted")
+
+    package_processes = package_processes or os.cpu_count() or 1
+    zip_threads = get_zip_threads(package_processes)
+    with (ProcessPoolExecutor(package_processes) as package_pool,
+          ThreadPoolExecutor(upload_threads) as upload_pool,
+          requests.Session() as session):
+        package_futures: dict[Future, tuple[StudySubmission, float]] = {}
+        for index, submission in enumerate(to_package):
+            future = package_pool.submit(package_study, submission.study_path, output_zip_folder_path, user_7z_path,
+                                         zip_method, compression_profile, link_bandwidth_mbps, index, zip_threads)
+            package_futures[future] = (submission, time.monotonic())
+        upload_futures = []
+        for future in as_completed(package_futures):
+            submission, stage_start = package_futures[future]
+            # measured from submission to the pool, so includes time spent waiting for a free process
+            submission.seconds["package"] = round(time.monotonic() - stage_start, 3)
+            try:
+                submission.zip_file_path = future.result()
+            except Exception as e:
+                progress.update(submission, "failed", f"Packaging failed: {e}")
+                continue
+            progress.update(submission, "packaged")
+            upload_futures.append(upload_pool.submit(upload, submission))
+        for future in upload_futures:
+            future.result()
+
+    return {
+        "submitted": sum(1 for submission in submissions if submission.status == "submitted"),
+        "failed": sum(1 for submission in submissions if submission.status == "failed"),
+        "bytes_sent": sum(submission.bytes_sent for submission in submissions),
+        "total_seconds": round(time.monotonic() - started_at, 3),
+        "studies": [submission.to_dict() for submission in submissions],
+    }
@@ -0,0 +1,167 @@
+"""
+Columnar export of Antares mc-ind results to a Parquet dataset (requires the optional pyarrow dependency).
+
+Layout of a dataset:
+    index.json                          years, files, elements and variables present in the dataset
+    year=00001/areas-hourly.parquet     one file per MC year and table kind (areas/links) and frequency
+    year=00001/links-daily.parquet
+    ...
+Every file is in long format (mc_year, element, variable, unit, time_index, value) and holds one row group per
+variable, so reading a few variables only touches their row groups.
+MC years are numbered as in the output folder names, starting at 1.
+"""
+import json
+import os
+import re
+import uuid
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.antares_output import read_output_table
+from utils.scanner import scan_tree
+
+INDEX_FILE_NAME = "index.json"
+TABLE_FILE_PATTERN = re.compile(r"^(areas|links)/([^/]+)/values-(\w+)\.txt$")
+
+RESULT_SCHEMA = pa.schema([
+    ("mc_year", pa.int32()),
+    ("element", pa.dictionary(pa.int32(), pa.string())),
+    ("variable", pa.dictionary(pa.int32(), pa.string())),
+    ("unit", pa.dictionary(pa.int32(), pa.string())),
+    ("time_index", pa.int32()),
+    ("value", pa.float64()),
+])
+
+
+def get_year_partition(mc_year: int) -> str:
+    return f"year={str(mc_year).zfill(5)}"
+
+
+def get_time_index(time_columns: list[list[str]]) -> np.ndarray:
+    """The "index" column of the rows (second time column), or the row number if it is not numeric."""
+    try:
+        return np.array([int(columns[1]) for columns in time_columns], dtype=np.int32)
+    except (IndexError, ValueError):
+        return np.arange(1, len(time_columns) + 1, dtype=np.int32)
+
+
+def collect_year_columns(year_folder_path: str) -> dict[str, dict[str, list[tuple]]]:
+    """Parse the area and link tables of one year folder.
+    :return {"<kind>-<frequency>": {variable: [(element, unit, time_index, values), ...]}}
+    """
+    collected = {}
+    for entry in scan_tree(year_folder_path).files:
+        match = TABLE_FILE_PATTERN.match(entry.path)
+        if match is None:
+            continue
+        kind, element, frequency = match.groups()
+        table = read_output_table(os.path.join(year_folder_path, *entry.path.split("/")))
+        time_index = get_time_index(table.time_columns)
+        variables = collected.setdefault(f"{kind}-{frequency}", {})
+        for column, (variable, unit) in enumerate(zip(table.variable_names, table.units)):
+            variables.setdefault(variable, []).append((element, unit, time_index, table.values[:, column]))
+    return collected
+
+
+def build_variable_table(mc_year: int, variable: str, parts: list[tuple]) -> pa.Table:
+    row_count = sum(len(values) for _, _, _, values in parts)
+    elements = [element for element, _, _, values in parts for _ in range(len(values))]
+    units = [unit for _, unit, _, values in parts for _ in range(len(values))]
+    return pa.table([
+        pa.array(np.full(row_count, mc_year, dtype=np.int32)),
+        pa.array(elements).dictionary_encode(),
+        pa.array([variable] * row_count).dictionary_encode(),
+        pa.array(units).dictionary_encode(),
+        pa.array(np.concatenate([time_index for _, _, time_index, _ in parts])),
+        pa.array(np.concatenate([values for _, _, _, values in parts]), from_pandas=True),
+    ], schema=RESULT_SCHEMA)
+
+
+def export_year(year_folder_path: str, mc_year: int, dataset_folder_path: str, compression: str = "zstd") -> dict:
+    """Convert the area and link tables of one MC year folder into Parquet files and register them in the index.
+
+    Args:
+        year_folder_path: e.g. output/<run>/economy/mc-ind/00001
+        mc_year: MC year number of the folder, starting at 1
+        dataset_folder_path: root of the dataset, created if needed
+        compression: Parquet compression codec
+    :return the index entry of the year: {"<kind>-<frequency>": relative file path}
+    """
+    collected = collect_year_columns(year_folder_path)
+    partition_folder_path = os.path.join(dataset_folder_path, get_year_partition(mc_year))
+    os.makedirs(partition_folder_path, exist_ok=True)
+    files = {}
+    catalog = {}
+    for table_name, variables in sorted(collected.items()):
+        rel_path = f"{get_year_partition(mc_year)}/{table_name}.parquet"
+        file_path = os.path.join(dataset_folder_path, *rel_path.split("/"))
+        temporary_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        with pq.ParquetWriter(temporary_path, RESULT_SCHEMA, compression=compression) as writer:
+            for variable in sorted(variables):
+                # one row group per variable: its min/max statistics let readers skip the other variables
+                writer.write_table(build_variable_table(mc_year, variable, variables[variable]))
+        os.replace(temporary_path, file_path)
+        files[table_name] = rel_path
+        catalog[table_name] = {
+            "elements": sorted({part[0] for parts in variables.values() for part in parts}),
+            "variables": sorted(variables),
+        }
+    update_index(dataset_folder_path, mc_year, files, catalog)
+    return files
+
+
+def load_index(dataset_folder_path: str) -> dict:
+    index_path = os.path.join(dataset_folder_path, INDEX_FILE_NAME)
+    if not os.path.exists(index_path):
+        return {"years": {}, "tables": {}}
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def update_index(dataset_folder_path: str, mc_year: int, files: dict, catalog: dict) -> None:
+    index = load_index(dataset_folder_path)
+    index["years"][str(mc_year)] = files
+    for table_name, content in catalog.items():
+        known = index["tables"].setdefault(table_name, {"elements": [], "variables": []})
+        for key in ("elements", "variables"):
+            known[key] = sorted(set(known[key]) | set(content[key]))
+    index_path = os.path.join(dataset_folder_path, INDEX_FILE_NAME)
+    temporary_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1)
+    os.replace(temporary_path, index_path)
+
+
+def get_exported_years(dataset_folder_path: str) -> set[int]:
+    """MC years (starting at 1) present in the dataset."""
+    return {int(mc_year) for mc_year in load_index(dataset_folder_path)["years"]}
+
+
+def read_results(dataset_folder_path: str, table_name: str = "areas-hourly", variables: list[str] = None,
+                 years: list[int] = None, elements: list[str] = None) -> pa.Table:
+    """Read selected results from a dataset. Only the files of the requested years are opened and,
+    within them, only the row groups of the requested variables are read.
+
+    Args:
+        dataset_folder_path: root of the dataset
+        table_name: "<areas|links>-<hourly|daily|weekly|monthly|annual>"
+        variables: variable names, e.g. ["OV. COST", "LOAD"], all if None
+        years: MC years starting at 1, all if None
+        elements: area ids or link names (e.g. "de - fr"), all if None
+    """
+    index = load_index(dataset_folder_path)
+    selected_years = index["years"] if years is None else [str(mc_year) for mc_year in years]
+    file_paths = [os.path.join(dataset_folder_path, *index["years"][mc_year][table_name].split("/"))
+                  for mc_year in selected_years
+                  if mc_year in index["years"] and table_name in index["years"][mc_year]]
+    if not file_paths:
+        return RESULT_SCHEMA.empty_table()
+
+    filters = []
+    if variables is not None:
+        filters.append(("variable", "in", list(variables)))
+    if elements is not None:
+        filters.append(("element", "in", list(elements)))
+    return pq.read_table(file_paths, schema=RESULT_SCHEMA, filters=filters or None)
@@ -0,0 +1,112 @@
+"""
+Compression profiles for packaging studies.
+A profile decides per file how it is stored in the zip: already compressed or tiny files are stored,
+everything else (mostly Antares text time series) is deflated at the level of the profile.
+The "auto" profile measures compression throughput on a sample of the study and picks the profile
+that gets the data across the configured link the fastest.
+"""
+from enum import Enum
+import logging
+import os
+import time
+import zlib
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+
+
+class CompressionProfile(Enum):
+    STORE = "store"
+    FAST = "fast"
+    BALANCED = "balanced"
+    AUTO = "auto"
+
+
+# profile -> (zipfile compress type, zipfile compress level, 7z compression switch)
+PROFILE_SETTINGS = {
+    CompressionProfile.STORE: (ZIP_STORED, None, "-mx=0"),
+    CompressionProfile.FAST: (ZIP_DEFLATED, 1, "-mx=1"),
+    CompressionProfile.BALANCED: (ZIP_DEFLATED, 6, "-mx=5"),
+}
+
+INCOMPRESSIBLE_EXTENSIONS = {".zip", ".7z", ".gz", ".bz2", ".xz", ".zst", ".rar",
+                             ".png", ".jpg", ".jpeg", ".gif", ".pdf", ".xlsx", ".docx", ".parquet"}
+MIN_COMPRESSIBLE_SIZE = 512  # bytes, below this the deflate overhead is not worth it
+AUTO_SAMPLE_SIZE = 16 * 1024 * 1024  # bytes of study files used to measure compression throughput
+DEFAULT_LINK_BANDWIDTH_MBPS = 100
+
+
+def get_compression_profile(name: str) -> CompressionProfile:
+    """Parse a profile name from a config file, an empty value means store only."""
+    if not name:
+        return CompressionProfile.STORE
+    try:
+        return CompressionProfile(name.strip().lower())
+    except ValueError:
+        raise ValueError(f"Unknown compression profile '{name}'. "
+                         f"Use one of {[profile.value for profile in CompressionProfile]}.")
+
+
+def choose_compression(file_name: str, file_size: int, profile: CompressionProfile) -> tuple[int, int]:
+    """Return the (compress type, compress level) to store one file with."""
+    compress_type, compress_level, _ = PROFILE_SETTINGS[profile]
+    if compress_type == ZIP_STORED:
+        return ZIP_STORED, None
+    if file_size < MIN_COMPRESSIBLE_SIZE or os.path.splitext(file_name)[1].lower() in INCOMPRESSIBLE_EXTENSIONS:
+        return ZIP_STORED, None
+    return compress_type, compress_level
+
+
+def get_7z_switch(profile: CompressionProfile) -> str:
+    """7z compresses the whole archive at one level, it stores incompressible data efficiently by itself."""
+    return PROFILE_SETTINGS[profile][2]
+
+
+def resolve_profile(profile: CompressionProfile,
+                    file_paths: list[str],
+                    link_bandwidth_mbps: float = DEFAULT_LINK_BANDWIDTH_MBPS) -> CompressionProfile:
+    """Turn the auto profile into a concrete one, other profiles are returned as is.
+
+    For every concrete profile we measure compression throughput and ratio on a sample of the files, and estimate
+    the time to compress and transfer the data over a link of link_bandwidth_mbps megabit per second.
+    """
+    if profile != CompressionProfile.AUTO:
+        return profile
+
+    sample = read_sample(file_paths, AUTO_SAMPLE_SIZE)
+    if not sample:
+        return CompressionProfile.STORE
+    link_bytes_per_second = link_bandwidth_mbps * 1_000_000 / 8
+
+    estimates = {}
+    for candidate in (CompressionProfile.STORE, CompressionProfile.FAST, CompressionProfile.BALANCED):
+        compress_type, compress_level, _ = PROFILE_SETTINGS[candidate]
+        start = time.perf_counter()
+        if compress_type == ZIP_STORED:
+            compressed_size = sum(len(data) for data in sample)
+        else:
+            compressed_size = sum(len(zlib.compress(data, compress_level)) for data in sample)
+        compress_time = time.perf_counter() - start
+        estimates[candidate] = compress_time + compressed_size / link_bytes_per_second
+
+    best = min(estimates, key=estimates.get)
+    logging.info(f"Auto compression picked profile '{best.value}' for a {link_bandwidth_mbps} Mbps link, "
+                 f"estimates per {sum(len(data) for data in sample) / 1024**2:.1f} MB sample: "
+                 + ", ".join(f"{p.value} {t:.2f}s" for p, t in estimates.items()))
+    return best
+
+
+def read_sample(file_paths: list[str], sample_size: int) -> list[bytes]:
+    """Read compressible files, spread over the whole list, until sample_size bytes are collected."""
+    candidates = [path for path in file_paths if os.path.splitext(path)[1].lower() not in INCOMPRESSIBLE_EXTENSIONS]
+    if not candidates:
+        return []
+    step = max(1, len(candidates) // 1000)
+    sample = []
+    collected = 0
+    for path in candidates[::step]:
+        with open(path, "rb") as f:
+            data = f.read(sample_size - collected)
+        sample.append(data)
+        collected += len(data)
+        if collected >= sample_size:
+            break
+    return sample
@@ -0,0 +1,57 @@
+"""
+Client side of the driver's /events server-sent event stream.
+"""
+import json
+import logging
+import time
+from typing import Iterable, Iterator, Optional
+
+import requests
+
+RECONNECT_DELAY_SECONDS = 2
+
+
+def iter_sse_events(lines: Iterable[str]) -> Iterator[dict]:
+    """Parse server-sent event lines into the JSON objects of their data fields. Comments are skipped."""
+    data = []
+    for line in lines:
+        if not line:
+            if data:
+                yield json.loads("\n".join(data))
+                data = []
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+
+
+def follow_events(driver_uri: str, job_id: Optional[str] = None, submitter: Optional[str] = None) -> Iterator[dict]:
+    """Yield the events of the driver, reconnecting after connection errors without missing events."""
+    params = {"job_id": job_id, "submitter": submitter}
+    last_event_id = None
+    while True:
+        headers = {"Last-Event-ID": str(last_event_id)} if last_event_id is not None else {}
+        try:
+            with requests.get(driver_uri + "/events", params=params, headers=headers, stream=True,
+                              timeout=(5, None)) as response:
+                response.raise_for_status()
+                for event in iter_sse_events(response.iter_lines(decode_unicode=True)):
+                    last_event_id = event.get("id", last_event_id)
+                    yield event
+        except requests.RequestException as e:
+            logging.warning(f"Event stream interrupted ({e}), reconnecting in {RECONNECT_DELAY_SECONDS}s.")
+        time.sleep(RECONNECT_DELAY_SECONDS)
+
+
+class ProgressTracker:
+    """Progress and throughput of jobs, from the years done in successive events."""
+    def __init__(self):
+        self.first_seen: dict[str, tuple[float, int]] = {}  # job id -> (monotonic time, years done)
+
+    def describe(self, event: dict) -> str:
+        now = time.monotonic()
+        start_time, start_done = self.first_seen.setdefault(event["job_id"], (now, event["years_done"]))
+        minutes = (now - start_time) / 60
+        throughput = f", {(event['years_done'] - start_done) / minutes:.1f} years/min" if minutes > 0 else ""
+        given_up = f", {event['years_given_up']} given up" if event["years_given_up"] else ""
+        return (f"{event['study_name']} [{event['type']}]: {event['percentage_complete']}% "
+                f"({event['years_done']}/{event['years_total']} years done{given_up}, "
+                f"{event['years_running']} running in {event['running_tasks']} tasks{throughput})")
@@ -0,0 +1,129 @@
+"""
+HTTP client used to talk to the driver.
+It keeps one pooled keep-alive session, applies timeouts and retries failed calls
+with exponential backoff and jitter. Messages that must not get lost (e.g. task
+completion reports) can be stored in a durable outbox on disk and replayed later.
+Calls that are not idempotent, like requesting a task, carry a request id so the driver answers a retry the same.
+"""
+import json
+import logging
+import os
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS_CODES = {500, 502, 503, 504}
+
+
+class DriverUnavailableError(Exception):
+    """Raised when the driver could not be reached after all retries."""
+
+
+class DriverClient:
+    def __init__(self, driver_uri: str,
+                 timeout: float = 30,
+                 max_retries: int = 5,
+                 backoff_base: float = 1,
+                 backoff_max: float = 60,
+                 pool_size: int = 10):
+        """
+        Args:
+            driver_uri: base uri of the driver, e.g. http://127.0.0.1:8000/
+            timeout: seconds to wait for the driver to answer a single call
+            max_retries: number of retries after the first failed attempt
+            backoff_base: seconds to wait before the first retry, doubled for every next retry
+            backoff_max: upper bound for the wait between two retries
+            pool_size: number of keep-alive connections kept in the pool
+        """
+        self.driver_uri = driver_uri.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("GET", endpoint, **kwargs)
+
+    def post(self, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("POST", endpoint, **kwargs)
+
+    def request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        """Send a request to the driver, retrying on connection errors, timeouts and 5xx responses."""
+        url = f"{self.driver_uri}/{endpoint.lstrip('/')}"
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.max_retries + 1):
+            if hasattr(kwargs.get("data"), "seek"):
+                kwargs["data"].seek(0)  # resend a file body from its start on every attempt
+            try:
+                response = self.session.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                reason = type(e).__name__
+            if attempt == self.max_retries:
+                break
+            wait = self.get_backoff_time(attempt)
+            logging.warning(f"{method} {url} failed ({reason}), retry {attempt + 1}/{self.max_retries} in {wait:.1f}s.")
+            time.sleep(wait)
+        raise DriverUnavailableError(f"{method} {url} failed after {self.max_retries + 1} attempts ({reason}).")
+
+    def get_backoff_time(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class Outbox:
+    """Durable store of json messages that still have to be delivered to the driver.
+    Every message is one file, named after its key, so storing the same message twice is harmless.
+    """
+    def __init__(self, outbox_folder_path: str):
+        self.outbox_folder_path = os.path.abspath(outbox_folder_path)
+        os.makedirs(self.outbox_folder_path, exist_ok=True)
+
+    def put(self, key: str, message: dict) -> None:
+        """Write the message atomically, so a crash never leaves a half written file behind."""
+        message_file_path = os.path.join(self.outbox_folder_path, f"{key}.json")
+        temporary_file_path = message_file_path + ".tmp"
+        with open(temporary_file_path, "w", encoding="utf-8") as f:
+            json.dump(message, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_file_path, message_file_path)
+
+    def dead_letter(self, key: str, reason: str) -> None:
+        """Move a message the driver rejected to the dead_letter folder, with the reason, so it is not replayed."""
+        dead_letter_folder_path = os.path.join(self.outbox_folder_path, "dead_letter")
+        os.makedirs(dead_letter_folder_path, exist_ok=True)
+        with open(os.path.join(dead_letter_folder_path, f"{key}.reason.txt"), "w", encoding="utf-8") as f:
+            f.write(reason)
+        os.replace(os.path.join(self.outbox_folder_path, f"{key}.json"),
+                   os.path.join(dead_letter_folder_path, f"{key}.json"))
+
+    def remove(self, key: str) -> None:
+        message_file_path = os.path.join(self.outbox_folder_path, f"{key}.json")
+        if os.path.exists(message_file_path):
+            os.remove(message_file_path)
+
+    def items(self) -> list[tuple[str, dict]]:
+        """Return all pending (key, message) pairs, oldest first."""
+        entries = [entry for entry in os.scandir(self.outbox_folder_path) if entry.name.endswith(".json")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        pending = []
+        for entry in entries:
+            with open(entry.path, "r", encoding="utf-8") as f:
+                pending.append((entry.name[:-len(".json")], json.load(f)))
+        return pending
+
+    def __len__(self):
+        return len([name for name in os.listdir(self.outbox_folder_path) if name.endswith(".json")])
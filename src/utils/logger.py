@@ -3,31 +3,145 @@ Utility to set up a root logger that logs messages to both a file and the consol
 Because it does not return a custom logger instance but tunes the root logger,
 all modules using logging will be affected. This means it also captures logs
 from other modules in the file output handler.
+
+Logging does not block the caller: records are put on a queue and a background thread
+writes them to the file and the console. The file is rotated by size or by time and can be
+written as JSON lines. Options are read from the config of the entity (see config/*.yaml):
+    log_format: text or json (file only, the console is always text)
+    log_max_bytes: rotate the file when it reaches this size, 0 to never rotate on size
+    log_rotate_when: rotate on time instead, e.g. "midnight" or "h" (see TimedRotatingFileHandler)
+    log_backup_count: rotated files to keep
+    log_levels: level per component, a logger name (e.g. uvicorn.access) or a module name (e.g. jobs),
+                with "default" for everything else
 """
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+from datetime import datetime
+from typing import Optional
 
 from utils.time_utils import get_datetime_stamp
 
 LOGLEVEL = logging.DEBUG
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 10
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, module, thread and message (with traceback if any)."""
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if record.exc_info:
+            message += "\n" + self.formatException(record.exc_info)
+        return json.dumps({
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "thread": record.threadName,
+            "message": message,
+        }, ensure_ascii=False)
+
+
+def parse_level(level) -> int:
+    """A level from the config, as a name (e.g. "info") or a number."""
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).upper())
+    if not isinstance(value, int):
+        raise ValueError(f"Unknown log level '{level}'.")
+    return value
+
+
+class ComponentLevelFilter(logging.Filter):
+    """Drops records below the level of their component: the module for the root logger, which this project
+    logs to, and the logger name or its closest configured parent (e.g. urllib3 for urllib3.connectionpool) otherwise.
+    """
+    def __init__(self, levels: dict[str, str]):
+        super().__init__()
+        levels = {name: parse_level(level) for name, level in (levels or {}).items()}
+        self.default_level = levels.pop("default", LOGLEVEL)
+        self.levels = levels
+
+    @property
+    def lowest_level(self) -> int:
+        return min([self.default_level, *self.levels.values()])
 
-def setup_root_logger(file_name: str):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.name == "root":
+            return record.levelno >= self.levels.get(record.module, self.default_level)
+        name = record.name
+        while name:
+            if name in self.levels:
+                return record.levelno >= self.levels[name]
+            name = name.rpartition(".")[0]
+        return record.levelno >= self.default_level
+
+
+def create_file_handler(log_path: str, config: dict) -> logging.Handler:
+    if config.get("log_rotate_when"):
+        handler = logging.handlers.TimedRotatingFileHandler(
+            log_path, when=config["log_rotate_when"], backupCount=config.get("log_backup_count", DEFAULT_BACKUP_COUNT),
+            encoding="utf-8")
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=config.get("log_max_bytes", DEFAULT_MAX_BYTES),
+            backupCount=config.get("log_backup_count", DEFAULT_BACKUP_COUNT), encoding="utf-8")
+    if config.get("log_format") == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+    return handler
+
+
+def setup_root_logger(file_name: str, config: dict = None):
+    """Log to logs/<timestamp>-<file_name>.txt and the console, through a queue drained by a background thread.
+    Calling it again replaces the previous setup.
+    """
+    global _listener
+    config = config or {}
     os.makedirs("logs", exist_ok=True)
     prefix = get_datetime_stamp("", "_", "")
     log_path = os.path.join("logs", f"{prefix}-{file_name}.txt")
-    logging.basicConfig(
-        level=LOGLEVEL,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        datefmt="%Y-%m-%dT%H:%M:%S",
-        handlers=[
-            logging.FileHandler(log_path, encoding="utf-8"),
-            logging.StreamHandler()
-        ]
-    )
+
+    level_filter = ComponentLevelFilter(config.get("log_levels"))
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+    listener = logging.handlers.QueueListener(queue.SimpleQueue(), create_file_handler(log_path, config),
+                                              console_handler)
+    queue_handler = logging.handlers.QueueHandler(listener.queue)
+    queue_handler.addFilter(level_filter)
+
+    flush_logs()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(level_filter.lowest_level)  # records below every configured level are not even created
+    root.addHandler(queue_handler)
+    listener.start()
+    _listener = listener
+
+
+@atexit.register
+def flush_logs():
+    """Write out the records still queued, called at exit."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 if __name__ == "__main__":
     setup_root_logger("test_logger")
     logging.debug("This is a debug message.")
     logging.info("This is an info message.")
     logging.warning("This is a warning message.")
-    logging.error("This is an error message.")
\ No newline at end of file
+    logging.error("This is an error message.")
@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+
+from utils.scanner import scan_tree
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """Return the sha256 hex digest of a file."""
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def build_manifest(source_folder_path: str, exclude_folder_names: list[str] = None, max_workers: int = None) -> dict:
+    """Describe a folder by content: relative path, sha256 and size of every file, plus its empty directories.
+    Files are hashed concurrently in a thread pool.
+    :return {"files": [{"path", "sha256", "size", "local_path"}, ...], "empty_dirs": [...]}
+    """
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+    tree = scan_tree(source_folder_path, exclude_folder_names, max_workers)
+    local_paths = [tree.get_absolute_path(entry.path) for entry in tree.files]
+    with ThreadPoolExecutor(max_workers) as executor:
+        hashes = list(executor.map(hash_file, local_paths))
+    entries = [{"path": entry.path, "sha256": sha256, "size": entry.size, "local_path": local_path}
+               for entry, sha256, local_path in zip(tree.files, hashes, local_paths)]
+    return {"files": entries, "empty_dirs": tree.empty_dirs}
+
+
+def describe_folder(folder_path: str, checksum: bool = True, max_workers: int = None) -> dict:
+    """Summarise a folder for integrity checks.
+    The checksum is the sha256 of the sorted "<relative path> <file sha256>" lines of all its files.
+    :return {"size_bytes", "file_count", "sha256"}, sha256 is None if checksum is False
+    """
+    if not checksum:
+        tree = scan_tree(folder_path, max_workers=max_workers)
+        return {"size_bytes": tree.total_size, "file_count": len(tree.files), "sha256": None}
+    files = build_manifest(folder_path, max_workers=max_workers)["files"]
+    hasher = hashlib.sha256()
+    for entry in files:
+        hasher.update(f"{entry['path']} {entry['sha256']}\n".encode("utf-8"))
+    return {"size_bytes": sum(entry["size"] for entry in files), "file_count": len(files), "sha256": hasher.hexdigest()}
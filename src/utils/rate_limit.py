@@ -0,0 +1,54 @@
+"""
+Bandwidth limits for background copies, e.g. studies pre-staged on a worker, so they leave the link to the tasks.
+"""
+import os
+import shutil
+import threading
+import time
+from typing import Optional
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class RateLimiter:
+    def __init__(self, bytes_per_second: Optional[float]):
+        """
+        Args:
+            bytes_per_second: average rate the consumers are held to, None for no limit
+        """
+        self.bytes_per_second = bytes_per_second
+        self.start = time.monotonic()
+        self.consumed = 0
+        self.lifted = threading.Event()
+
+    @classmethod
+    def from_mbps(cls, mbps: Optional[float]) -> "RateLimiter":
+        """A limiter of mbps megabit per second, without limit if mbps is empty or 0."""
+        return cls(mbps * 1_000_000 / 8 if mbps else None)
+
+    def lift(self):
+        """Remove the limit, e.g. once a task waits for the copy. Also ends a wait in progress."""
+        self.lifted.set()
+
+    def consume(self, amount: int):
+        """Account for amount bytes and wait as long as the consumers are ahead of the rate."""
+        if self.bytes_per_second is None or self.lifted.is_set():
+            return
+        self.consumed += amount
+        ahead = self.consumed / self.bytes_per_second - (time.monotonic() - self.start)
+        if ahead > 0:
+            self.lifted.wait(ahead)
+
+
+def copy_file(source: str, target: str, rate_limiter: Optional[RateLimiter] = None) -> str:
+    """shutil.copy2 held to the rate of the limiter. Usable as copy_function of shutil.copytree."""
+    if rate_limiter is None:
+        return shutil.copy2(source, target)
+    if os.path.isdir(target):
+        target = os.path.join(target, os.path.basename(source))
+    with open(source, "rb") as f_in, open(target, "wb") as f_out:
+        while chunk := f_in.read(CHUNK_SIZE):
+            f_out.write(chunk)
+            rate_limiter.consume(len(chunk))
+    shutil.copystat(source, target)
+    return target
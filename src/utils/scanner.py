@@ -0,0 +1,104 @@
+"""
+Fast filesystem scanner built on os.scandir.
+Directory entries carry cached stat information on Windows, so sizes and mtimes come almost for free.
+Subtrees are scanned concurrently in a thread pool, which hides the latency of network and cold disks.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+import fnmatch
+import os
+from typing import NamedTuple
+
+
+class FileEntry(NamedTuple):
+    path: str  # relative to the scanned root, forward slashes
+    size: int  # bytes
+    mtime: float  # seconds since epoch
+
+
+@dataclass
+class TreeManifest:
+    root: str
+    files: list[FileEntry] = field(default_factory=list)
+    empty_dirs: list[str] = field(default_factory=list)  # relative, forward slashes
+
+    @property
+    def total_size(self) -> int:
+        return sum(entry.size for entry in self.files)
+
+    def get_absolute_path(self, rel_path: str) -> str:
+        return os.path.join(self.root, *rel_path.split("/"))
+
+
+def is_excluded(name: str, rel_path: str, exclude_patterns: list[str]) -> bool:
+    """A pattern matches either the bare name (e.g. "output", "*.tmp") or the relative path (e.g. "user/*")."""
+    return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel_path, pattern) for pattern in exclude_patterns)
+
+
+def scan_directory(root: str, rel_dir: str, exclude_patterns: list[str]) -> tuple[list[FileEntry], list[str], bool]:
+    """Scan a single directory.
+    :return (files, relative paths of subdirectories to scan next, whether the directory is empty)
+    """
+    files = []
+    subdirs = []
+    is_empty = True
+    directory_path = os.path.join(root, *rel_dir.split("/")) if rel_dir else root
+    with os.scandir(directory_path) as entries:
+        for entry in entries:
+            is_empty = False
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            if is_excluded(entry.name, rel_path, exclude_patterns):
+                continue
+            # like os.walk, do not descend into symlinked directories
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(rel_path)
+            elif entry.is_file():
+                stat = entry.stat()
+                files.append(FileEntry(rel_path, stat.st_size, stat.st_mtime))
+    return files, subdirs, is_empty
+
+
+def scan_tree(root: str, exclude_patterns: list[str] = None, max_workers: int = None) -> TreeManifest:
+    """Scan a directory tree and return a compact manifest of its files, sorted by path.
+
+    Args:
+        root: folder to scan
+        exclude_patterns: fnmatch patterns of files and folders to skip, excluded folders are not descended into
+        max_workers: number of threads scanning directories concurrently
+    """
+    exclude_patterns = list(exclude_patterns or [])
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+    manifest = TreeManifest(os.path.abspath(root))
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        pending = {executor.submit(scan_directory, manifest.root, "", exclude_patterns): ""}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rel_dir = pending.pop(future)
+                files, subdirs, is_empty = future.result()
+                manifest.files.extend(files)
+                if is_empty and rel_dir:
+                    manifest.empty_dirs.append(rel_dir)
+                for subdir in subdirs:
+                    pending[executor.submit(scan_directory, manifest.root, subdir, exclude_patterns)] = subdir
+
+    manifest.files.sort(key=lambda entry: entry.path)
+    manifest.empty_dirs.sort()
+    return manifest
+
+
+class PathExistenceCache:
+    """Answer many os.path.exists questions with a single directory listing per parent folder."""
+    def __init__(self):
+        self.listings: dict[str, set[str]] = {}
+
+    def exists(self, path: str) -> bool:
+        parent, name = os.path.split(os.path.abspath(path))
+        if parent not in self.listings:
+            try:
+                with os.scandir(parent) as entries:
+                    self.listings[parent] = {os.path.normcase(entry.name) for entry in entries}
+            except OSError:
+                self.listings[parent] = set()
+        return os.path.normcase(name) in self.listings[parent]
@@ -1,9 +1,26 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+import itertools
 import os
-from pathlib import Path
+import queue
 import shutil
 import subprocess
-from zipfile import ZipFile, ZIP_STORED
+import threading
+import time
+from typing import Iterator, Optional
+from zipfile import ZIP64_LIMIT, ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+import zlib
+
+from utils.compression import (CompressionProfile, DEFAULT_LINK_BANDWIDTH_MBPS, choose_compression, get_7z_switch,
+                               resolve_profile)
+from utils.scanner import FileEntry, TreeManifest, scan_tree
+
+PARALLEL_READ_SIZE_LIMIT = 64 * 1024 * 1024  # files above this size are streamed by the writer instead of read ahead
+STREAM_CHUNK_SIZE = 1024 * 1024  # bytes per chunk handed out by stream_zip_folder
+STREAM_QUEUE_SIZE = 16  # chunks buffered between the zipping thread and the consumer
+ZIP_EPOCH = 315532800  # 1980-01-01, the earliest timestamp a zip header can hold
+PARALLEL_BATCH_SIZE = 64  # number of files handled per thread pool job, amortizes the scheduling overhead
 
 
 class ZipMethod(Enum):
@@ -11,16 +28,23 @@ class ZipMethod(Enum):
     SEVEN_Z_ENV = "7z_env"
     SEVEN_Z_CFG = "7z_cfg"
     BUILTIN = "zipfile"
+    BUILTIN_PARALLEL = "zipfile_parallel"
 
 
-def identify_best_zip_method(user_7z_path: str) -> Enum:
+def identify_best_zip_method(user_7z_path: str, preferred_method: str = None) -> Enum:
     """Identify the best available ZIP method.
 
     Priority:
+    0. Use the preferred method if one is configured ("zipfile" or "zipfile_parallel").
     1. Use 7z if available on PATH.
     2. Use user-provided 7z path if configured.
-    3. Fallback to Python's built-in zipfile module.
+    3. Fallback to Python's built-in zipfile module, multi-threaded.
     """
+    if preferred_method == ZipMethod.BUILTIN.value:
+        return ZipMethod.BUILTIN
+    if preferred_method == ZipMethod.BUILTIN_PARALLEL.value:
+        return ZipMethod.BUILTIN_PARALLEL
+
     # Check if "7z" is available on PATH
     if shutil.which("7z"):
         return ZipMethod.SEVEN_Z_ENV
@@ -30,14 +54,21 @@ def identify_best_zip_method(user_7z_path: str) -> Enum:
         return ZipMethod.SEVEN_Z_CFG
 
     # Fallback
-    return ZipMethod.BUILTIN
+    return ZipMethod.BUILTIN_PARALLEL
 
 
 def smart_zip_folder(source_folder_path: str,
                      output_zip_file_path: str,
                      exclude_folder_names: list[str] = None,
-                     user_7z_path=None):
-    """Zip a folder, optionally excluding some subfolders."""
+                     user_7z_path=None,
+                     preferred_method: str = None,
+                     compression_profile: CompressionProfile = CompressionProfile.STORE,
+                     link_bandwidth_mbps: float = None,
+                     max_workers: int = None):
+    """Zip a folder, optionally excluding some subfolders.
+    The auto compression profile is resolved here, using link_bandwidth_mbps if given.
+    max_workers caps the threads of the parallel zip and of 7z, e.g. when several folders are zipped at once.
+    """
 
     # verification of inputs
     if not os.path.exists(source_folder_path):
@@ -47,20 +78,33 @@ def smart_zip_folder(source_folder_path: str,
     if os.path.exists(output_zip_file_path):
         raise ValueError(f"Output zip file {output_zip_file_path} already exists.")
 
-    exclude_folder_names = set(exclude_folder_names or []) # set of folder names
-    method = identify_best_zip_method(user_7z_path)
+    exclude_folder_names = list(exclude_folder_names or []) # folder names, or scanner patterns
+    method = identify_best_zip_method(user_7z_path, preferred_method)
+    if compression_profile == CompressionProfile.AUTO:
+        compression_profile = resolve_auto_profile(scan_tree(source_folder_path, exclude_folder_names),
+                                                   link_bandwidth_mbps)
 
     if method in {ZipMethod.SEVEN_Z_ENV, ZipMethod.SEVEN_Z_CFG}:
         # Use 7z
         seven_zip_exe = shutil.which("7z") if method == ZipMethod.SEVEN_Z_ENV else user_7z_path
-        zip_with_7z(source_folder_path, output_zip_file_path, seven_zip_exe, exclude_folder_names)
+        zip_with_7z(source_folder_path, output_zip_file_path, seven_zip_exe, exclude_folder_names, compression_profile,
+                    max_workers)
+    elif method == ZipMethod.BUILTIN_PARALLEL:
+        zip_with_builtin_parallel(source_folder_path, output_zip_file_path, exclude_folder_names, max_workers,
+                                  compression_profile)
     else:
         # Built-in zipfile
-        zip_with_builtin(source_folder_path, output_zip_file_path, exclude_folder_names)
+        zip_with_builtin(source_folder_path, output_zip_file_path, exclude_folder_names, compression_profile)
     return output_zip_file_path
 
 
-def zip_with_7z(source_folder_path, output_zip_file_path, seven_zip_exe, exclude_folder_names):
+def resolve_auto_profile(tree: TreeManifest, link_bandwidth_mbps: float = None) -> CompressionProfile:
+    file_paths = [tree.get_absolute_path(entry.path) for entry in tree.files]
+    return resolve_profile(CompressionProfile.AUTO, file_paths, link_bandwidth_mbps or DEFAULT_LINK_BANDWIDTH_MBPS)
+
+
+def zip_with_7z(source_folder_path, output_zip_file_path, seven_zip_exe, exclude_folder_names,
+                compression_profile: CompressionProfile = CompressionProfile.STORE, max_workers: int = None):
     """Zip a folder using 7z, excluding specified subfolders."""
     if not seven_zip_exe or not os.path.exists(seven_zip_exe):
         raise ValueError("7z executable not found.")
@@ -71,38 +115,200 @@ def zip_with_7z(source_folder_path, output_zip_file_path, seven_zip_exe, exclude
     # cmd = [seven_zip_exe, "a", "-tzip", "-mx=0", output_zip_file_path, source_folder_path] + exclude_params
     # subprocess.run(cmd, check=True)
     # "." = take all files in the current directory (when cwd is set to source_folder_path)
-    cmd = [seven_zip_exe, "a", "-tzip", "-mx=0", output_zip_file_path, "."] + exclude_params
+    compression_switch = get_7z_switch(compression_profile)
+    cmd = [seven_zip_exe, "a", "-tzip", compression_switch, output_zip_file_path, "."] + exclude_params
+    if max_workers:
+        cmd.append(f"-mmt={max_workers}")
 
     # Run 7z with a *temporary working directory* set just for this subprocess
     subprocess.run(cmd, cwd=source_folder_path, check=True)
 
 
-def zip_with_builtin(source_folder_path, output_zip_file_path, exclude_folder_names):
+def zip_with_builtin(source_folder_path, output_zip_file_path, exclude_folder_names,
+                     compression_profile: CompressionProfile = CompressionProfile.STORE):
     """Zip a folder using Python's built-in zipfile module, excluding specified subfolders."""
-    source_path = Path(source_folder_path)
+    tree = scan_tree(source_folder_path, exclude_folder_names)
     with ZipFile(output_zip_file_path, "w", ZIP_STORED) as zipf:
-        for root, dirs, files in os.walk(source_folder_path):
-            # Skip excluded directories and the root folder itself
-            dirs[:] = [d for d in dirs if d not in exclude_folder_names and Path(root, d) != source_path]
-            # Add empty directories
-            if not files and not dirs:
-                dir_path = Path(root)
-                rel_dir = dir_path.relative_to(source_path)
-                if rel_dir != Path('.') and not any(part in exclude_folder_names for part in rel_dir.parts):
-                    zipf.writestr(str(rel_dir) + '/', '')
-            for file in files:
-                file_path = Path(root) / file
-                # Skip files in the output folder
-                if source_path == file_path.parent:
-                    arcname = file
+        write_to_zip(zipf, tree, compression_profile)
+
+
+def write_to_zip(zipf: ZipFile, tree: TreeManifest, compression_profile: CompressionProfile) -> None:
+    """Write the scanned files and empty directories to an open zip, compressing every file as the profile prescribes."""
+    for rel_dir in tree.empty_dirs:
+        zipf.writestr(rel_dir + "/", '')
+    for entry in tree.files:
+        compress_type, compress_level = choose_compression(entry.path, entry.size, compression_profile)
+        zipf.write(tree.get_absolute_path(entry.path), entry.path, compress_type, compress_level)
+
+
+def make_zip_info(entry: FileEntry) -> ZipInfo:
+    """Build the zip header of a file from its scanned stat information, without another stat call."""
+    date_time = time.localtime(max(entry.mtime, ZIP_EPOCH))[:6]
+    zinfo = ZipInfo(entry.path, date_time)
+    zinfo.file_size = entry.size
+    zinfo.external_attr = 0o100644 << 16  # regular file, rw-r--r--
+    return zinfo
+
+
+def compress_member(zinfo: ZipInfo, data: bytes, compress_type: int, compress_level: Optional[int]) -> Optional[bytes]:
+    """Checksum and deflate a file for write_compressed_member, as zipfile itself would.
+    zlib releases the GIL, so this runs in parallel on the reader threads.
+    :return the member data, None for compression methods other than deflate, those are left to zipfile
+    """
+    if compress_type == ZIP_DEFLATED:
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if compress_level is None else compress_level,
+                                      zlib.DEFLATED, -15)  # raw deflate, the zip headers replace the zlib ones
+        payload = compressor.compress(data) + compressor.flush()
+    elif compress_type == ZIP_STORED:
+        payload = data
+    else:
+        return None
+    zinfo.compress_type = compress_type
+    zinfo.CRC = zlib.crc32(data)
+    zinfo.file_size, zinfo.compress_size = len(data), len(payload)
+    return payload
+
+
+def write_compressed_member(zipf: ZipFile, zinfo: ZipInfo, payload: bytes) -> None:
+    """Append a member whose checksum and compressed data were computed by compress_member to a zip being
+    written to a seekable file. Mirrors ZipFile.open(zinfo, "w"), which has no way to take compressed data.
+    """
+    zinfo.flag_bits = 0
+    zip64 = zinfo.file_size * 1.05 > ZIP64_LIMIT
+    zipf.fp.seek(zipf.start_dir)
+    zinfo.header_offset = zipf.fp.tell()
+    zipf._writecheck(zinfo)
+    zipf._didModify = True
+    zipf.fp.write(zinfo.FileHeader(zip64))
+    zipf.fp.write(payload)
+    zipf.start_dir = zipf.fp.tell()
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[zinfo.filename] = zinfo
+
+
+def zip_with_builtin_parallel(source_folder_path, output_zip_file_path, exclude_folder_names, max_workers: int = None,
+                              compression_profile: CompressionProfile = CompressionProfile.STORE):
+    """Zip a folder using Python's built-in zipfile module with a pool of reader threads.
+
+    Files are read, checksummed and compressed concurrently in batches, a bounded window ahead of the writer,
+    which only appends them in walk order so the archive is deterministic.
+    Files above PARALLEL_READ_SIZE_LIMIT are streamed and compressed by the writer.
+    """
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+    tree = scan_tree(source_folder_path, exclude_folder_names, max_workers)
+    batches = [tree.files[i:i + PARALLEL_BATCH_SIZE] for i in range(0, len(tree.files), PARALLEL_BATCH_SIZE)]
+
+    def read_batch(batch: list[FileEntry]) -> list[tuple[str, ZipInfo, Optional[bytes]]]:
+        """:return (file path, zip header, member data or None for the writer to read and compress the file)"""
+        contents = []
+        for entry in batch:
+            file_path = tree.get_absolute_path(entry.path)
+            zinfo = make_zip_info(entry)
+            if entry.size > PARALLEL_READ_SIZE_LIMIT:
+                contents.append((file_path, zinfo, None))
+                continue
+            with open(file_path, "rb") as f:
+                data = f.read()
+            compress_type, compress_level = choose_compression(entry.path, entry.size, compression_profile)
+            contents.append((file_path, zinfo, compress_member(zinfo, data, compress_type, compress_level)))
+        return contents
+
+    with ZipFile(output_zip_file_path, "w", ZIP_STORED) as zipf, ThreadPoolExecutor(max_workers) as executor:
+        for rel_dir in tree.empty_dirs:
+            zipf.writestr(rel_dir + "/", '')
+        # keep a bounded window of batches in flight to cap memory usage
+        remaining = iter(batches)
+        pending = deque(executor.submit(read_batch, batch) for batch in itertools.islice(remaining, max_workers * 2))
+        while pending:
+            future = pending.popleft()
+            next_batch = next(remaining, None)
+            if next_batch is not None:
+                pending.append(executor.submit(read_batch, next_batch))
+            for file_path, zinfo, payload in future.result():
+                if payload is None:
+                    compress_type, compress_level = choose_compression(zinfo.filename, zinfo.file_size,
+                                                                       compression_profile)
+                    zipf.write(file_path, zinfo.filename, compress_type, compress_level)
                 else:
-                    arcname = file_path.relative_to(source_path)
-                # Only add files not in excluded folders
-                if not any(part in exclude_folder_names for part in file_path.relative_to(source_path).parts):
-                    zipf.write(file_path, arcname)
+                    write_compressed_member(zipf, zinfo, payload)
+
+
+class QueueWriter:
+    """Write-only, unseekable file object that hands out the written bytes as chunks on a bounded queue.
+    zipfile detects that it can't seek and writes data descriptors instead of patching local headers.
+    """
+    def __init__(self, chunk_queue: queue.Queue, chunk_size: int, stop_event: threading.Event):
+        self.chunk_queue = chunk_queue
+        self.chunk_size = chunk_size
+        self.stop_event = stop_event
+        self.buffer = bytearray()
+
+    def write(self, data) -> int:
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+        return len(data)
+
+    def flush(self) -> None:
+        if self.buffer:
+            self.put(bytes(self.buffer))
+            self.buffer.clear()
+
+    def put(self, item) -> None:
+        """Block until the consumer makes room, unless it gave up."""
+        while not self.stop_event.is_set():
+            try:
+                self.chunk_queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise InterruptedError("Consumer of the zip stream stopped reading.")
+
+
+def stream_zip_folder(source_folder_path: str,
+                      exclude_folder_names: list[str] = None,
+                      chunk_size: int = STREAM_CHUNK_SIZE,
+                      compression_profile: CompressionProfile = CompressionProfile.STORE,
+                      link_bandwidth_mbps: float = None) -> Iterator[bytes]:
+    """Zip a folder on the fly and yield the archive as chunks of bytes, without an intermediate file.
+    The archive is built in a background thread, so compression overlaps with whatever consumes the chunks.
+    """
+    if not os.path.isdir(source_folder_path):
+        raise ValueError(f"Source folder {source_folder_path} does not exist or is not a directory.")
+    tree = scan_tree(source_folder_path, exclude_folder_names)
+    if compression_profile == CompressionProfile.AUTO:
+        compression_profile = resolve_auto_profile(tree, link_bandwidth_mbps)
+    chunk_queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    stop_event = threading.Event()
+    end_of_stream = object()
+
+    def produce() -> None:
+        writer = QueueWriter(chunk_queue, chunk_size, stop_event)
+        try:
+            with ZipFile(writer, "w", ZIP_STORED) as zipf:
+                write_to_zip(zipf, tree, compression_profile)
+            writer.flush()
+            writer.put(end_of_stream)
+        except InterruptedError:
+            pass
+        except Exception as e:
+            writer.put(e)
 
+    producer = threading.Thread(target=produce, name="zip-stream", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = chunk_queue.get()
+            if item is end_of_stream:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop_event.set()
 
-def smart_unzip_file(input_zip_file_path: str, output_folder_path: str, user_7z_path=None):
+
+def smart_unzip_file(input_zip_file_path: str, output_folder_path: str, user_7z_path=None, preferred_method: str = None):
     """Unzip a zip file using 7z if available, or builtin otherwise.
 
     output_folder_path is the parent folder in which the zip file will be extracted
@@ -122,11 +328,13 @@ def smart_unzip_file(input_zip_file_path: str, output_folder_path: str, user_7z_
     if os.path.exists(study_folder_path):
         raise ValueError(f"Study folder {study_folder_path} already exists. Cannot unzip safely.")
 
-    method = identify_best_zip_method(user_7z_path)
+    method = identify_best_zip_method(user_7z_path, preferred_method)
     if method in {ZipMethod.SEVEN_Z_ENV, ZipMethod.SEVEN_Z_CFG}:
         # Use 7z
         seven_zip_exe = shutil.which("7z") if method == ZipMethod.SEVEN_Z_ENV else user_7z_path
         unzip_with_7z(input_zip_file_path, study_folder_path, seven_zip_exe)
+    elif method == ZipMethod.BUILTIN_PARALLEL:
+        unzip_with_builtin_parallel(input_zip_file_path, study_folder_path)
     else:
         # Built-in zipfile
         unzip_with_builtin(input_zip_file_path, study_folder_path)
@@ -144,3 +352,41 @@ def unzip_with_builtin(input_zip_file_path: str, output_folder_path: str):
     """Unzip a folder using Python's built-in zipfile module."""
     with ZipFile(input_zip_file_path, "r") as zipf:
         zipf.extractall(output_folder_path)
+
+
+def unzip_with_builtin_parallel(input_zip_file_path: str, output_folder_path: str, max_workers: int = None):
+    """Unzip a folder using Python's built-in zipfile module, extracting batches of members concurrently."""
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+    with ZipFile(input_zip_file_path, "r") as zipf:
+        # create the directory tree up front so the threads never race on it,
+        # let zipfile sanitize unusual member names itself
+        plain_members = []
+        for member in zipf.infolist():
+            parts = member.filename.split("/")
+            if member.filename.startswith("/") or ".." in parts or ":" in parts[0]:
+                zipf.extract(member, output_folder_path)
+                continue
+            folder_parts = parts[:-1] if not member.is_dir() else parts
+            os.makedirs(os.path.join(output_folder_path, *folder_parts), exist_ok=True)
+            if not member.is_dir():
+                plain_members.append(member)
+
+    # every thread reads through its own handle on the zip file, opened once since that parses the central directory
+    local = threading.local()
+    handles = []
+
+    def extract(batch: list[ZipInfo]) -> None:
+        if not hasattr(local, "zipf"):
+            local.zipf = ZipFile(input_zip_file_path, "r")
+            handles.append(local.zipf)
+        for member in batch:
+            local.zipf.extract(member, output_folder_path)
+
+    batches = [plain_members[i:i + PARALLEL_BATCH_SIZE] for i in range(0, len(plain_members), PARALLEL_BATCH_SIZE)]
+    try:
+        with ThreadPoolExecutor(max_workers) as executor:
+            # consume the iterator so exceptions from the threads are raised here
+            list(executor.map(extract, batches))
+    finally:
+        for handle in handles:
+            handle.close()
@@ -0,0 +1,145 @@
+"""
+Parsed metadata of an Antares study: study.antares, settings/generaldata.ini and input/areas/list.txt.
+Metadata is parsed once and cached per study, keyed by the modification time and size of those files,
+so any change on disk is picked up while repeated inspection of an unchanged study costs three stat calls.
+"""
+from collections import OrderedDict
+import configparser
+from dataclasses import dataclass
+import os
+import threading
+
+from utils.ini import robust_read_ini
+from utils.year_set import YearSet
+
+CACHE_SIZE = 256  # studies kept in the cache
+
+_cache: "OrderedDict[str, tuple[tuple, StudyMetadata]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class StudyMetadata:
+    study_path: str
+    antares_version: str
+    nbyears: int
+    playlist: YearSet  # active MC years, 0-based
+    mode: str  # simulation mode in lower case, e.g. "economy" or "adequacy"
+    year_by_year: bool  # whether individual MC year output (mc-ind) is written
+    area_ids: tuple[str, ...]  # lower case, as antares uses them for output folder names
+
+    @property
+    def output_mode_folder(self) -> str:
+        """Folder of the run output holding mc-ind and mc-all, e.g. "economy"."""
+        return self.mode
+
+
+def get_metadata_file_paths(study_path: str) -> tuple[str, str, str]:
+    return (os.path.join(study_path, "study.antares"),
+            os.path.join(study_path, "settings", "generaldata.ini"),
+            os.path.join(study_path, "input", "areas", "list.txt"))
+
+
+def get_cache_key(study_path: str) -> tuple:
+    key = []
+    for file_path in get_metadata_file_paths(study_path):
+        try:
+            stat = os.stat(file_path)
+            key.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            key.append(None)
+    return tuple(key)
+
+
+def read_study_metadata(study_path: str) -> StudyMetadata:
+    """Return the metadata of a study, parsing it only if its files changed since the last call."""
+    study_path = os.path.abspath(study_path)
+    key = get_cache_key(study_path)
+    with _cache_lock:
+        cached = _cache.get(study_path)
+        if cached is not None and cached[0] == key:
+            _cache.move_to_end(study_path)
+            return cached[1]
+    metadata = parse_study_metadata(study_path)
+    with _cache_lock:
+        _cache[study_path] = (key, metadata)
+        _cache.move_to_end(study_path)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return metadata
+
+
+def invalidate_study_metadata(study_path: str) -> None:
+    """Forget the cached metadata of a study, e.g. after rewriting one of its files.
+    Needed when a rewrite may keep the same size within the timestamp resolution of the file system.
+    """
+    with _cache_lock:
+        _cache.pop(os.path.abspath(study_path), None)
+
+
+def parse_study_metadata(study_path: str) -> StudyMetadata:
+    antares_file_path, generaldata_file_path, areas_list_file_path = get_metadata_file_paths(study_path)
+    general, playlist = parse_generaldata(generaldata_file_path)
+    nbyears = int(general["nbyears"].strip())
+    return StudyMetadata(
+        study_path=study_path,
+        antares_version=parse_antares_version(antares_file_path),
+        nbyears=nbyears,
+        playlist=get_playlist_years(nbyears, playlist),
+        mode=general.get("mode", "economy").strip().lower(),
+        year_by_year=general.get("year-by-year", "false").strip().lower() == "true",
+        area_ids=tuple(parse_area_ids(areas_list_file_path)),
+    )
+
+
+def parse_antares_version(antares_file_path: str) -> str:
+    """Reads an antares file and returns the version string as parsed from INI format."""
+    config = configparser.ConfigParser()
+    config.read(antares_file_path)
+    if "antares" not in config:
+        raise ValueError("Section [antares] not found in file.")
+    if "version" not in config["antares"]:
+        raise ValueError("Version key not found in [antares] section.")
+    return config["antares"]["version"].strip()
+
+
+def parse_generaldata(generaldata_file_path: str) -> tuple[dict, dict]:
+    """:return the [general] and [playlist] sections of generaldata.ini, the latter empty if absent."""
+    config = robust_read_ini(generaldata_file_path)
+    if "general" not in config:
+        raise ValueError("Section [general] not found in settings file.")
+    if "nbyears" not in config["general"]:
+        raise ValueError("nbyears key not found in [general] section.")
+    return config["general"], config.get("playlist", {})
+
+
+def get_playlist_years(nbyears: int, playlist: dict) -> YearSet:
+    """Establishes which monte carlo years need to be solved.
+    In antares settings file the mcYear 1 corresponds to index 0.
+    This method follows that convention.
+
+    If we have playlist_reset we start from nothing and add entries:
+      [playlist]
+      playlist_reset = false
+      playlist_year + = 0
+      playlist_year + = 99
+    else we subtract entries from a full list
+      [playlist]
+      playlist_year - = 0
+      playlist_year - = 1
+    """
+    def as_list(value) -> list[str]:
+        # robust_read_ini returns a plain string for a key that occurs once
+        return value if isinstance(value, list) else [value]
+
+    if "playlist_reset" in playlist:
+        return YearSet(int(year.strip()) for year in as_list(playlist.get("playlist_year +", [])))
+    inactive_years = YearSet(int(year.strip()) for year in as_list(playlist.get("playlist_year -", [])))
+    return YearSet(range(nbyears)) - inactive_years
+
+
+def parse_area_ids(areas_list_file_path: str) -> list[str]:
+    if not os.path.exists(areas_list_file_path):
+        return []
+    with open(areas_list_file_path, "r", encoding="utf-8") as f:
+        return [line.strip().lower() for line in f if line.strip()]
@@ -1,5 +1,27 @@
+"""
+Directory links from the driver's output collection folder to year folders elsewhere (e.g. on a worker).
+Links are created with os.symlink, which works on Windows (as admin or in developer mode) and on Linux,
+and never changes the working directory of the process. When a symbolic link cannot be created,
+the target folder can be recreated instead, with hardlinked files where possible and copies otherwise.
+"""
+from dataclasses import dataclass
+import logging
 import os
-import subprocess
+import shutil
+from typing import Optional
+
+
+@dataclass
+class LinkResult:
+    link_path: str
+    target: str
+    method: Optional[str] = None  # "symlink", "copy" (hardlinks or copies of the files), "exists", None on error
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
 
 def create_symlink_with_same_name(where: str, target: str) -> None:
     """Create a directory symbolic link in 'where' to folder 'target'.
@@ -14,24 +36,85 @@ def create_symlink(where: str, link_name: str, target: str) -> None:
     """Create a directory symbolic link in 'where' to folder 'target'.
     link_name must be a simple name (no path separators),
     target must be an absolute path"""
+    result = create_link(os.path.join(where, link_name), target)
+    if not result.ok:
+        raise OSError(result.error)
+
+
+def create_links(where: str, targets: list[str], allow_copy: bool = True) -> list[LinkResult]:
+    """Create in 'where' a directory link to every target folder, named like the target folder.
+    Existing links to the target folders are left untouched. Errors are reported per link instead of raised.
+
+    Args:
+        where: folder in which the links are created
+        targets: absolute paths of the folders to link to
+        allow_copy: recreate the target folder when a symbolic link cannot be created
+    """
+    results = [create_link(os.path.join(where, os.path.basename(target)), target, allow_copy) for target in targets]
+    failed = [result for result in results if not result.ok]
+    if failed:
+        logging.error(f"Could not create {len(failed)} of {len(results)} links in {where}, first error: {failed[0].error}")
+    return results
 
-    full_path = os.path.join(where, link_name)
-    if os.path.exists(full_path):
-        print(f"Skipping {full_path}, already exists.")
-        return
-    run_cmd(wd=where, cmd=f'mklink /D "{link_name}" "{target}"')
+
+def create_link(link_path: str, target: str, allow_copy: bool = True) -> LinkResult:
+    """Link link_path to the target folder. An existing entry only counts if it is, or links to, the target folder.
+    Any other entry is an error, replaced by a copy of the target folder if allow_copy is set.
+    """
+    result = LinkResult(link_path, target)
+    if os.path.lexists(link_path):
+        if is_same_folder(link_path, target):
+            result.method = "exists"
+            return result
+        result.error = f"{link_path} already exists and is not a link to {target}"
+        if not allow_copy:
+            return result
+        try:
+            remove_entry(link_path)
+        except OSError as e:
+            result.error = f"{link_path} -> {target}: could not replace the existing entry: {e}"
+            return result
+    else:
+        try:
+            os.symlink(target, link_path, target_is_directory=True)
+            result.method = "symlink"
+            return result
+        except OSError as e:
+            result.error = f"{link_path} -> {target}: {e}"
+        if not allow_copy:
+            return result
+    try:
+        copy_tree_with_hardlinks(target, link_path)
+        result.method = "copy"
+        result.error = None
+    except OSError as e:
+        shutil.rmtree(link_path, ignore_errors=True)
+        result.error = f"{link_path} -> {target}: {e}"
+    return result
 
 
-def run_cmd(wd: str, cmd: str) -> None:
-    """Run a shell command in the specified working directory and print output."""
-    old_wd = os.getcwd()
+def is_same_folder(path: str, target: str) -> bool:
+    """Whether path is the target folder, e.g. a link to it. Not if either of them is missing."""
     try:
-        os.chdir(wd)
-        print(f"> {cmd}")
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        if result.stdout:
-            print(result.stdout.strip())
-        if result.stderr:
-            print(result.stderr.strip())
-    finally:
-        os.chdir(old_wd)
\ No newline at end of file
+        return os.path.samefile(path, target)
+    except OSError:
+        return False
+
+
+def remove_entry(path: str) -> None:
+    """Remove a link without touching what it points to, or a folder or file."""
+    if os.path.islink(path) or not os.path.isdir(path):
+        os.unlink(path)
+    else:
+        shutil.rmtree(path)
+
+
+def copy_tree_with_hardlinks(source_folder_path: str, target_folder_path: str) -> None:
+    """Recreate a folder, hardlinking its files when on the same volume and copying them otherwise."""
+    def link_or_copy(source: str, target: str) -> None:
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+
+    shutil.copytree(source_folder_path, target_folder_path, copy_function=link_or_copy)
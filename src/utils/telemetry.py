@@ -0,0 +1,122 @@
+"""
+Resource telemetry for the Antares solver.
+A background thread samples the solver process tree with psutil and keeps
+track of CPU time, peak resident memory, I/O bytes and wall time.
+It also watches the study output folder, so we know when each MC year finished.
+"""
+import logging
+import os
+import threading
+import time
+
+import psutil
+
+DEFAULT_SAMPLING_INTERVAL = 1.0  # seconds
+
+
+class ResourceSampler:
+    def __init__(self, pid: int, cores: int, output_root: str = None, interval: float = DEFAULT_SAMPLING_INTERVAL,
+                 output_mode_folder: str = "economy"):
+        """Sample the process with the given pid and all of its children.
+
+        Args:
+            pid: root process of the tree to sample (e.g. the shell that launched the solver)
+            cores: number of cores the solver was allowed to use, used to compute utilisation
+            output_root: study output folder, watched for new <output_mode_folder>/mc-ind/NNNNN folders
+            interval: seconds between two samples
+            output_mode_folder: folder of a run output holding mc-ind, named after the simulation mode
+        """
+        self.pid = pid
+        self.cores = cores
+        self.output_root = output_root
+        self.output_mode_folder = output_mode_folder
+        self.interval = interval
+        self.start_time: float = None
+        self.end_time: float = None
+        self.peak_rss_bytes: int = 0
+        self.cpu_seconds_per_pid: dict[int, float] = {}  # last known cumulative cpu time per process
+        self.io_per_pid: dict[int, tuple[int, int]] = {}  # last known (read_bytes, write_bytes) per process
+        self.year_completed_after: dict[int, float] = {}  # 0-based year -> seconds since start
+        self.existing_output_folders: set[str] = set()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread = None
+
+    def start(self) -> None:
+        self.start_time = time.monotonic()
+        if self.output_root and os.path.isdir(self.output_root):
+            self.existing_output_folders = set(os.listdir(self.output_root))
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> dict:
+        """Stop sampling, take one last sample and return the telemetry summary."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.end_time = time.monotonic()
+        self._sample_output_years()
+        return self.summary()
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self._sample_processes()
+            self._sample_output_years()
+            self._stop_event.wait(self.interval)
+
+    def _sample_processes(self) -> None:
+        try:
+            root = psutil.Process(self.pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+
+        rss_total = 0
+        for proc in processes:
+            try:
+                with proc.oneshot():
+                    cpu = proc.cpu_times()
+                    rss_total += proc.memory_info().rss
+                    self.cpu_seconds_per_pid[proc.pid] = cpu.user + cpu.system
+                    if hasattr(proc, "io_counters"):  # not available on every platform
+                        io = proc.io_counters()
+                        self.io_per_pid[proc.pid] = (io.read_bytes, io.write_bytes)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        self.peak_rss_bytes = max(self.peak_rss_bytes, rss_total)
+
+    def _sample_output_years(self) -> None:
+        """Register the moment each <output_mode_folder>/mc-ind/NNNNN folder shows up in a new output folder."""
+        if not self.output_root or not os.path.isdir(self.output_root):
+            return
+        elapsed = time.monotonic() - self.start_time
+        for folder in os.listdir(self.output_root):
+            if folder in self.existing_output_folders:
+                continue
+            mc_ind_path = os.path.join(self.output_root, folder, self.output_mode_folder, "mc-ind")
+            if not os.path.isdir(mc_ind_path):
+                continue
+            for year_folder in os.listdir(mc_ind_path):
+                if not year_folder.isdigit():
+                    continue
+                year = int(year_folder) - 1  # antares folders are 1-based
+                self.year_completed_after.setdefault(year, elapsed)
+
+    def summary(self) -> dict:
+        end_time = self.end_time if self.end_time is not None else time.monotonic()
+        wall_time = end_time - self.start_time
+        cpu_seconds = sum(self.cpu_seconds_per_pid.values())
+        cpu_utilisation = cpu_seconds / (wall_time * self.cores) if wall_time > 0 and self.cores > 0 else 0.0
+        summary = {
+            "wall_time_seconds": round(wall_time, 3),
+            "cpu_seconds": round(cpu_seconds, 3),
+            "cpu_utilisation": round(cpu_utilisation, 4),
+            "cores": self.cores,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "read_bytes": sum(r for r, w in self.io_per_pid.values()),
+            "write_bytes": sum(w for r, w in self.io_per_pid.values()),
+            "per_year": {year: {"completed_after_seconds": round(t, 3)}
+                         for year, t in sorted(self.year_completed_after.items())},
+        }
+        logging.info(f"Solver telemetry: wall {summary['wall_time_seconds']}s, cpu {summary['cpu_seconds']}s, "
+                     f"utilisation {summary['cpu_utilisation']:.0%}, peak rss {summary['peak_rss_bytes'] / 1024**2:.0f} MB.")
+        return summary
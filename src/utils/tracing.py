@@ -0,0 +1,81 @@
+"""
+Span-based tracing of the stages of a task, from staging the study on the worker to the bookkeeping on the driver.
+A span is a plain dict {"name", "start", "end", "bytes", ...attributes} with start and end in seconds since
+the epoch, so spans recorded on workers and on the driver can be sent as JSON and put on a single timeline.
+"""
+from contextlib import contextmanager
+import time
+from typing import Callable, Iterator, Optional
+
+
+class Tracer:
+    def __init__(self, process: str, sink: Optional[Callable[[dict], None]] = None):
+        """
+        Args:
+            process: where the spans are recorded, a worker name or "driver"
+            sink: also called with every span once it ended, e.g. to write it to disk
+        """
+        self.process = process
+        self.spans: list[dict] = []
+        self.sink = sink
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[dict]:
+        """Record the duration of the block. The yielded span can be updated, e.g. span["bytes"] = size.
+        The span is also recorded when the block raises, with the error.
+        """
+        span = {"name": name, "process": self.process, "start": time.time(), "end": None, "bytes": None, **attributes}
+        try:
+            yield span
+        except BaseException as e:
+            span["error"] = repr(e)
+            raise
+        finally:
+            span["end"] = time.time()
+            self.spans.append(span)
+            if self.sink is not None:
+                self.sink(span)
+
+
+def get_duration(span: dict) -> float:
+    return (span["end"] or span["start"]) - span["start"]
+
+
+def summarize_spans(spans: list[dict]) -> dict:
+    """Total seconds and bytes per span name, and the time from the first start to the last end."""
+    stages = {}
+    for span in spans:
+        stage = stages.setdefault(span["name"], {"count": 0, "seconds": 0.0, "bytes": 0})
+        stage["count"] += 1
+        stage["seconds"] += get_duration(span)
+        stage["bytes"] += span.get("bytes") or 0
+    for stage in stages.values():
+        stage["seconds"] = round(stage["seconds"], 3)
+    makespan = max(span["end"] or span["start"] for span in spans) - min(span["start"] for span in spans) \
+        if spans else 0.0
+    return {"makespan_seconds": round(makespan, 3), "stages": stages}
+
+
+def to_chrome_trace(spans: list[dict], origin: Optional[float] = None) -> dict:
+    """Trace Event Format JSON, to open in chrome://tracing or ui.perfetto.dev.
+    Every process (worker or driver) becomes a trace process and every task one of its threads.
+    """
+    origin = min((span["start"] for span in spans), default=0.0) if origin is None else origin
+    process_ids, thread_ids, events = {}, {}, []
+    for span in sorted(spans, key=lambda span: span["start"]):
+        process = span.get("process") or "unknown"
+        if process not in process_ids:
+            process_ids[process] = len(process_ids) + 1
+            events.append({"name": "process_name", "ph": "M", "pid": process_ids[process], "tid": 0,
+                           "args": {"name": process}})
+        thread = (process, span.get("task_id") or "job")
+        if thread not in thread_ids:
+            thread_ids[thread] = len(thread_ids) + 1
+            events.append({"name": "thread_name", "ph": "M", "pid": process_ids[process], "tid": thread_ids[thread],
+                           "args": {"name": thread[1]}})
+        args = {key: value for key, value in span.items()
+                if key not in {"name", "process", "start", "end"} and value is not None}
+        events.append({"name": span["name"], "ph": "X", "pid": process_ids[process], "tid": thread_ids[thread],
+                       "ts": round((span["start"] - origin) * 1e6), "dur": round(get_duration(span) * 1e6),
+                       "args": args})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
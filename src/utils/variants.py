@@ -0,0 +1,196 @@
+"""
+Variants of a base study for parameter sweeps. A variant is a name, INI key overrides and small replacement files:
+    {"name": "high_demand",
+     "ini_overrides": {"settings/generaldata.ini": {"general": {"nbyears": 20}}},
+     "files": {"input/load/series/load_fr.txt": "<content>"}}
+Paths are relative to the study folder with forward slashes, an override value of None removes the key.
+
+The driver stores the base study once and the replacement files of every variant next to it. A worker stages the
+base study once and materialises every variant as an overlay folder: the input files are hardlinks to the base
+study, everything else is a copy, so the overrides and set_playlist never write through to the base study.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+from typing import Optional
+
+import yaml
+
+from utils.ini import robust_read_ini, robust_write_ini
+from utils.study_metadata import get_playlist_years
+from utils.year_set import YearSet
+
+VARIANT_NAME_PATTERN = re.compile(r"[A-Za-z0-9_.-]+")
+HARDLINKED_FOLDER_NAMES = ("input",)  # large and only read by the solver
+VARIANT_SPEC_FILE_NAME = "variant.json"  # written in the overlay, to reuse it for later tasks of the same variant
+
+
+def check_relative_path(path: str) -> str:
+    """:return the path with forward slashes, raises ValueError if it leaves the study or points into its output."""
+    normalised = os.path.normpath(path.replace("\\", "/")).replace("\\", "/")
+    if os.path.isabs(path) or ":" in normalised or normalised in (".", "..", "output") \
+            or normalised.startswith("../") or normalised.startswith("output/"):
+        raise ValueError(f"Path '{path}' must be relative to the study folder and outside its output.")
+    return normalised
+
+
+def format_ini_value(value) -> str | list[str]:
+    if isinstance(value, bool):
+        return "true" if value else "false"  # spelling of booleans in Antares ini files
+    if isinstance(value, list):
+        return [format_ini_value(v) for v in value]
+    return str(value)
+
+
+def validate_variants(variants: list[dict]) -> list[dict]:
+    """Check the names and paths of the variants of a sweep.
+    :return the variants with normalised paths and ini values as strings, raises ValueError if invalid
+    """
+    if not isinstance(variants, list) or not variants:
+        raise ValueError("A sweep needs a non-empty list of variants.")
+    validated, names = [], set()
+    for variant in variants:
+        name = variant.get("name") if isinstance(variant, dict) else None
+        if not isinstance(name, str) or not VARIANT_NAME_PATTERN.fullmatch(name):
+            raise ValueError(f"Variant name '{name}' must only contain letters, digits, '_', '.' and '-'.")
+        if name in names:
+            raise ValueError(f"Variant name '{name}' is used more than once.")
+        names.add(name)
+        ini_overrides = {}
+        for path, sections in (variant.get("ini_overrides") or {}).items():
+            if not isinstance(sections, dict) or not all(isinstance(keys, dict) for keys in sections.values()):
+                raise ValueError(f"Overrides of '{path}' in variant '{name}' must map sections to keys and values.")
+            ini_overrides[check_relative_path(path)] = {
+                section: {key: None if value is None else format_ini_value(value) for key, value in keys.items()}
+                for section, keys in sections.items()}
+        check_generaldata_overrides(name, ini_overrides.get("settings/generaldata.ini", {}))
+        files = {}
+        for path, content in (variant.get("files") or {}).items():
+            if not isinstance(content, str):
+                raise ValueError(f"Replacement file '{path}' in variant '{name}' must be text.")
+            files[check_relative_path(path)] = content
+        validated.append({"name": name, "ini_overrides": ini_overrides, "files": files})
+    return validated
+
+
+def check_generaldata_overrides(name: str, overrides: dict) -> None:
+    """Raise ValueError if the overrides of generaldata.ini of a variant would not give a playlist of MC years."""
+    general = overrides.get("general", {})
+    if "nbyears" in general and not (isinstance(general["nbyears"], str) and general["nbyears"].strip().isdigit()
+                                     and int(general["nbyears"]) > 0):
+        raise ValueError(f"nbyears of variant '{name}' must be a positive integer, not '{general['nbyears']}'.")
+    for key in ("playlist_year +", "playlist_year -"):
+        years = overrides.get("playlist", {}).get(key) or []
+        for year in years if isinstance(years, list) else [years]:
+            if not year.strip().isdigit():
+                raise ValueError(f"'{key}' of variant '{name}' must only list MC year indices, not '{year}'.")
+
+
+def read_sweep_spec(spec_file_path: str) -> list[dict]:
+    """Read the variants of a sweep from a YAML file, either a list of variants or a mapping with a 'variants' key.
+    Replacement files are given as local paths, relative to the spec file, and are read into the variants.
+    """
+    with open(spec_file_path, encoding="utf-8") as f:
+        spec = yaml.safe_load(f) or []
+    variants = spec.get("variants", []) if isinstance(spec, dict) else spec
+    spec_folder_path = os.path.dirname(os.path.abspath(spec_file_path))
+    for variant in variants:
+        files = {}
+        for study_relative_path, local_path in (variant.get("files") or {}).items():
+            with open(os.path.join(spec_folder_path, local_path), encoding="utf-8") as f:
+                files[study_relative_path] = f.read()
+        variant["files"] = files
+    return validate_variants(variants)
+
+
+def apply_ini_overrides(contents: dict, overrides: dict) -> dict:
+    """:return a copy of the contents of an ini file (see robust_read_ini) with the overrides applied."""
+    new_contents = {section: dict(keys) for section, keys in contents.items()}
+    for section, keys in overrides.items():
+        section_keys = new_contents.setdefault(section, {})
+        for key, value in keys.items():
+            if value is None:
+                section_keys.pop(key, None)
+            else:
+                section_keys[key] = value
+    return new_contents
+
+
+def get_variant_playlist(study_path: str, ini_overrides: dict) -> YearSet:
+    """The MC years to solve for a variant, which may override nbyears or the playlist of the base study."""
+    generaldata = robust_read_ini(os.path.join(study_path, "settings", "generaldata.ini"))
+    generaldata = apply_ini_overrides(generaldata, ini_overrides.get("settings/generaldata.ini", {}))
+    if "nbyears" not in generaldata.get("general", {}):
+        raise ValueError("nbyears key not found in [general] section.")
+    return get_playlist_years(int(generaldata["general"]["nbyears"]), generaldata.get("playlist", {}))
+
+
+def write_variant_files(files: dict[str, str], variant_files_folder_path: str) -> None:
+    """Store the replacement files of a variant on the driver, where workers copy them from."""
+    for relative_path, content in files.items():
+        file_path = os.path.join(variant_files_folder_path, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def create_variant_study(base_study_path: str, variant_study_path: str, ini_overrides: dict,
+                         variant_files_folder_path: Optional[str] = None) -> str:
+    """Materialise a variant as an overlay of the base study, or reuse the overlay if it was made for the same variant.
+    :return the folder of the variant study
+    """
+    spec = json.dumps({"base": os.path.abspath(base_study_path), "ini_overrides": ini_overrides,
+                       "files": variant_files_folder_path or ""}, sort_keys=True)
+    spec_file_path = os.path.join(variant_study_path, VARIANT_SPEC_FILE_NAME)
+    if os.path.exists(spec_file_path):
+        with open(spec_file_path, encoding="utf-8") as f:
+            if f.read() == spec:
+                logging.info(f"Variant study {variant_study_path} found locally.")
+                return variant_study_path
+        shutil.rmtree(variant_study_path)
+    elif os.path.exists(variant_study_path):
+        shutil.rmtree(variant_study_path)  # left over by an interrupted overlay
+
+    logging.info(f"Materialising variant study {variant_study_path} from {base_study_path}.")
+    partial_study_path = variant_study_path + ".part"
+    if os.path.exists(partial_study_path):
+        shutil.rmtree(partial_study_path)
+
+    def link_or_copy(source: str, target: str) -> None:
+        relative_path = os.path.relpath(source, base_study_path)
+        if relative_path.split(os.sep)[0] in HARDLINKED_FOLDER_NAMES:
+            try:
+                os.link(source, target)
+                return
+            except OSError:
+                pass
+        shutil.copy2(source, target)
+
+    shutil.copytree(base_study_path, partial_study_path, copy_function=link_or_copy,
+                    ignore=lambda folder, names: ["output"] if os.path.samefile(folder, base_study_path) else [])
+    os.makedirs(os.path.join(partial_study_path, "output"), exist_ok=True)
+
+    # replacement files and overrides are written as new files, never through a hardlink into the base study
+    if variant_files_folder_path:
+        for folder_path, _, file_names in os.walk(variant_files_folder_path):
+            for file_name in file_names:
+                relative_path = os.path.relpath(os.path.join(folder_path, file_name), variant_files_folder_path)
+                target = os.path.join(partial_study_path, relative_path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if os.path.exists(target):
+                    os.remove(target)
+                shutil.copyfile(os.path.join(folder_path, file_name), target)
+    for relative_path, overrides in ini_overrides.items():
+        ini_file_path = os.path.join(partial_study_path, *relative_path.split("/"))
+        contents = robust_read_ini(ini_file_path) if os.path.exists(ini_file_path) else {}
+        if os.path.exists(ini_file_path):
+            os.remove(ini_file_path)
+        os.makedirs(os.path.dirname(ini_file_path), exist_ok=True)
+        robust_write_ini(ini_file_path, apply_ini_overrides(contents, overrides))
+
+    with open(os.path.join(partial_study_path, VARIANT_SPEC_FILE_NAME), "w", encoding="utf-8") as f:
+        f.write(spec)
+    os.replace(partial_study_path, variant_study_path)
+    return variant_study_path
@@ -0,0 +1,146 @@
+"""
+Compact set of MC years, stored as sorted, disjoint ranges.
+A workload of 10000 consecutive years is a single range, in memory, in pickles and in the API,
+where it is written as a string of inclusive ranges, e.g. "0-99,150-199".
+"""
+from bisect import bisect_right
+from typing import Iterable, Iterator, Union
+
+
+class YearSet:
+    """Immutable set of non-negative integers as a tuple of half-open (start, stop) ranges."""
+    __slots__ = ("ranges", "length")
+
+    def __init__(self, years: Union["YearSet", Iterable[int]] = ()):
+        if isinstance(years, YearSet):
+            ranges = years.ranges
+        elif isinstance(years, range) and years.step == 1:
+            ranges = ((years.start, years.stop),) if len(years) else ()
+        else:
+            ranges = coalesce((year, year + 1) for year in sorted(set(years)))
+        if ranges and ranges[0][0] < 0:
+            raise ValueError("Years must be non-negative.")
+        self.ranges: tuple[tuple[int, int], ...] = ranges
+        self.length: int = sum(stop - start for start, stop in ranges)
+
+    @classmethod
+    def from_ranges(cls, ranges: Iterable[tuple[int, int]]) -> "YearSet":
+        """Build from half-open ranges in any order, overlapping or adjacent ranges are merged."""
+        year_set = cls()
+        year_set.ranges = coalesce(sorted((start, stop) for start, stop in ranges if stop > start))
+        year_set.length = sum(stop - start for start, stop in year_set.ranges)
+        if year_set.ranges and year_set.ranges[0][0] < 0:
+            raise ValueError("Years must be non-negative.")
+        return year_set
+
+    @classmethod
+    def from_string(cls, text: str) -> "YearSet":
+        """Parse comma separated years and inclusive ranges, e.g. "0-99,150-199,250"."""
+        ranges = []
+        for part in text.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            first, _, last = part.partition("-")
+            try:
+                start = int(first)
+                stop = int(last) + 1 if last else start + 1
+            except ValueError:
+                raise ValueError(f"Invalid year range '{part}', expected e.g. '7' or '0-99'.")
+            if stop <= start:
+                raise ValueError(f"Invalid year range '{part}', the end is before the start.")
+            ranges.append((start, stop))
+        return cls.from_ranges(ranges)
+
+    def __str__(self) -> str:
+        return ",".join(str(start) if stop == start + 1 else f"{start}-{stop - 1}" for start, stop in self.ranges)
+
+    def __repr__(self) -> str:
+        return f"YearSet('{self}')"
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __bool__(self) -> bool:
+        return self.length > 0
+
+    def __iter__(self) -> Iterator[int]:
+        for start, stop in self.ranges:
+            yield from range(start, stop)
+
+    def __contains__(self, year: int) -> bool:
+        i = bisect_right(self.ranges, (year, float("inf"))) - 1
+        return i >= 0 and self.ranges[i][0] <= year < self.ranges[i][1]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, YearSet):
+            return NotImplemented
+        return self.ranges == other.ranges
+
+    def __hash__(self) -> int:
+        return hash(self.ranges)
+
+    def __or__(self, other: Iterable[int]) -> "YearSet":
+        return YearSet.from_ranges(self.ranges + as_year_set(other).ranges)
+
+    def __and__(self, other: Iterable[int]) -> "YearSet":
+        result, other_ranges, j = [], as_year_set(other).ranges, 0
+        for start, stop in self.ranges:
+            while j < len(other_ranges) and other_ranges[j][1] <= start:
+                j += 1
+            k = j
+            while k < len(other_ranges) and other_ranges[k][0] < stop:
+                result.append((max(start, other_ranges[k][0]), min(stop, other_ranges[k][1])))
+                k += 1
+        return YearSet.from_ranges(result)
+
+    def __sub__(self, other: Iterable[int]) -> "YearSet":
+        result, other_ranges, j = [], as_year_set(other).ranges, 0
+        for start, stop in self.ranges:
+            while j < len(other_ranges) and other_ranges[j][1] <= start:
+                j += 1
+            k = j
+            while k < len(other_ranges) and other_ranges[k][0] < stop:
+                if other_ranges[k][0] > start:
+                    result.append((start, other_ranges[k][0]))
+                start = max(start, other_ranges[k][1])
+                k += 1
+            if start < stop:
+                result.append((start, stop))
+        return YearSet.from_ranges(result)
+
+    def __rsub__(self, other: Iterable[int]) -> "YearSet":
+        return as_year_set(other) - self
+
+    __ror__ = __or__
+    __rand__ = __and__
+
+    def take_first(self, amount: int) -> "YearSet":
+        """The 'amount' smallest years of the set, or all of them if there are fewer."""
+        result = []
+        for start, stop in self.ranges:
+            if amount <= 0:
+                break
+            result.append((start, min(stop, start + amount)))
+            amount -= stop - start
+        return YearSet.from_ranges(result)
+
+    def __reduce__(self):
+        # pickled as its ranges only
+        return YearSet.from_ranges, (self.ranges,)
+
+
+def as_year_set(years: Iterable[int]) -> YearSet:
+    return years if isinstance(years, YearSet) else YearSet(years)
+
+
+def coalesce(sorted_ranges: Iterable[tuple[int, int]]) -> tuple[tuple[int, int], ...]:
+    """Merge overlapping and adjacent ranges, the input must be sorted by start."""
+    merged = []
+    for start, stop in sorted_ranges:
+        if merged and start <= merged[-1][1]:
+            if stop > merged[-1][1]:
+                merged[-1] = (merged[-1][0], stop)
+        else:
+            merged.append((start, stop))
+    return tuple(merged)
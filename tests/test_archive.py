@@ -0,0 +1,83 @@
+from datetime import datetime
+import os
+import pickle
+
+from driver.archive import INDEX_FILE_NAME, FinishedJobArchive
+from driver.cost_model import StudyProfile
+from driver.jobs import Job, JobQueue, Task, TaskStatus
+from utils.antares import AntaresStudy
+from utils.year_set import YearSet
+
+def make_finished_job(tmp_path, name):
+    study_path = tmp_path / "study" / name
+    os.makedirs(study_path / "output" / "run")
+    job = Job("user", 50, None, study_name=name)
+    job.study_path, job.output_dir = str(study_path), str(study_path / "output" / "run")
+    job.workload = YearSet(range(4))
+    job.profile = StudyProfile(areas=1, links=0, thermal_clusters=0, renewable_clusters=0, hours=8760,
+                               unit_commitment_mode="fast")
+    task = Task(job, "worker")
+    task.workload, task.status = YearSet(range(4)), TaskStatus.COMPLETED
+    task.telemetry = {"wall_time_seconds": 8.0, "cores": 4}
+    job.tasks.append(task)
+    job.percentage_complete = 100
+    job.finished_at = 1000.0
+    return job
+
+def test_finished_jobs_are_loaded_lazily_after_a_restart(tmp_path):
+    job_queue = JobQueue(str(tmp_path / "state"))
+    jobs = [make_finished_job(tmp_path, name) for name in ("a", "b")]
+    for job in jobs:
+        job_queue.archive.add(job)
+
+    restarted = JobQueue(str(tmp_path / "state"))
+    assert list(restarted.archive.records) == [job.id for job in jobs]
+    assert restarted.archive.records[jobs[0].id].years_done == 4
+    assert list(restarted.cost_model.ratios) == [8.0, 8.0]  # calibrated from the records alone
+    assert not restarted.archive.cache
+
+    job = restarted.get_job_by_id(jobs[1].id)
+    assert (job.study_name, job.get_succeeded_years(), job.tasks[0].job) == ("b", YearSet(range(4)), job)
+    assert restarted.get_job_eta(job.id)["status"] == "finished"
+    assert restarted.get_job_by_id("unknown") is None
+
+def test_index_is_compacted_once_mostly_superseded(tmp_path):
+    archive = FinishedJobArchive(str(tmp_path / "archive"))
+    jobs = [make_finished_job(tmp_path, name) for name in ("a", "b", "c")]
+    for job in jobs:
+        archive.add(job, pending=True)
+        archive.add(job)
+    archive.remove(jobs[0].id)
+    assert not os.path.exists(archive.get_job_file_path(jobs[0].id))
+
+    reopened = FinishedJobArchive(str(tmp_path / "archive"))
+    assert list(reopened.records) == [jobs[1].id, jobs[2].id]
+    assert not any(record.pending for record in reopened.records.values())
+    with open(tmp_path / "archive" / INDEX_FILE_NAME) as f:
+        assert len(f.readlines()) == 2
+
+def test_legacy_finished_list_is_moved_to_the_archive(tmp_path):
+    os.makedirs(tmp_path / "state")
+    job = make_finished_job(tmp_path, "legacy")
+    with open(tmp_path / "state" / "finished.pkl", "wb") as f:
+        pickle.dump([job], f)
+
+    job_queue = JobQueue(str(tmp_path / "state"))
+    assert list(job_queue.archive.records) == [job.id]
+    assert sorted(os.listdir(tmp_path / "state")) == ["archive", "finished.pkl.migrated", "traces"]
+    job_queue.synthesis_executor.submit(lambda: None).result()
+    assert not job_queue.archive.records[job.id].pending
+
+def test_jobs_persisted_with_config_and_study_object_are_converted(tmp_path):
+    antares_study = AntaresStudy(str(tmp_path / "study"))
+    antares_study.output_dir = str(tmp_path / "study" / "output" / "run")
+    job = Job.__new__(Job)
+    job.__setstate__({"id": "old", "submitter": "user", "priority": 50, "zip_file_path": None, "study_name": "study",
+                      "config": {"synthesize_mc_all": True}, "antares_study": antares_study, "workload": [0, 1],
+                      "tasks": [], "percentage_complete": 100, "synthesizer": None,
+                      "finished_at": datetime.fromtimestamp(1000.0)})
+    assert (job.study_path, job.output_dir) == (antares_study.study_path, antares_study.output_dir)
+    assert job.workload == YearSet([0, 1]) and job.finished_at == 1000.0
+    assert job.year_index == {} and job.deleted_storage == set() and job.tracer is not None
+    assert job.antares_study.output_dir == antares_study.output_dir
+    assert not hasattr(job, "__dict__")
@@ -0,0 +1,65 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+
+import pytest
+
+from driver.blob_store import BlobStore
+from utils.manifest import build_manifest
+
+async def as_chunks(data: bytes):
+    for i in range(0, len(data), 4):
+        yield data[i:i + 4]
+
+def store_bytes(store, data):
+    sha256 = hashlib.sha256(data).hexdigest()
+    assert asyncio.run(store.add_blob(sha256, as_chunks(data)))
+    return sha256
+
+def test_missing_blobs_are_reported_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(tmp)
+        known = store_bytes(store, b"known content")
+        unknown = hashlib.sha256(b"other").hexdigest()
+        assert store.get_missing_blobs([known, unknown, unknown]) == [unknown]
+
+def test_blob_with_wrong_hash_is_rejected():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(tmp)
+        wrong = hashlib.sha256(b"expected").hexdigest()
+        assert not asyncio.run(store.add_blob(wrong, as_chunks(b"something else")))
+        assert not store.has_blob(wrong)
+
+def test_manifest_round_trip_through_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        study = os.path.join(tmp, "study")
+        os.makedirs(os.path.join(study, "input", "areas"))
+        os.makedirs(os.path.join(study, "user"))
+        os.makedirs(os.path.join(study, "output", "old"))
+        for name in ("a.txt", "b.txt"):  # identical content is stored once
+            with open(os.path.join(study, "input", "areas", name), "w") as f:
+                f.write("same")
+        with open(os.path.join(study, "output", "old", "simulation.log"), "w") as f:
+            f.write("excluded")
+
+        manifest = build_manifest(study, ["output"])
+        assert sorted(entry["path"] for entry in manifest["files"]) == ["input/areas/a.txt", "input/areas/b.txt"]
+        assert manifest["empty_dirs"] == ["user"]
+
+        store = BlobStore(os.path.join(tmp, "store"))
+        for entry in manifest["files"]:
+            with open(entry["local_path"], "rb") as f:
+                store_bytes(store, f.read())
+        target = os.path.join(tmp, "materialised")
+        store.materialise(manifest["files"], manifest["empty_dirs"], target)
+        with open(os.path.join(target, "input", "areas", "b.txt")) as f:
+            assert f.read() == "same"
+        assert os.path.isdir(os.path.join(target, "user"))
+
+def test_materialise_refuses_paths_outside_target():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(os.path.join(tmp, "store"))
+        sha256 = store_bytes(store, b"x")
+        with pytest.raises(ValueError):
+            store.materialise([{"path": "../escape.txt", "sha256": sha256}], [], os.path.join(tmp, "target"))
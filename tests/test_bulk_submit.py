@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+from utils.bulk_submit import get_zip_threads, resolve_studies, submit_bulk
+
+def test_resolve_studies_from_globs_and_manifest():
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("a", "b", "c"):
+            os.makedirs(os.path.join(tmp, "nightly", name))
+        open(os.path.join(tmp, "nightly", "notes.txt"), "w").close()
+        manifest_path = os.path.join(tmp, "nightly.yaml")
+        with open(manifest_path, "w") as f:
+            f.write(f"- path: {os.path.join(tmp, 'nightly', 'b')}\n  priority: 10\n"
+                    f"- {os.path.join(tmp, 'other')}\n")
+        submissions = resolve_studies([os.path.join(tmp, "nightly", "*")], manifest_path, 50)
+        # the glob skips files, b keeps the priority of its first occurrence
+        assert [(os.path.basename(s.study_path), s.priority) for s in submissions] == \
+               [("a", 50), ("b", 50), ("c", 50), ("other", 50)]
+        submissions = resolve_studies([], manifest_path, 50)
+        assert [s.priority for s in submissions] == [10, 50]
+
+def test_invalid_studies_fail_without_packaging():
+    with tempfile.TemporaryDirectory() as tmp:
+        submissions = resolve_studies([os.path.join(tmp, "missing"), tmp], None, 50)
+        summary = submit_bulk(submissions, "http://127.0.0.1:1", "tester", os.path.join(tmp, "zip"))
+        assert (summary["submitted"], summary["failed"], summary["bytes_sent"]) == (0, 2, 0)
+        assert [study["status"] for study in summary["studies"]] == ["failed", "failed"]
+        assert "validate" in summary["studies"][0]["seconds"]
+
+def test_studies_of_the_same_name_get_zips_of_their_own():
+    with tempfile.TemporaryDirectory() as tmp:
+        for folder in ("a", "b"):
+            study_path = os.path.join(tmp, folder, "scenario")
+            for sub_folder in ("settings", "input", "output"):
+                os.makedirs(os.path.join(study_path, sub_folder))
+            with open(os.path.join(study_path, "study.antares"), "w") as f:
+                f.write("[antares]\nversion = 880\ncaption = scenario\n")
+            with open(os.path.join(study_path, "settings", "generaldata.ini"), "w") as f:
+                f.write("[general]\nnbyears = 1\n")
+        submissions = resolve_studies([os.path.join(tmp, "*", "scenario")], None, 50)
+        summary = submit_bulk(submissions, "http://127.0.0.1:1", "tester", os.path.join(tmp, "zip"),
+                              zip_method="zipfile", package_processes=2)
+        assert summary["failed"] == 2  # no driver to upload to
+        assert len(set(study["zip_file_path"] for study in summary["studies"])) == 2
+        assert len(os.listdir(os.path.join(tmp, "zip"))) == 2
+
+def test_zip_threads_are_shared_by_the_packaging_processes(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    assert [get_zip_threads(processes) for processes in (1, 8, 64)] == [32, 4, 1]
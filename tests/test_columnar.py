@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pyarrow")
+
+from utils.columnar import export_year, get_exported_years, load_index, read_results
+
+HEADER = [
+    "{element}\t{kind}\tva\thourly",
+    "\tVARIABLES\tBEGIN\tEND",
+    "\t2\t1\t2",
+    "",
+    "{element}\thourly\t\t\t\tOV. COST\tLOAD",
+    "\t\t\t\t\tEuro\tMWh",
+    "\tindex\tday\tmonth\thour\tEXP\tEXP",
+]
+
+def write_table(year_folder, kind, element, rows):
+    table_path = os.path.join(year_folder, kind, element, "values-hourly.txt")
+    os.makedirs(os.path.dirname(table_path))
+    with open(table_path, "w") as f:
+        f.write("\n".join(HEADER).format(element=element, kind=kind[:-1]) + "\n")
+        for i, (cost, load) in enumerate(rows):
+            f.write(f"\t{i + 1}\t01\tJAN\t{i:02d}:00\t{cost}\t{load}\n")
+
+def test_export_and_query_selected_variables_and_years():
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = os.path.join(tmp, "parquet")
+        for mc_year in (1, 2):
+            year_folder = os.path.join(tmp, "mc-ind", str(mc_year).zfill(5))
+            write_table(year_folder, "areas", "de", [(10 * mc_year, 1), (20 * mc_year, "N/A")])
+            write_table(year_folder, "areas", "fr", [(5, 7), (6, 8)])
+            write_table(year_folder, "links", "de - fr", [(0, 100), (0, 200)])
+            export_year(year_folder, mc_year, dataset)
+
+        assert get_exported_years(dataset) == {1, 2}
+        index = load_index(dataset)
+        assert index["tables"]["areas-hourly"] == {"elements": ["de", "fr"], "variables": ["LOAD", "OV. COST"]}
+
+        table = read_results(dataset, "areas-hourly", variables=["OV. COST"], years=[2], elements=["de"])
+        assert table.column("value").to_pylist() == [20, 40]
+        assert table.column("mc_year").to_pylist() == [2, 2]
+        assert table.column("time_index").to_pylist() == [1, 2]
+
+        loads = read_results(dataset, "areas-hourly", variables=["LOAD"], elements=["de"])
+        assert loads.column("value").to_pylist() == [1, None, 1, None]
+        assert read_results(dataset, "links-hourly", years=[3]).num_rows == 0
@@ -0,0 +1,34 @@
+import os
+import tempfile
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+
+import pytest
+
+from utils.compression import CompressionProfile, choose_compression, get_compression_profile, resolve_profile
+
+def test_profile_from_config_value():
+    assert get_compression_profile("fast") == CompressionProfile.FAST
+    assert get_compression_profile(" Balanced ") == CompressionProfile.BALANCED
+    assert get_compression_profile(None) == CompressionProfile.STORE
+    with pytest.raises(ValueError):
+        get_compression_profile("zstd-max")
+
+def test_store_profile_never_compresses():
+    assert choose_compression("load_de.txt", 10_000, CompressionProfile.STORE) == (ZIP_STORED, None)
+
+def test_text_series_are_deflated():
+    assert choose_compression("load_de.txt", 10_000, CompressionProfile.FAST) == (ZIP_DEFLATED, 1)
+    assert choose_compression("load_de.txt", 10_000, CompressionProfile.BALANCED) == (ZIP_DEFLATED, 6)
+
+def test_compressed_and_tiny_files_are_stored():
+    assert choose_compression("archive.ZIP", 10_000, CompressionProfile.BALANCED) == (ZIP_STORED, None)
+    assert choose_compression("list.txt", 10, CompressionProfile.BALANCED) == (ZIP_STORED, None)
+
+def test_auto_profile_depends_on_link_bandwidth():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "series.txt")
+        with open(path, "w") as f:
+            f.write("0\t1\t2\t3\n" * 200_000)
+        assert resolve_profile(CompressionProfile.AUTO, [path], link_bandwidth_mbps=0.1) != CompressionProfile.STORE
+        assert resolve_profile(CompressionProfile.AUTO, [path], link_bandwidth_mbps=10_000_000) == CompressionProfile.STORE
+        assert resolve_profile(CompressionProfile.FAST, [path]) == CompressionProfile.FAST
@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+from driver.cost_model import CostModel, DEFAULT_SECONDS_PER_WORK_UNIT, get_task_seconds_per_year, profile_study
+
+def write(path, contents):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(contents)
+
+def test_profile_counts_network_elements_and_horizon():
+    with tempfile.TemporaryDirectory() as tmp:
+        write(os.path.join(tmp, "study.antares"), "[antares]\nversion = 880\n")
+        write(os.path.join(tmp, "settings", "generaldata.ini"),
+              "[general]\nnbyears = 10\nsimulation.start = 1\nsimulation.end = 7\n\n"
+              "[other preferences]\nunit-commitment-mode = accurate\n")
+        write(os.path.join(tmp, "input", "areas", "list.txt"), "DE\nFR\n")
+        write(os.path.join(tmp, "input", "links", "de", "properties.ini"), "[fr]\nhurdles-cost = false\n")
+        write(os.path.join(tmp, "input", "thermal", "clusters", "de", "list.ini"), "[gas]\nunitcount = 1\n[coal]\n")
+        profile = profile_study(tmp)
+        assert (profile.areas, profile.links, profile.thermal_clusters, profile.renewable_clusters) == (2, 1, 2, 0)
+        assert profile.hours == 168
+        assert profile.work_units == 5 * 168 / 8760 * 3
+
+def test_model_is_calibrated_on_observed_tasks():
+    with tempfile.TemporaryDirectory() as tmp:
+        write(os.path.join(tmp, "study.antares"), "[antares]\nversion = 880\n")
+        write(os.path.join(tmp, "settings", "generaldata.ini"), "[general]\nnbyears = 10\n")
+        write(os.path.join(tmp, "input", "areas", "list.txt"), "DE\nFR\nBE\nNL\n")
+        profile = profile_study(tmp)
+    model = CostModel()
+    assert model.predict(profile) == DEFAULT_SECONDS_PER_WORK_UNIT * 4
+    # 16 years on 8 cores in 100 s: two rounds of 8 parallel years, 50 core-seconds per year
+    seconds_per_year = get_task_seconds_per_year({"wall_time_seconds": 100, "cores": 8}, 16)
+    assert seconds_per_year == 50
+    model.observe(profile, seconds_per_year)
+    assert model.predict(profile) == 50
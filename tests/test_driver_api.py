@@ -0,0 +1,111 @@
+import hashlib
+import importlib
+import os
+import sys
+
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+
+from driver.jobs import Job
+from driver.payload_models import TaskDoneRequest
+from utils.smart_zip import smart_zip_folder
+from utils.year_set import YearSet
+
+@pytest.fixture
+def driver(tmp_path, monkeypatch):
+    """The driver module, imported with a config of its own in tmp_path and without a log file."""
+    os.makedirs(tmp_path / "config")
+    config = {"new_jobs_zip_folder_path": str(tmp_path / "zip"), "new_jobs_study_folder_path": str(tmp_path / "study"),
+              "blob_store_folder_path": str(tmp_path / "blobs"), "persisted_queue_folder_path": str(tmp_path / "state"),
+              "zip_method": "zipfile", "synthesize_mc_all": False, "retention_interval_seconds": 0}
+    with open(tmp_path / "config" / "config_driver.yaml", "w") as f:
+        yaml.safe_dump(config, f)
+    for folder_name in ("zip", "study"):
+        os.makedirs(tmp_path / folder_name)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("utils.logger.setup_root_logger", lambda *args: None)
+    monkeypatch.setattr(Job, "config", Job.config)  # restored after the driver replaced it
+    monkeypatch.delitem(sys.modules, "main_driver", raising=False)
+    driver = importlib.import_module("main_driver")
+    yield driver
+    driver.job_queue.synthesis_executor.shutdown()
+
+def queue_job(driver, tmp_path, years: int) -> Job:
+    study_path = tmp_path / "study" / "base"
+    os.makedirs(study_path / "settings")
+    os.makedirs(study_path / "input" / "areas")
+    (study_path / "study.antares").write_text("[antares]\nversion = 880\ncaption = test\n")
+    (study_path / "settings" / "generaldata.ini").write_text(f"[general]\nmode = Economy\nnbyears = {years}\n")
+    (study_path / "input" / "areas" / "list.txt").write_text("DE\n")
+    job = Job("user", 50, None, study_name="base")
+    job.study_path, job.output_dir = str(study_path), str(study_path / "output" / "run")
+    os.makedirs(job.output_dir)
+    job.workload = YearSet(range(years))
+    driver.job_queue.add_job(job)
+    return job
+
+def zip_year(tmp_path, year: int) -> bytes:
+    year_folder_path = tmp_path / "worker" / str(year + 1).zfill(5)
+    os.makedirs(year_folder_path / "areas" / "de")
+    (year_folder_path / "areas" / "de" / "values-hourly.txt").write_text("values")
+    zip_file_path = str(tmp_path / "worker" / "year.zip")
+    smart_zip_folder(str(year_folder_path), zip_file_path, preferred_method="zipfile")
+    with open(zip_file_path, "rb") as f:
+        return f.read()
+
+def test_task_output_upload_is_verified_and_unpacked(driver, tmp_path):
+    job = queue_job(driver, tmp_path, 2)
+    task = driver.job_queue.assign_task("worker", 2)
+    content = zip_year(tmp_path, 1)
+    sha256 = hashlib.sha256(content).hexdigest()
+    client = TestClient(driver.app)
+    endpoint = f"/task_output/{job.id}/{task.id}/1"
+
+    response = client.put(endpoint, params={"sha256": hashlib.sha256(b"other").hexdigest()}, content=content)
+    assert response.status_code == 400
+    assert os.listdir(os.path.join(job.output_dir, ".incoming")) == []  # the bad upload is discarded
+    assert client.put(endpoint, params={"sha256": "not a digest"}, content=content).status_code == 400
+    assert client.put(f"/task_output/{job.id}/{task.id}/5", params={"sha256": sha256},
+                      content=content).status_code == 404
+
+    response = client.put(endpoint, params={"sha256": sha256}, content=content)
+    assert response.status_code == 200 and response.json() == {"received": 1}
+    year_folder_path = os.path.join(job.output_dir, "economy", "mc-ind", "00002")
+    with open(os.path.join(year_folder_path, "areas", "de", "values-hourly.txt")) as f:
+        assert f.read() == "values"
+
+def test_year_index_endpoint(driver, tmp_path):
+    job = queue_job(driver, tmp_path, 3)
+    task = driver.job_queue.assign_task("worker", 2)
+    output_path = tmp_path / "worker" / "output"
+    os.makedirs(output_path / "economy" / "mc-ind" / "00001")
+    driver.job_queue.finish_task(TaskDoneRequest(task_id=task.id, job_id=job.id, workload=task.workload,
+                                                 output_path=str(output_path), success=True,
+                                                 failed_years=YearSet([1]),
+                                                 year_details={0: {"size_bytes": 10, "file_count": 1}}))
+    client = TestClient(driver.app)
+
+    response = client.get(f"/year_index/{job.id}").json()
+    assert [(entry["year"], entry["status"]) for entry in response["years"]] == [(0, "done"), (1, "missing"),
+                                                                                (2, "missing")]
+    assert [entry["year"] for entry in client.get(f"/year_index/{job.id}?status=failed").json()["years"]] == [1]
+    year = client.get(f"/year_index/{job.id}?year=0").json()
+    assert (year["worker"], year["size_bytes"], year["method"]) == ("worker", 10, "symlink")
+    assert client.get(f"/year_index/{job.id}?year=0&status=missing").json() == {"error": "Year not found."}
+    assert client.get(f"/year_index/{job.id}?status=broken").status_code == 400
+    assert client.get("/year_index/unknown").json() == {"error": "Job not found."}
+
+def test_sweep_that_can_not_be_prepared_leaves_nothing_behind(driver, tmp_path):
+    study_path = tmp_path / "upload" / "base"
+    os.makedirs(study_path / "settings")
+    (study_path / "study.antares").write_text("[antares]\nversion = 880\ncaption = test\n")
+    (study_path / "settings" / "generaldata.ini").write_text("[general]\nmode = Economy\n")  # without nbyears
+    zip_file_path = str(tmp_path / "zip" / "base.zip")
+    smart_zip_folder(str(study_path), zip_file_path, preferred_method="zipfile")
+
+    variants = driver.validate_variants([{"name": "files_only", "files": {"input/x.txt": "x"}}])
+    response = driver.create_sweep(zip_file_path, 50, "user", variants)
+    assert "nbyears" in response["error"]
+    assert os.listdir(tmp_path / "zip") == [] and os.listdir(tmp_path / "study") == []
+    assert driver.job_queue.get_queue_length() == 0
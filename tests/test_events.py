@@ -0,0 +1,30 @@
+import asyncio
+
+from driver.events import EventBus, format_sse
+from utils.event_stream import iter_sse_events
+
+def test_subscribers_get_matching_events_and_replay_after_reconnect():
+    async def scenario():
+        bus = EventBus()
+        by_job = bus.subscribe(job_id="a")
+        by_submitter = bus.subscribe(submitter="bob")
+        bus.publish("job_queued", "a", "alice")
+        bus.publish("job_queued", "b", "bob")
+        last_seen = bus.publish("task_assigned", "a", "alice", worker="w1")
+        bus.publish("job_finished", "a", "alice")
+        await asyncio.sleep(0)  # deliveries are scheduled on the loop
+        assert [e["type"] for e in (by_job.queue.get_nowait(), by_job.queue.get_nowait(), by_job.queue.get_nowait())] \
+               == ["job_queued", "task_assigned", "job_finished"]
+        assert by_submitter.queue.get_nowait()["job_id"] == "b" and by_submitter.queue.empty()
+        reconnected = bus.subscribe(job_id="a", last_event_id=last_seen["id"])
+        assert reconnected.queue.get_nowait()["type"] == "job_finished" and reconnected.queue.empty()
+        bus.unsubscribe(by_job)
+        bus.publish("job_queued", "a", "alice")
+        await asyncio.sleep(0)
+        assert by_job.queue.empty()
+    asyncio.run(scenario())
+
+def test_sse_round_trip():
+    events = [{"id": 1, "type": "job_queued", "job_id": "a"}, {"type": "job_state", "job_id": "b"}]
+    text = ": keepalive\n\n" + "".join(format_sse(event) for event in events)
+    assert list(iter_sse_events(text.split("\n"))) == events
@@ -0,0 +1,61 @@
+import pytest
+import requests
+
+import utils.http_client
+from utils.http_client import DriverClient, DriverUnavailableError, Outbox
+
+def make_response(status_code: int) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = "http://driver/finish_task"
+    return response
+
+class FakeSession:
+    """Answers every request with the next outcome, a status code or an exception to raise."""
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return make_response(outcome)
+
+@pytest.fixture
+def waits(monkeypatch):
+    waits = []
+    monkeypatch.setattr(utils.http_client.time, "sleep", waits.append)
+    return waits
+
+def test_retries_with_bounded_exponential_backoff(waits):
+    client = DriverClient("http://driver/", max_retries=3, backoff_base=1, backoff_max=3)
+    client.session = FakeSession([requests.ConnectionError(), requests.ReadTimeout(), 503, 200])
+    assert client.post("finish_task").status_code == 200
+    assert client.session.calls == 4
+    assert len(waits) == 3 and waits[0] <= 1 and waits[1] <= 2 and waits[2] <= 3
+
+    client.session = FakeSession([503] * 4)
+    with pytest.raises(DriverUnavailableError):
+        client.post("finish_task")
+    assert client.session.calls == 4
+
+def test_rejected_requests_are_not_retried(waits):
+    client = DriverClient("http://driver/", max_retries=3)
+    client.session = FakeSession([422])
+    with pytest.raises(requests.HTTPError):
+        client.post("finish_task")
+    assert client.session.calls == 1 and waits == []
+
+def test_outbox_keeps_messages_until_removed_or_dead_lettered(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox"))
+    outbox.put("a", {"task_id": "a"})
+    outbox.put("a", {"task_id": "a"})  # storing twice is harmless
+    outbox.put("b", {"task_id": "b"})
+    assert len(outbox) == 2
+    outbox.dead_letter("a", "HTTP 422")
+    outbox.remove("b")
+    assert len(outbox) == 0 and Outbox(str(tmp_path / "outbox")).items() == []
+    assert (tmp_path / "outbox" / "dead_letter" / "a.reason.txt").read_text() == "HTTP 422"
+    assert (tmp_path / "outbox" / "dead_letter" / "a.json").exists()
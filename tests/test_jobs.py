@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+
+import pytest
+
+from driver.jobs import MAX_YEAR_ATTEMPTS, Job, JobQueue, TaskStatus
+from driver.payload_models import TaskDoneRequest
+from utils.year_set import YearSet
+
+@pytest.fixture
+def job_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(Job, "config", {"synthesize_mc_all": False})
+    job_queue = JobQueue(str(tmp_path / "state"))
+    yield job_queue
+    job_queue.synthesis_executor.shutdown()
+
+def make_job(tmp_path, years: int, mode: str = "Economy") -> Job:
+    study_path = tmp_path / "study"
+    os.makedirs(study_path / "settings")
+    os.makedirs(study_path / "input" / "areas")
+    (study_path / "study.antares").write_text("[antares]\nversion = 880\ncaption = test\n")
+    (study_path / "settings" / "generaldata.ini").write_text(f"[general]\nmode = {mode}\nnbyears = {years}\n")
+    (study_path / "input" / "areas" / "list.txt").write_text("DE\n")
+    job = Job("user", 50, None, study_name="study")
+    job.study_path, job.output_dir = str(study_path), str(study_path / "output" / "run")
+    os.makedirs(job.output_dir)
+    job.workload = YearSet(range(years))
+    return job
+
+def write_worker_output(tmp_path, task, years) -> str:
+    """Output of a task on a worker, with a year folder for each of the years."""
+    output_path = tmp_path / "worker" / task.id
+    mc_ind_path = output_path / task.job.get_output_mode_folder() / "mc-ind"
+    for year in years:
+        os.makedirs(mc_ind_path / str(year + 1).zfill(5) / "areas" / "de", exist_ok=True)
+    return str(output_path)
+
+def finish(job_queue, tmp_path, task, success=True, failed_years=(), year_details=None):
+    delivered = task.workload - YearSet(failed_years) if success else task.workload
+    request = TaskDoneRequest(task_id=task.id, job_id=task.job.id, workload=task.workload, success=success,
+                              output_path=write_worker_output(tmp_path, task, delivered),
+                              failed_years=YearSet(failed_years), year_details=year_details)
+    return job_queue.finish_task(request)
+
+def test_failed_years_are_retried_and_the_others_get_credit(job_queue, tmp_path):
+    job = make_job(tmp_path, 4)
+    job_queue.add_job(job)
+    task = job_queue.assign_task("w1", 4)
+    assert finish(job_queue, tmp_path, task, failed_years=[2])
+    assert task.status == TaskStatus.FAILED
+    assert job.get_succeeded_years() == YearSet([0, 1, 3])
+    mc_ind_path = os.path.join(job.output_dir, "economy", "mc-ind")
+    assert sorted(os.listdir(mc_ind_path)) == ["00001", "00002", "00004"]
+    assert os.path.islink(os.path.join(mc_ind_path, "00001"))
+    assert job.percentage_complete == 75
+
+    retry = job_queue.assign_task("w2", 4)
+    assert retry.workload == YearSet([2])
+    assert finish(job_queue, tmp_path, retry)
+    assert retry.status == TaskStatus.COMPLETED and job.percentage_complete == 100
+    assert job_queue.get_job_by_id(job.id).finished_at is not None
+    assert not finish(job_queue, tmp_path, retry)  # a repeated report is ignored
+
+def test_a_run_that_did_not_end_gracefully_fails_all_years(job_queue, tmp_path):
+    job = make_job(tmp_path, 3)
+    job_queue.add_job(job)
+    task = job_queue.assign_task("w1", 3)
+    # the per-year report is empty, the output is there, but the solver log says the run broke off
+    assert finish(job_queue, tmp_path, task, success=False)
+    assert task.status == TaskStatus.FAILED and task.failed_years == YearSet(range(3))
+    assert job.get_succeeded_years() == YearSet() and job.percentage_complete == 0
+    assert not os.path.exists(os.path.join(job.output_dir, "economy", "mc-ind", "00001"))
+    assert job_queue.assign_task("w1", 3).workload == YearSet(range(3))
+
+def test_years_are_given_up_after_max_attempts(job_queue, tmp_path):
+    job = make_job(tmp_path, 2)
+    job_queue.add_job(job)
+    task = job_queue.assign_task("w1", 2)
+    finish(job_queue, tmp_path, task, failed_years=[1])
+    for attempt in range(2, MAX_YEAR_ATTEMPTS + 1):
+        assert job.get_given_up_years() == YearSet()
+        task = job_queue.assign_task("w1", 2)
+        assert task.workload == YearSet([1])
+        finish(job_queue, tmp_path, task, success=attempt % 2 == 0, failed_years=[1])
+    assert job.get_given_up_years() == YearSet([1])
+    assert job.percentage_complete == 100  # given up years count as done, the job finishes
+    assert job_queue.assign_task("w1", 2) is None
+
+def test_a_repeated_task_request_gets_the_same_answer(job_queue, tmp_path):
+    job = make_job(tmp_path, 4)
+    job_queue.add_job(job)
+    task = job_queue.assign_task("w1", 2, request_id="r1")
+    # the answer got lost on the way back, the worker retries the same request
+    assert job_queue.assign_task("w1", 2, request_id="r1") is task
+    assert len(job.tasks) == 1
+    assert job_queue.assign_task("w1", 2, request_id="r2").workload == YearSet([2, 3])
+
+def test_years_of_a_task_whose_lease_ran_out_are_handed_out_again(job_queue, tmp_path):
+    job_queue.task_lease_seconds = 60
+    job = make_job(tmp_path, 2)
+    job_queue.add_job(job)
+    task = job_queue.assign_task("w1", 2)
+    assert job_queue.assign_task("w2", 2) is None
+    task.created_at = time.time() - 61  # the worker died
+    retry = job_queue.assign_task("w2", 2)
+    assert task.status == TaskStatus.FAILED and retry.workload == YearSet([0, 1])
+    assert not finish(job_queue, tmp_path, task)  # the late report is ignored
+
+def test_years_that_can_not_be_linked_are_copied_in_the_background(job_queue, tmp_path, monkeypatch):
+    def refuse_symlink(*args, **kwargs):
+        raise OSError("symbolic links are not allowed")
+    monkeypatch.setattr(os, "symlink", refuse_symlink)
+    job = make_job(tmp_path, 2)
+    job_queue.add_job(job)
+    task = job_queue.assign_task("w1", 2)
+    release = threading.Event()
+    job_queue.synthesis_executor.submit(release.wait)  # hold the background work
+    assert finish(job_queue, tmp_path, task)
+    year_folder_path = os.path.join(job.output_dir, "economy", "mc-ind", "00001")
+    assert not os.path.exists(year_folder_path) and job.year_index == {}
+
+    release.set()
+    job_queue.synthesis_executor.submit(lambda: None).result()
+    assert os.path.isdir(os.path.join(year_folder_path, "areas", "de")) and not os.path.islink(year_folder_path)
+    assert [entry["method"] for entry in job.get_year_index()] == ["copy", "copy"]
+    copied = [event for event in job_queue.events.history if event["type"] == "years_copied"]
+    assert [(event["years"], event["failed_years"], event["years_done"]) for event in copied] == [("0-1", "", 2)]
+
+def test_year_index_filters_on_status_and_merges_the_year_details(job_queue, tmp_path):
+    job = make_job(tmp_path, 5)
+    job_queue.add_job(job)
+    task = job_queue.assign_task("w1", 3)
+    details = {0: {"size_bytes": 100, "file_count": 2, "sha256": "ab" * 32}, 1: {"size_bytes": 50, "file_count": 1}}
+    finish(job_queue, tmp_path, task, failed_years=[2], year_details=details)
+    for attempt in range(1, MAX_YEAR_ATTEMPTS):
+        finish(job_queue, tmp_path, job_queue.assign_task("w2", 1), failed_years=[2])
+    job_queue.assign_task("w3", 1)  # year 3 is running, year 4 is not handed out yet
+
+    by_status = {status: [entry["year"] for entry in job.get_year_index(status)]
+                 for status in ("done", "missing", "given_up", "failed")}
+    assert by_status == {"done": [0, 1], "missing": [3, 4], "given_up": [2], "failed": [2]}
+    year_0, year_1, year_2, year_3, year_4 = job.get_year_index()
+    assert (year_0["folder"], year_0["task_id"], year_0["worker"], year_0["method"]) == ("00001", task.id, "w1", "symlink")
+    assert year_0["path"] == os.path.join(job.output_dir, "economy", "mc-ind", "00001")
+    assert (year_0["size_bytes"], year_0["file_count"], year_0["sha256"]) == (100, 2, "ab" * 32)
+    assert year_1["sha256"] is None and year_1["failed_attempts"] == 0
+    assert year_2["failed_attempts"] == MAX_YEAR_ATTEMPTS and "path" not in year_2
+    assert year_4 == {"year": 4, "folder": "00005", "status": "missing", "failed_attempts": 0}
+
+def test_output_is_linked_in_the_folder_of_the_simulation_mode(job_queue, tmp_path):
+    job = make_job(tmp_path, 2, mode="Adequacy")
+    job_queue.add_job(job)
+    finish(job_queue, tmp_path, job_queue.assign_task("w1", 2))
+    assert sorted(os.listdir(os.path.join(job.output_dir, "adequacy", "mc-ind"))) == ["00001", "00002"]
+    assert job.get_year_index("done")[0]["path"] == os.path.join(job.output_dir, "adequacy", "mc-ind", "00001")
+
+    job.variant = {"name": "eco", "ini_overrides": {"settings/generaldata.ini": {"general": {"mode": "Economy"}}}}
+    assert job.get_output_mode_folder() == "economy"
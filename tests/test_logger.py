@@ -0,0 +1,43 @@
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from utils.logger import ComponentLevelFilter, JsonFormatter, create_file_handler
+
+def make_record(name, module, level, message="message"):
+    record = logging.LogRecord(name, level, f"{module}.py", 1, message, None, None)
+    assert record.module == module
+    return record
+
+def test_levels_per_module_and_logger_name():
+    level_filter = ComponentLevelFilter({"default": "info", "jobs": "warning", "urllib3": "error"})
+    assert level_filter.lowest_level == logging.INFO
+    assert level_filter.filter(make_record("root", "main_driver", logging.INFO))
+    assert not level_filter.filter(make_record("root", "main_driver", logging.DEBUG))
+    assert not level_filter.filter(make_record("root", "jobs", logging.INFO))
+    assert level_filter.filter(make_record("root", "jobs", logging.WARNING))
+    # child loggers use the level of their closest configured parent
+    assert not level_filter.filter(make_record("urllib3.connectionpool", "connectionpool", logging.WARNING))
+    assert level_filter.filter(make_record("uvicorn.access", "h11_impl", logging.INFO))
+
+def test_json_lines_file_rotates_on_size():
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "driver.log.txt")
+        handler = create_file_handler(log_path, {"log_format": "json", "log_max_bytes": 500, "log_backup_count": 2})
+        for i in range(20):
+            handler.emit(make_record("root", "jobs", logging.INFO, f"line {i}"))
+        handler.close()
+        assert sorted(os.listdir(tmp)) == ["driver.log.txt", "driver.log.txt.1", "driver.log.txt.2"]
+        with open(log_path, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        assert entries[-1]["message"] == "line 19"
+        assert (entries[-1]["level"], entries[-1]["module"]) == ("INFO", "jobs")
+
+def test_json_formatter_keeps_tracebacks():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("root", logging.ERROR, "jobs.py", 1, "failed", None, sys.exc_info())
+    assert "ValueError: boom" in json.loads(JsonFormatter().format(record))["message"]
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+import os
+import time
+
+from driver.jobs import Job, JobQueue
+from driver.retention import RetentionService
+from utils.year_set import YearSet
+
+def make_config(tmp_path, **policy):
+    for name in ("zip", "study", "state"):
+        os.makedirs(tmp_path / name, exist_ok=True)
+    return {"new_jobs_zip_folder_path": str(tmp_path / "zip"), "new_jobs_study_folder_path": str(tmp_path / "study"),
+            **policy}
+
+def make_job(tmp_path, name, submitter, hours_ago):
+    """A finished job with a zip, inputs and results of 100 bytes each."""
+    (tmp_path / "zip" / f"{name}.zip").write_bytes(b"z" * 100)
+    study_path = tmp_path / "study" / name
+    os.makedirs(study_path / "input")
+    os.makedirs(study_path / "output" / "run")
+    (study_path / "input" / "data.txt").write_bytes(b"i" * 100)
+    (study_path / "output" / "run" / "values.txt").write_bytes(b"r" * 100)
+    job = Job(submitter, 50, str(tmp_path / "zip" / f"{name}.zip"))
+    job.study_path = str(study_path)
+    job.output_dir = str(study_path / "output" / "run")
+    job.workload = YearSet()
+    job.finished_at = time.time() - hours_ago * 3600
+    return job
+
+def test_keep_jobs_per_submitter_removes_older_jobs_but_never_queued_ones(tmp_path):
+    config = make_config(tmp_path, retention_keep_jobs_per_submitter=1)
+    job_queue = JobQueue(str(tmp_path / "state"))
+    old, recent, other = (make_job(tmp_path, name, submitter, hours_ago)
+                          for name, submitter, hours_ago in (("old", "a", 5), ("recent", "a", 1), ("other", "b", 9)))
+    queued = make_job(tmp_path, "queued", "a", 0)
+    queued.finished_at = None
+    for job in (old, recent, other):
+        job_queue.archive.add(job)
+    job_queue.add_job(queued)
+
+    report = RetentionService(job_queue, config).run()
+    assert {(action["kind"], os.path.basename(action["path"])) for action in report["actions"]} == \
+        {("zip", "old.zip"), ("inputs", "old"), ("results", "run")}
+    assert report["freed_bytes"] == 300
+    assert not os.path.exists(tmp_path / "zip" / "old.zip") and not os.path.exists(tmp_path / "study" / "old")
+    assert list(job_queue.archive.records) == [recent.id, other.id]
+    assert job_queue.get_job_by_id(old.id) is None
+    assert all(os.path.exists(tmp_path / "study" / name) for name in ("recent", "other", "queued"))
+
+def test_disk_budget_frees_zips_then_inputs_then_results(tmp_path):
+    config = make_config(tmp_path, retention_disk_budget_gb=550 / 1024 ** 3)
+    job_queue = JobQueue(str(tmp_path / "state"))
+    jobs = [make_job(tmp_path, f"job{i}", "a", hours_ago) for i, hours_ago in enumerate((3, 2, 1))]
+    for job in jobs:
+        job_queue.archive.add(job)
+    service = RetentionService(job_queue, config)
+
+    dry_run = service.run(dry_run=True)
+    assert [(action["kind"], action["job_ids"]) for action in dry_run["actions"]] == \
+        [("zip", [jobs[0].id]), ("zip", [jobs[1].id]), ("zip", [jobs[2].id]), ("inputs", [jobs[0].id])]
+    assert os.path.exists(tmp_path / "zip" / "job0.zip") and service.last_run is None
+
+    report = service.run()
+    assert (report["usage_bytes_before"], report["usage_bytes_after"]) == (900, 500)
+    assert os.listdir(tmp_path / "zip") == []
+    assert sorted(os.listdir(tmp_path / "study" / "job0")) == ["output"]
+    assert job_queue.archive.records[jobs[0].id].deleted_storage == {"zip", "inputs"}
+    # the deletions survive a restart of the driver
+    job = JobQueue(str(tmp_path / "state")).get_job_by_id(jobs[0].id)
+    assert job.deleted_storage == {"zip", "inputs"} and job.is_backed_by_files()
+    assert list(job_queue.archive.records) == [job.id for job in jobs]
+    assert service.run()["actions"] == []
+
+def test_orphans_are_removed_after_a_grace_period(tmp_path):
+    config = make_config(tmp_path)
+    (tmp_path / "zip" / "failed_validation.zip").write_bytes(b"z")
+    (tmp_path / "zip" / "uploading.zip.part").write_bytes(b"z")
+    two_days_ago = (datetime.now() - timedelta(days=2)).timestamp()
+    os.utime(tmp_path / "zip" / "failed_validation.zip", (two_days_ago, two_days_ago))
+    service = RetentionService(JobQueue(str(tmp_path / "state")), config)
+    assert [action["reason"] for action in service.run()["actions"]] == ["orphan"]
+    assert os.listdir(tmp_path / "zip") == ["uploading.zip.part"]
+    assert service.get_status()["deleted_bytes"] == 1
+
+def test_blobs_no_study_links_to_are_collected_after_a_grace_period(tmp_path):
+    config = make_config(tmp_path, blob_store_folder_path=str(tmp_path / "blobs"))
+    os.makedirs(tmp_path / "blobs" / "ab")
+    for name in ("ab01", "ab02", "ab03"):
+        (tmp_path / "blobs" / "ab" / name).write_bytes(b"b" * 10)
+    os.makedirs(tmp_path / "study" / "materialised")
+    os.link(tmp_path / "blobs" / "ab" / "ab01", tmp_path / "study" / "materialised" / "data.txt")
+    two_days_ago = (datetime.now() - timedelta(days=2)).timestamp()
+    for name in ("ab01", "ab02"):
+        os.utime(tmp_path / "blobs" / "ab" / name, (two_days_ago, two_days_ago))
+
+    service = RetentionService(JobQueue(str(tmp_path / "state")), config)
+    report = service.run()
+    assert [(action["kind"], action["reason"], os.path.basename(action["path"])) for action in report["actions"]
+            if action["kind"] == "blob"] == [("blob", "blob", "ab02")]
+    assert sorted(os.listdir(tmp_path / "blobs" / "ab")) == ["ab01", "ab03"]  # linked, and uploaded recently
+    assert service.get_status()["history"][0]["bytes"] == 10
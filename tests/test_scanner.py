@@ -0,0 +1,45 @@
+import os
+import tempfile
+
+from utils.scanner import PathExistenceCache, scan_tree
+
+def make_tree(root):
+    for rel_path, contents in {"a.txt": "aaa", "input/b.txt": "bb", "input/deep/c.tmp": "c",
+                               "output/run/log.txt": "excluded"}.items():
+        path = os.path.join(root, *rel_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(contents)
+    os.makedirs(os.path.join(root, "user", "empty"))
+
+def test_scan_lists_files_sorted_with_sizes():
+    with tempfile.TemporaryDirectory() as tmp:
+        make_tree(tmp)
+        tree = scan_tree(tmp, max_workers=4)
+        assert [entry.path for entry in tree.files] == ["a.txt", "input/b.txt", "input/deep/c.tmp", "output/run/log.txt"]
+        assert tree.total_size == 3 + 2 + 1 + 8
+        assert tree.empty_dirs == ["user/empty"]
+        assert all(entry.mtime > 0 for entry in tree.files)
+
+def test_scan_exclusion_patterns():
+    with tempfile.TemporaryDirectory() as tmp:
+        make_tree(tmp)
+        tree = scan_tree(tmp, ["output", "*.tmp"])
+        assert [entry.path for entry in tree.files] == ["a.txt", "input/b.txt"]
+        tree = scan_tree(tmp, ["input/*"])
+        assert [entry.path for entry in tree.files] == ["a.txt", "output/run/log.txt"]
+
+def test_absolute_path_of_entry():
+    with tempfile.TemporaryDirectory() as tmp:
+        make_tree(tmp)
+        tree = scan_tree(tmp)
+        assert os.path.isfile(tree.get_absolute_path("input/deep/c.tmp"))
+
+def test_path_existence_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        make_tree(tmp)
+        cache = PathExistenceCache()
+        assert cache.exists(os.path.join(tmp, "a.txt"))
+        assert cache.exists(os.path.join(tmp, "input"))
+        assert not cache.exists(os.path.join(tmp, "missing.zip"))
+        assert not cache.exists(os.path.join(tmp, "no_such_folder", "x"))
@@ -0,0 +1,126 @@
+import os
+import tempfile
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+import pytest
+
+from utils.compression import CompressionProfile
+from utils.smart_zip import (ZipMethod, identify_best_zip_method, smart_unzip_file, smart_zip_folder,
+                             stream_zip_folder, zip_with_builtin, zip_with_builtin_parallel)
+
+def make_study(root):
+    files = {
+        "study.antares": "[antares]\nversion = 880\n",
+        "input/areas/list.txt": "DE\nFR\n",
+        "input/load/series/load_de.txt": "1\t2\t3\n" * 100,
+        "settings/generaldata.ini": "[general]\nnbyears = 2\n",
+        "output/20250101-0000eco/simulation.log": "must be excluded",
+    }
+    for rel_path, contents in files.items():
+        path = os.path.join(root, *rel_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(contents)
+    os.makedirs(os.path.join(root, "user", "expansion"))
+    return files
+
+def read_tree(root):
+    tree = {}
+    for folder_path, folder_names, file_names in os.walk(root):
+        for file_name in file_names:
+            path = os.path.join(folder_path, file_name)
+            with open(path, encoding="utf-8") as f:
+                tree[os.path.relpath(path, root).replace(os.sep, "/")] = f.read()
+    return tree
+
+def test_preferred_method_overrides_detection():
+    assert identify_best_zip_method(None, "zipfile") == ZipMethod.BUILTIN
+    assert identify_best_zip_method(None, "zipfile_parallel") == ZipMethod.BUILTIN_PARALLEL
+
+@pytest.mark.parametrize("zip_function", [zip_with_builtin, zip_with_builtin_parallel])
+def test_zip_excludes_folders_and_keeps_empty_dirs(zip_function):
+    with tempfile.TemporaryDirectory() as tmp:
+        study = os.path.join(tmp, "study")
+        make_study(study)
+        zip_path = os.path.join(tmp, "study.zip")
+        zip_function(study, zip_path, {"output"})
+        with ZipFile(zip_path) as zipf:
+            names = zipf.namelist()
+        assert "study.antares" in names
+        assert "input/load/series/load_de.txt" in names
+        assert "user/expansion/" in names
+        assert not any(name.startswith("output") for name in names)
+
+def test_parallel_and_serial_archives_hold_the_same_members():
+    with tempfile.TemporaryDirectory() as tmp:
+        study = os.path.join(tmp, "study")
+        make_study(study)
+        zip_with_builtin(study, os.path.join(tmp, "serial.zip"), {"output"})
+        zip_with_builtin_parallel(study, os.path.join(tmp, "parallel.zip"), {"output"}, max_workers=2)
+        with ZipFile(os.path.join(tmp, "serial.zip")) as serial, ZipFile(os.path.join(tmp, "parallel.zip")) as parallel:
+            assert serial.namelist() == parallel.namelist()
+            for name in serial.namelist():
+                assert serial.read(name) == parallel.read(name)
+
+@pytest.mark.parametrize("method", ["zipfile", "zipfile_parallel"])
+def test_round_trip(method):
+    with tempfile.TemporaryDirectory() as tmp:
+        study = os.path.join(tmp, "study")
+        files = make_study(study)
+        zip_path = smart_zip_folder(study, os.path.join(tmp, "copy.zip"), ["output"], preferred_method=method)
+        os.makedirs(os.path.join(tmp, "extracted"))
+        extracted = smart_unzip_file(zip_path, os.path.join(tmp, "extracted"), preferred_method=method)
+        expected = {k: v for k, v in files.items() if not k.startswith("output")}
+        assert read_tree(extracted) == expected
+        assert os.path.isdir(os.path.join(extracted, "user", "expansion"))
+
+def test_stream_zip_folder_yields_a_valid_archive():
+    with tempfile.TemporaryDirectory() as tmp:
+        study = os.path.join(tmp, "study")
+        files = make_study(study)
+        zip_path = os.path.join(tmp, "streamed.zip")
+        with open(zip_path, "wb") as f:
+            for chunk in stream_zip_folder(study, ["output"], chunk_size=64):
+                assert chunk
+                f.write(chunk)
+        with ZipFile(zip_path) as zipf:
+            assert zipf.testzip() is None
+            assert zipf.read("input/areas/list.txt").decode() == files["input/areas/list.txt"]
+            assert not any(name.startswith("output") for name in zipf.namelist())
+
+def test_stream_zip_folder_stops_when_consumer_stops():
+    with tempfile.TemporaryDirectory() as tmp:
+        study = os.path.join(tmp, "study")
+        make_study(study)
+        stream = stream_zip_folder(study, chunk_size=16)
+        next(stream)
+        stream.close()  # must not hang the producer thread
+
+@pytest.mark.parametrize("method", ["zipfile", "zipfile_parallel"])
+def test_compression_profile_deflates_text_files(method):
+    with tempfile.TemporaryDirectory() as tmp:
+        study = os.path.join(tmp, "study")
+        make_study(study)
+        zip_path = smart_zip_folder(study, os.path.join(tmp, "copy.zip"), ["output"], preferred_method=method,
+                                    compression_profile=CompressionProfile.FAST)
+        with ZipFile(zip_path) as zipf:
+            series = zipf.getinfo("input/load/series/load_de.txt")
+            assert series.compress_type == ZIP_DEFLATED
+            assert series.compress_size < series.file_size
+            assert zipf.getinfo("study.antares").compress_type == ZIP_STORED
+
+def test_parallel_zip_deflates_on_the_reader_threads_like_zipfile():
+    with tempfile.TemporaryDirectory() as tmp:
+        study = os.path.join(tmp, "study")
+        make_study(study)
+        for method in ("zipfile", "zipfile_parallel"):
+            smart_zip_folder(study, os.path.join(tmp, f"{method}.zip"), ["output"], preferred_method=method,
+                             compression_profile=CompressionProfile.BALANCED)
+        with ZipFile(os.path.join(tmp, "zipfile.zip")) as serial, \
+                ZipFile(os.path.join(tmp, "zipfile_parallel.zip")) as parallel:
+            assert parallel.testzip() is None
+            for member in serial.infolist():
+                parallel_member = parallel.getinfo(member.filename)
+                assert (parallel_member.compress_type, parallel_member.CRC, parallel_member.compress_size) == \
+                    (member.compress_type, member.CRC, member.compress_size)
+                assert parallel.read(member.filename) == serial.read(member.filename)
@@ -0,0 +1,47 @@
+import threading
+import time
+
+from driver.jobs import Job, JobQueue
+from driver.staging import choose_staging_workers
+from utils.rate_limit import RateLimiter, copy_file
+from utils.year_set import YearSet
+
+def test_idle_workers_are_chosen_first_as_many_as_the_job_fills():
+    workers = {"big": 16, "small": 4, "idle": 4}
+    assert choose_staging_workers(8, 0, workers, {"idle"}) == ["idle", "big"]
+    assert choose_staging_workers(100, 0, workers, set()) == ["big", "idle", "small"]
+    # a job behind more than the horizon of work is not staged yet, nor is one without available years
+    assert choose_staging_workers(8, 49, workers, set()) == []
+    assert choose_staging_workers(0, 0, workers, set()) == []
+
+def test_hints_follow_the_queue_and_first_tasks_measure_the_hit_rate(tmp_path):
+    job_queue = JobQueue(str(tmp_path))
+    for worker in ("a", "b"):
+        assert job_queue.assign_task(worker, 4) is None  # both idle
+    urgent, later, last = (Job("user", priority, None, study_name=name)
+                           for priority, name in ((10, "urgent"), (50, "later"), (90, "last")))
+    urgent.workload, later.workload, last.workload = YearSet(range(4)), YearSet(range(100)), YearSet(range(4))
+    job_queue.add_jobs([later, urgent, last])
+
+    # the last job is more than two rounds of the fleet of 12 cores away
+    assert [job.study_name for job in job_queue.get_staging_hints("a", 4)] == ["urgent", "later"]
+    assert [job.study_name for job in job_queue.get_staging_hints("b", 4)] == ["later"]
+    assert [job.study_name for job in job_queue.get_staging_hints("c", 4)] == ["later"]
+
+    assert job_queue.assign_task("a", 4, staged={"urgent", "later"}).job is urgent
+    assert job_queue.assign_task("b", 4).job is later
+    assert job_queue.assign_task("a", 4, staged={"urgent", "later"}).job is later
+    assert [job.study_name for job in job_queue.get_staging_hints("a", 4)] == []  # served already
+    assert job_queue.staging.summary() == {"hints_sent": 4, "first_tasks": 3, "hinted_first_tasks": 3,
+                                           "staged_first_tasks": 2, "hit_rate": 0.667}
+
+def test_copy_is_held_to_the_rate_until_the_limit_is_lifted(tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"x" * 3 * 1024 * 1024)
+    rate_limiter = RateLimiter.from_mbps(8)  # 1 MB/s, the copy would take 3 seconds
+    threading.Timer(0.2, rate_limiter.lift).start()
+    start = time.monotonic()
+    copy_file(str(source), str(tmp_path / "target.bin"), rate_limiter)
+    assert time.monotonic() - start < 2
+    assert (tmp_path / "target.bin").read_bytes() == source.read_bytes()
+    assert RateLimiter.from_mbps(None).bytes_per_second is None
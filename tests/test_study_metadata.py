@@ -0,0 +1,39 @@
+import os
+import tempfile
+
+from utils.antares import AntaresStudy
+from utils.study_metadata import read_study_metadata
+
+def make_study(root, generaldata):
+    os.makedirs(os.path.join(root, "settings"))
+    os.makedirs(os.path.join(root, "input", "areas"))
+    with open(os.path.join(root, "study.antares"), "w") as f:
+        f.write("[antares]\nversion = 880\ncaption = test\n")
+    with open(os.path.join(root, "settings", "generaldata.ini"), "w") as f:
+        f.write(generaldata)
+    with open(os.path.join(root, "input", "areas", "list.txt"), "w") as f:
+        f.write("DE\nFR\n")
+
+def test_metadata_is_parsed_once_and_shared():
+    with tempfile.TemporaryDirectory() as tmp:
+        make_study(tmp, "[general]\nmode = Economy\nnbyears = 5\nyear-by-year = true\n\n"
+                        "[playlist]\nplaylist_year - = 1\n")
+        metadata = read_study_metadata(tmp)
+        assert metadata.antares_version == "880"
+        assert list(metadata.playlist) == [0, 2, 3, 4]
+        assert metadata.output_mode_folder == "economy"
+        assert metadata.year_by_year
+        assert metadata.area_ids == ("de", "fr")
+        assert read_study_metadata(tmp) is metadata
+        assert AntaresStudy(tmp).metadata is metadata
+
+def test_set_playlist_invalidates_cached_metadata():
+    with tempfile.TemporaryDirectory() as tmp:
+        make_study(tmp, "[general]\nnbyears = 20\n")
+        study = AntaresStudy(tmp)
+        assert str(study.get_active_playlist_years()) == "0-19"
+        study.set_playlist([7])
+        assert list(AntaresStudy(tmp).get_active_playlist_years()) == [7]
+        # same size rewrite, possibly within the timestamp resolution of the file system
+        study.set_playlist([8])
+        assert list(study.get_active_playlist_years()) == [8]
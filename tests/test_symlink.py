@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+from utils import symlink
+from utils.symlink import create_link, create_links
+
+def make_year_folders(root, years):
+    targets = []
+    for year in years:
+        target = os.path.join(root, "worker", str(year).zfill(5))
+        os.makedirs(target)
+        with open(os.path.join(target, "values-hourly.txt"), "w") as f:
+            f.write(str(year))
+        targets.append(target)
+    return targets
+
+def test_links_are_created_in_one_batch_and_existing_ones_kept():
+    with tempfile.TemporaryDirectory() as tmp:
+        where = os.path.join(tmp, "mc-ind")
+        os.makedirs(where)
+        targets = make_year_folders(tmp, [1, 2, 3])
+        os.symlink(targets[1], os.path.join(where, "00002"), target_is_directory=True)
+        cwd = os.getcwd()
+        results = create_links(where, targets)
+        assert os.getcwd() == cwd
+        assert [result.method for result in results] == ["symlink", "exists", "symlink"]
+        with open(os.path.join(where, "00003", "values-hourly.txt")) as f:
+            assert f.read() == "3"
+
+def test_missing_target_is_reported_per_link(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        where = os.path.join(tmp, "mc-ind")
+        os.makedirs(where)
+        targets = make_year_folders(tmp, [1]) + [os.path.join(tmp, "worker", "00009")]
+
+        def refuse(*args, **kwargs):
+            raise OSError("symbolic links not permitted")
+        monkeypatch.setattr(symlink.os, "symlink", refuse)
+        results = create_links(where, targets)
+        assert results[0].ok and results[0].method == "copy"
+        assert not results[1].ok and "00009" in results[1].error
+        assert os.path.isfile(os.path.join(where, "00001", "values-hourly.txt"))
+        assert not os.path.exists(os.path.join(where, "00009"))
+
+def test_an_existing_entry_that_is_not_a_link_to_the_target_is_replaced_by_a_copy():
+    with tempfile.TemporaryDirectory() as tmp:
+        where = os.path.join(tmp, "mc-ind")
+        os.makedirs(where)
+        target, elsewhere = make_year_folders(tmp, [1, 2])
+        link_path = os.path.join(where, "00001")
+        os.symlink(elsewhere, link_path, target_is_directory=True)  # left over from another run
+
+        refused = create_link(link_path, target, allow_copy=False)
+        assert not refused.ok and "not a link to" in refused.error
+        copied = create_link(link_path, target)
+        assert copied.ok and copied.method == "copy" and not os.path.islink(link_path)
+        with open(os.path.join(link_path, "values-hourly.txt")) as f:
+            assert f.read() == "1"
+        assert os.path.isfile(os.path.join(elsewhere, "values-hourly.txt"))  # the stale link target is untouched
@@ -0,0 +1,91 @@
+import os
+import pickle
+import shutil
+import tempfile
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from driver.jobs import Job, Task, TaskStatus
+from driver.synthesis import McAllSynthesizer, RunningStatistics
+from utils.antares_output import read_output_table
+from utils.year_set import YearSet
+
+HEADER = [
+    "DE\tarea\tva\thourly",
+    "\tVARIABLES\tBEGIN\tEND",
+    "\t2\t1\t3",
+    "",
+    "DE\thourly\t\t\t\tOV. COST\tLOAD",
+    "\t\t\t\t\tEuro\tMWh",
+    "\tindex\tday\tmonth\thour\tEXP\tEXP",
+]
+
+def write_year(folder, year, rows):
+    table_path = os.path.join(folder, str(year + 1).zfill(5), "areas", "de", "values-hourly.txt")
+    os.makedirs(os.path.dirname(table_path))
+    with open(table_path, "w") as f:
+        f.write("\n".join(HEADER) + "\n")
+        for i, (cost, load) in enumerate(rows):
+            f.write(f"\t{i + 1}\t01\tJAN\t{i:02d}:00\t{cost}\t{load}\n")
+
+def test_running_statistics_match_numpy():
+    samples = np.random.default_rng(0).normal(size=(10, 4, 3))
+    statistics = RunningStatistics((4, 3))
+    for sample in samples:
+        statistics.add(sample)
+    assert np.allclose(statistics.mean, samples.mean(axis=0))
+    assert np.allclose(statistics.std, samples.std(axis=0))
+    assert np.array_equal(statistics.min, samples.min(axis=0))
+    assert np.array_equal(statistics.max, samples.max(axis=0))
+
+def test_synthesis_writes_mc_all_tables():
+    with tempfile.TemporaryDirectory() as tmp:
+        mc_ind = os.path.join(tmp, "mc-ind")
+        write_year(mc_ind, 0, [(10, 1), (20, "N/A"), (30, 3)])
+        write_year(mc_ind, 1, [(30, 3), (40, "N/A"), (50, 5)])
+        synthesizer = McAllSynthesizer()
+        synthesizer.add_year(0, os.path.join(mc_ind, "00001"))
+        # a saved and loaded synthesizer keeps its statistics, adding a year twice is ignored
+        synthesizer.save(os.path.join(tmp, "synthesis.npz"))
+        synthesizer = McAllSynthesizer.load(os.path.join(tmp, "synthesis.npz"))
+        synthesizer.add_year(0, os.path.join(mc_ind, "00001"))
+        synthesizer.add_year(1, os.path.join(mc_ind, "00002"))
+        synthesizer.write(os.path.join(tmp, "mc-all"))
+
+        table = read_output_table(os.path.join(tmp, "mc-all", "areas", "de", "values-hourly.txt"))
+        assert synthesizer.added_years == {0, 1}
+        assert table.variable_names == ["OV. COST"] * 4 + ["LOAD"] * 4
+        assert table.header[6][5:] == ["EXP", "std", "min", "max"] * 2
+        assert table.values[0].tolist() == [20, 10, 10, 30, 2, 1, 1, 3]
+        assert table.time_columns[2] == ["", "3", "01", "JAN", "02:00"]
+        assert np.isnan(table.values[1, 4])
+
+def test_synthesis_state_is_saved_next_to_the_output_and_not_pickled_with_the_job(tmp_path):
+    os.makedirs(tmp_path / "settings")
+    (tmp_path / "study.antares").write_text("[antares]\nversion = 880\ncaption = test\n")
+    (tmp_path / "settings" / "generaldata.ini").write_text("[general]\nmode = Adequacy\nnbyears = 2\n")
+    job = Job("user", 50, None, study_name="study")
+    job.study_path, job.output_dir = str(tmp_path), str(tmp_path / "output" / "run")
+    job.workload = YearSet(range(2))
+    mc_ind = os.path.join(job.output_dir, "adequacy", "mc-ind")
+    write_year(mc_ind, 0, [(10, 1)])
+    write_year(mc_ind, 1, [(30, 3)])
+    task = Task(job, "worker")
+    task.workload, task.status = YearSet(range(2)), TaskStatus.COMPLETED
+    job.tasks.append(task)
+    job.synthesize_years([0], finalize=False)
+    assert os.path.isfile(job.get_synthesis_state_path())
+
+    # a restarted driver has no synthesizer in the pickle and resumes from the saved state,
+    # the output of year 1 is only needed while it is added
+    shutil.rmtree(os.path.join(mc_ind, "00001"))
+    restarted = pickle.loads(pickle.dumps(job))
+    assert restarted.synthesizer is None
+    restarted.percentage_complete = 100
+    restarted.resume_synthesis()
+    assert restarted.synthesizer is None  # released once the mc-all tables are written
+    table = read_output_table(os.path.join(job.output_dir, "adequacy", "mc-all", "areas", "de", "values-hourly.txt"))
+    assert table.values[0].tolist() == [20, 10, 10, 30, 2, 1, 1, 3]
+    assert McAllSynthesizer.load(job.get_synthesis_state_path()).is_written
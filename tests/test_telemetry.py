@@ -0,0 +1,32 @@
+import subprocess
+import sys
+
+from utils.telemetry import ResourceSampler
+
+def test_cpu_memory_and_wall_time_of_the_process_tree():
+    # a child that burns cpu and holds 50 MB, started by a parent that only waits for it
+    child = "x = bytearray(50 * 1024 * 1024); import time; end = time.time() + 0.6\nwhile time.time() < end: pass"
+    parent = f"import subprocess, sys; subprocess.run([sys.executable, '-c', {child!r}])"
+    process = subprocess.Popen([sys.executable, "-c", parent])
+    sampler = ResourceSampler(process.pid, cores=2, interval=0.05)
+    sampler.start()
+    process.wait()
+    summary = sampler.stop()
+
+    assert len(sampler.cpu_seconds_per_pid) >= 2  # the child was sampled too
+    assert summary["wall_time_seconds"] >= 0.5
+    assert 0.3 <= summary["cpu_seconds"] <= summary["wall_time_seconds"] * 2
+    assert 0 < summary["cpu_utilisation"] <= 1
+    assert summary["peak_rss_bytes"] >= 50 * 1024 * 1024
+
+def test_years_are_registered_in_new_output_folders_only(tmp_path):
+    (tmp_path / "previous-run" / "economy" / "mc-ind" / "00001").mkdir(parents=True)
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+    sampler = ResourceSampler(finished.pid, cores=1, output_root=str(tmp_path), interval=60)
+    sampler.start()
+    for year_folder in ("00003", "00004", "mc-var"):
+        (tmp_path / "20250101-0000eco" / "economy" / "mc-ind" / year_folder).mkdir(parents=True)
+    summary = sampler.stop()  # the last sample picks up the years written after the first one
+    assert sorted(summary["per_year"]) == [2, 3]
+    assert summary["cpu_seconds"] == 0 and summary["peak_rss_bytes"] == 0  # the process was gone already
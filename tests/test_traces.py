@@ -0,0 +1,40 @@
+import os
+import pickle
+
+from driver.jobs import Job, JobQueue, Task, TaskStatus
+from utils.year_set import YearSet
+
+def make_job(tmp_path) -> Job:
+    study_path = tmp_path / "study"
+    os.makedirs(study_path / "output" / "run")
+    job = Job("user", 50, None, study_name="study")
+    job.study_path, job.output_dir = str(study_path), str(study_path / "output" / "run")
+    job.workload = YearSet(range(2))
+    with job.tracer.span("prepare_job"):
+        pass
+    return job
+
+def test_spans_and_telemetry_are_kept_out_of_the_queue_file(tmp_path):
+    job_queue = JobQueue(str(tmp_path / "state"))
+    job = make_job(tmp_path)
+    job_queue.add_job(job)
+    task = Task(job, "w1")
+    task.workload, task.status = YearSet(range(2)), TaskStatus.COMPLETED
+    task.telemetry = {"wall_time_seconds": 4.0, "cores": 2, "per_year": {1: {"completed_after_seconds": 3.0}}}
+    task.spans = [{"name": "run_antares", "process": "w1", "start": 1.0, "end": 5.0, "bytes": None}]
+    job.tasks.append(task)
+    job_queue.traces.record_task(task)
+    with job.tracer.span("persist_state"):
+        job_queue.persist_state()
+
+    with open(job_queue.queue_file, "rb") as f:
+        persisted_job = pickle.load(f)["queue"][0][2]
+    assert persisted_job.tracer.spans == [] and persisted_job.tasks[0].telemetry is None
+    assert persisted_job.tasks[0].spans == []
+
+    restarted = JobQueue(str(tmp_path / "state"))
+    job = restarted.get_job_by_id(job.id)
+    assert [span["name"] for span in job.tracer.spans] == ["prepare_job", "persist_state"]
+    assert job.tasks[0].telemetry == task.telemetry and job.tasks[0].spans == task.spans
+    assert [span["name"] for span in job.get_timeline()] == ["run_antares", "prepare_job", "persist_state"]
+    assert restarted.get_seconds_per_year(job) == (4.0, "observed")
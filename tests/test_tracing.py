@@ -0,0 +1,30 @@
+import pytest
+
+from utils.tracing import Tracer, summarize_spans, to_chrome_trace
+
+def test_spans_record_duration_bytes_and_errors():
+    tracer = Tracer("worker1")
+    with tracer.span("copy_model", task_id="t1") as span:
+        span["bytes"] = 100
+    with pytest.raises(OSError):
+        with tracer.span("extract", task_id="t1"):
+            raise OSError("disk full")
+    copy, extract = tracer.spans
+    assert (copy["name"], copy["process"], copy["bytes"]) == ("copy_model", "worker1", 100)
+    assert copy["end"] >= copy["start"] and "error" not in copy
+    assert extract["error"] == "OSError('disk full')"
+
+def test_summary_and_chrome_trace():
+    spans = [
+        {"name": "prepare_job", "process": "driver", "start": 100.0, "end": 101.0, "bytes": 10},
+        {"name": "run_antares", "process": "w1", "start": 102.0, "end": 110.0, "bytes": None, "task_id": "t1"},
+        {"name": "run_antares", "process": "w2", "start": 103.0, "end": 105.0, "bytes": None, "task_id": "t2"},
+    ]
+    summary = summarize_spans(spans)
+    assert summary["makespan_seconds"] == 10.0
+    assert summary["stages"]["run_antares"] == {"count": 2, "seconds": 10.0, "bytes": 0}
+    events = to_chrome_trace(spans)["traceEvents"]
+    complete = [event for event in events if event["ph"] == "X"]
+    assert [(event["ts"], event["dur"]) for event in complete] == [(0, 1000000), (2000000, 8000000), (3000000, 2000000)]
+    names = {(event["pid"], event["args"]["name"]) for event in events if event["name"] == "process_name"}
+    assert names == {(1, "driver"), (2, "w1"), (3, "w2")}
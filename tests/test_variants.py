@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from driver.jobs import Job, JobQueue
+from utils.ini import robust_read_ini
+from utils.variants import (apply_ini_overrides, create_variant_study, get_variant_playlist, validate_variants,
+                            write_variant_files)
+from utils.year_set import YearSet
+
+def make_base_study(folder):
+    os.makedirs(folder / "settings")
+    os.makedirs(folder / "input" / "load" / "series")
+    os.makedirs(folder / "output" / "old_run")
+    (folder / "settings" / "generaldata.ini").write_text("[general]\nnbyears = 4\n\n[other]\nkey = 1\n")
+    (folder / "input" / "load" / "series" / "load_fr.txt").write_text("1\n2\n")
+    (folder / "input" / "load" / "series" / "load_de.txt").write_text("3\n4\n")
+    return folder
+
+def test_validate_variants_normalises_and_rejects():
+    variants = validate_variants([{"name": "v1", "ini_overrides": {"settings\\generaldata.ini": {"general": {
+        "nbyears": 2, "year-by-year": True, "custom": None}}}}])
+    assert variants == [{"name": "v1", "files": {}, "ini_overrides": {"settings/generaldata.ini": {"general": {
+        "nbyears": "2", "year-by-year": "true", "custom": None}}}}]
+    for bad in ([], [{"name": "a b"}], [{"name": "v"}, {"name": "v"}],
+                [{"name": "v", "files": {"../escape.txt": "x"}}],
+                [{"name": "v", "files": {"output/run/x.txt": "x"}}],
+                [{"name": "v", "ini_overrides": {"settings/generaldata.ini": {"general": "nbyears=2"}}}],
+                [{"name": "v", "ini_overrides": {"settings/generaldata.ini": {"general": {"nbyears": "twenty"}}}}],
+                [{"name": "v", "ini_overrides": {"settings/generaldata.ini": {"general": {"nbyears": None}}}}],
+                [{"name": "v", "ini_overrides": {"settings/generaldata.ini": {"playlist": {
+                    "playlist_reset": False, "playlist_year +": [1, "all"]}}}}]):
+        with pytest.raises(ValueError):
+            validate_variants(bad)
+
+def test_apply_ini_overrides_sets_adds_and_removes_keys():
+    contents = {"general": {"nbyears": "4", "mode": "Economy"}}
+    new_contents = apply_ini_overrides(contents, {"general": {"nbyears": "2", "mode": None}, "playlist": {"a": "b"}})
+    assert new_contents == {"general": {"nbyears": "2"}, "playlist": {"a": "b"}}
+    assert contents["general"]["mode"] == "Economy"
+
+def test_variant_playlist_follows_overrides(tmp_path):
+    study = make_base_study(tmp_path / "base")
+    assert get_variant_playlist(str(study), {}) == YearSet(range(4))
+    assert get_variant_playlist(str(study), {"settings/generaldata.ini": {
+        "general": {"nbyears": "6"}, "playlist": {"playlist_reset": "false", "playlist_year +": ["1", "5"]}}}) \
+        == YearSet([1, 5])
+
+def test_variant_study_is_an_overlay_that_leaves_the_base_untouched(tmp_path):
+    base = make_base_study(tmp_path / "base")
+    files_path = tmp_path / "base.variants" / "high"
+    write_variant_files({"input/load/series/load_fr.txt": "10\n20\n"}, str(files_path))
+    overrides = {"settings/generaldata.ini": {"general": {"nbyears": "2"}}}
+    variant = create_variant_study(str(base), str(tmp_path / "base--high"), overrides, str(files_path))
+
+    series = os.path.join(variant, "input", "load", "series")
+    assert os.path.samefile(os.path.join(series, "load_de.txt"), base / "input" / "load" / "series" / "load_de.txt")
+    assert open(os.path.join(series, "load_fr.txt")).read() == "10\n20\n"
+    assert (base / "input" / "load" / "series" / "load_fr.txt").read_text() == "1\n2\n"
+    generaldata = robust_read_ini(os.path.join(variant, "settings", "generaldata.ini"))
+    assert generaldata == {"general": {"nbyears": "2"}, "other": {"key": "1"}}
+    assert robust_read_ini(str(base / "settings" / "generaldata.ini"))["general"]["nbyears"] == "4"
+    assert os.listdir(os.path.join(variant, "output")) == []
+
+    # the same variant is reused, a changed one is rebuilt
+    open(os.path.join(variant, "output", "marker"), "w").close()
+    create_variant_study(str(base), variant, overrides, str(files_path))
+    assert os.path.exists(os.path.join(variant, "output", "marker"))
+    create_variant_study(str(base), variant, {}, None)
+    assert not os.path.exists(os.path.join(variant, "output", "marker"))
+    assert open(os.path.join(series, "load_fr.txt")).read() == "1\n2\n"
+
+def test_assign_task_interleaves_the_variants_of_a_sweep(tmp_path):
+    job_queue = JobQueue(str(tmp_path))
+    jobs = []
+    for name in ("a", "b", "c"):
+        job = Job("user", 50, None, study_name="base")
+        job.sweep_id, job.variant, job.workload = "sweep", {"name": name}, YearSet(range(4))
+        jobs.append(job)
+    job_queue.add_jobs(jobs)
+    tasks = [job_queue.assign_task("worker", 2) for _ in range(6)]
+    assert [task.job.variant["name"] for task in tasks] == ["a", "b", "c", "a", "b", "c"]
+    assert [str(task.workload) for task in tasks[:4]] == ["0-1", "0-1", "0-1", "2-3"]
+    assert job_queue.assign_task("worker", 2) is None
+    assert job_queue.get_sweep_jobs("sweep") == jobs
@@ -0,0 +1,148 @@
+import os
+import subprocess
+
+import requests
+
+from main_worker import Worker
+from utils.http_client import DriverUnavailableError, Outbox
+from utils.tracing import Tracer
+from utils.year_set import YearSet
+
+def make_worker(tmp_path, **config) -> Worker:
+    """A worker without config file or solver, with the attributes the tested methods use."""
+    worker = Worker.__new__(Worker)
+    worker.config = config
+    worker.name = "worker"
+    worker.max_cores_to_use = 2
+    worker.tracer = Tracer(worker.name)
+    worker.outbox = Outbox(str(tmp_path / "outbox"))
+    return worker
+
+class FakeDriverClient:
+    """Records the posted payloads and fails the calls for the task ids in errors with the given exception."""
+    def __init__(self, errors: dict[str, Exception] = None):
+        self.errors = errors or {}
+        self.posted = []
+
+    def post(self, endpoint, json):
+        if json["task_id"] in self.errors:
+            raise self.errors[json["task_id"]]
+        self.posted.append(json["task_id"])
+
+class FakeUploadClient:
+    """Records the uploaded years and rejects the uploads of the years in rejected."""
+    def __init__(self, rejected=()):
+        self.rejected = set(rejected)
+        self.uploaded = []
+
+    def request(self, method, endpoint, params, data):
+        year = int(endpoint.rsplit("/", 1)[1])
+        if year in self.rejected:
+            raise DriverUnavailableError("upload failed")
+        assert data.read(2) == b"PK"
+        self.uploaded.append(year)
+
+def write_output(tmp_path, years, mode: str = "Economy") -> str:
+    """An output folder with the given years, in a study of the given simulation mode."""
+    study_path = tmp_path / "study"
+    if not study_path.exists():
+        os.makedirs(study_path / "settings")
+        os.makedirs(study_path / "input" / "areas")
+        (study_path / "study.antares").write_text("[antares]\nversion = 880\ncaption = test\n")
+        (study_path / "settings" / "generaldata.ini").write_text(f"[general]\nmode = {mode}\nnbyears = 10\n")
+        (study_path / "input" / "areas" / "list.txt").write_text("DE\n")
+    output_path = study_path / "output" / "20250101-0000eco"
+    for year in years:
+        area_path = output_path / mode.lower() / "mc-ind" / str(year + 1).zfill(5) / "areas" / "de"
+        os.makedirs(area_path)
+        (area_path / "values-hourly.txt").write_text("values")
+    return str(output_path)
+
+def test_run_that_did_not_end_gracefully_fails_every_year(tmp_path):
+    worker = make_worker(tmp_path)
+    output_path = write_output(tmp_path, [0, 2])
+    study_path = str(tmp_path / "study")
+    with open(os.path.join(output_path, "simulation.log"), "w") as f:
+        f.write("[solver] Quitting the solver gracefully\n")
+    assert worker.verify_run_correctness(study_path, [0, 1, 2]) == (True, [1])
+
+    with open(os.path.join(output_path, "simulation.log"), "w") as f:
+        f.write("[solver] Exception: out of memory\n")
+    assert worker.verify_run_correctness(study_path, [0, 1, 2]) == (False, [0, 1, 2])
+
+def test_solver_crash_is_reported_with_every_year_failed(tmp_path):
+    worker = make_worker(tmp_path)
+    worker.driver_client = FakeDriverClient()
+    worker.request_new_task = lambda: {"id": "t1", "job_id": "job", "workload": "0-2", "study_name": "study"}
+    worker.stage_study = lambda assignment: str(tmp_path / "study")
+    worker.tune_model_years = lambda study_folder_path, years: None
+    def crash(study_folder_path):
+        raise subprocess.CalledProcessError(3, "antares-solver")
+    worker.run_antares = crash
+    worker.prestaged = frozenset()
+    reports = []
+    worker.notify_task_done = lambda *args, **kwargs: reports.append((args, kwargs))
+    assert worker.work_once()
+    (task_id, job_id, workload, output_path, success, failed_years), kwargs = reports[0]
+    assert (task_id, success, failed_years) == ("t1", False, [0, 1, 2])
+    assert "error" in kwargs["spans"][-1]
+
+def test_rejected_completion_reports_are_dead_lettered_and_do_not_block_the_others(tmp_path):
+    worker = make_worker(tmp_path)
+    response = requests.Response()
+    response.status_code, response._content = 422, b'{"detail": "workload: invalid"}'
+    worker.driver_client = FakeDriverClient({"bad": requests.HTTPError("422 Client Error", response=response)})
+    for task_id in ("bad", "good"):
+        worker.outbox.put(task_id, {"task_id": task_id})
+    worker.deliver_outbox()
+    assert worker.driver_client.posted == ["good"]
+    assert len(worker.outbox) == 0
+    assert "workload: invalid" in (tmp_path / "outbox" / "dead_letter" / "bad.reason.txt").read_text()
+
+def test_completion_reports_stay_in_the_outbox_while_the_driver_is_down(tmp_path):
+    worker = make_worker(tmp_path)
+    worker.driver_client = FakeDriverClient({"t1": DriverUnavailableError("down")})
+    worker.notify_task_done("t1", "job", YearSet(range(2)), "output", True)
+    assert [task_id for task_id, payload in worker.outbox.items()] == ["t1"]
+    worker.driver_client = FakeDriverClient()
+    worker.deliver_outbox()
+    assert worker.driver_client.posted == ["t1"] and len(worker.outbox) == 0
+
+def make_shipping_worker(tmp_path, shipping, rejected=()):
+    os.makedirs(tmp_path / "zip")
+    worker = make_worker(tmp_path, output_shipping=shipping, delete_shipped_output=True, zip_method="zipfile",
+                         results_store_folder_path=str(tmp_path / "store"), **{"7_zip_file_path": None})
+    worker.local_zip_folder_path = str(tmp_path / "zip")
+    worker.driver_client = FakeUploadClient(rejected)
+    return worker
+
+ASSIGNMENT = {"id": "task", "job_id": "job"}
+
+def test_output_uploaded_to_the_driver_is_deleted_once_all_years_are_shipped(tmp_path):
+    worker = make_shipping_worker(tmp_path, "driver")
+    output_path = write_output(tmp_path, range(3))
+    reported_path, shipped_years = worker.ship_output(ASSIGNMENT, output_path, [0, 1, 2])
+    assert (reported_path, shipped_years) == (output_path, [0, 1, 2])
+    assert sorted(worker.driver_client.uploaded) == [0, 1, 2]
+    assert not os.path.exists(output_path)
+
+def test_partial_shipment_keeps_the_local_output_for_the_driver_to_link(tmp_path):
+    worker = make_shipping_worker(tmp_path, "driver", rejected=[1])
+    output_path = write_output(tmp_path, range(3))
+    reported_path, shipped_years = worker.ship_output(ASSIGNMENT, output_path, [0, 1, 2])
+    assert (reported_path, shipped_years) == (output_path, [0, 2])
+    assert os.path.isdir(os.path.join(output_path, "economy", "mc-ind", "00002"))
+    assert os.listdir(tmp_path / "zip") == []  # the zips are temporary
+
+def test_output_copied_to_the_results_store_is_reported_from_there(tmp_path):
+    worker = make_shipping_worker(tmp_path, "store")
+    output_path = write_output(tmp_path, range(2), mode="Adequacy")
+    reported_path, shipped_years = worker.ship_output(ASSIGNMENT, output_path, [0, 1])
+    assert reported_path == str(tmp_path / "store" / "job" / "task") and shipped_years == []
+    assert sorted(os.listdir(os.path.join(reported_path, "adequacy", "mc-ind"))) == ["00001", "00002"]
+    assert not os.path.exists(output_path)
+
+    # a year that can not be copied keeps the whole output local
+    output_path = write_output(tmp_path, [2], mode="Adequacy")
+    assert worker.ship_output(ASSIGNMENT, output_path, [2, 3]) == (output_path, [])
+    assert os.path.isdir(output_path)
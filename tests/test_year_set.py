@@ -0,0 +1,41 @@
+import pickle
+import random
+
+import pytest
+
+from utils.year_set import YearSet
+
+def test_string_round_trip():
+    years = YearSet.from_string("0-99, 150-199,250")
+    assert str(years) == "0-99,150-199,250"
+    assert len(years) == 151
+    assert 150 in years and 100 not in years and 250 in years and 251 not in years
+    assert str(YearSet([3, 1, 2, 2, 7])) == "1-3,7"
+    assert str(YearSet.from_string("")) == ""
+
+def test_invalid_strings_are_rejected():
+    for text in ("5-2", "a-b", "-3"):
+        with pytest.raises(ValueError):
+            YearSet.from_string(text)
+
+def test_set_operations_match_python_sets():
+    rng = random.Random(0)
+    for _ in range(200):
+        a = {rng.randrange(60) for _ in range(rng.randrange(40))}
+        b = {rng.randrange(60) for _ in range(rng.randrange(40))}
+        assert list(YearSet(a) | YearSet(b)) == sorted(a | b)
+        assert list(YearSet(a) - YearSet(b)) == sorted(a - b)
+        assert list(YearSet(a) & b) == sorted(a & b)
+        assert list(a - YearSet(b)) == sorted(a - b)
+
+def test_take_first():
+    years = YearSet.from_string("0-2,10-19")
+    assert str(years.take_first(5)) == "0-2,10-11"
+    assert years.take_first(100) == years
+    assert not years.take_first(0)
+
+def test_pickle_keeps_ranges_only():
+    years = YearSet(range(10000)) - YearSet([5000])
+    restored = pickle.loads(pickle.dumps(years))
+    assert restored == years and len(restored) == 9999
+    assert len(pickle.dumps(years)) < 200